@@ -1,67 +1,314 @@
-import tkinter as tk
-from tkinter import messagebox, ttk
+import argparse
+import heapq
+import math
 import random
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
+import endgame
+import mcmc
+import metrics
+import openings
+import targeting
+from bitboard import iter_bits
+from fleets import FleetSampler, empty_board_sampler
+
+# tkinter is only imported once a window is made (see load_tk), so the engine,
+# self-play and the server run without it
+tk = messagebox = ttk = None
+
+# Defaults for a game; GameEngine takes its own board size, fleet and powerups
 BOARD_SIZE = 10
 SHIP_SIZES = [5, 4, 3, 3, 2]
+POWERUPS = {'Missile': 3, 'Destroyer': 1, 'Intel': 2}
+MAX_BOARD_SIZE = 100
+
+AI_DELAY_MS = 1000  # Pause before the computer's move is shown
+AI_POLL_MS = 25  # How often the GUI checks on a move being computed in the background
+OVERLAY_MS = 500  # How often the debug overlay is refreshed
+
+CELL_PX = 24  # Size of a board cell on screen
+MIN_CELL_PX = 5
+BOARD_VIEW_PX = 480  # Boards larger than this get smaller cells
+EMPTY_COLOR = '#d9d9d9'
+GRID_LINE_COLOR = '#a0a0a0'
 
 class Cell:
-    def __init__(self):
-        self.has_ship = False
-        self.hit = False
+    """View of one square, backed by the owning Board's bitmasks"""
+    __slots__ = ('board', 'index')
+
+    def __init__(self, board, r, c):
+        self.board = board
+        self.index = r * board.size + c
+
+    @property
+    def has_ship(self):
+        return bool(self.board.ship_mask >> self.index & 1)
+
+    @property
+    def hit(self):
+        return bool(self.board.shot_mask >> self.index & 1)
+
+    @hit.setter
+    def hit(self, value):
+        if not value:
+            raise ValueError("a shot can't be taken back")
+        self.board.shoot(*divmod(self.index, self.board.size))
+
+class GridRow:
+    __slots__ = ('board', 'r')
+
+    def __init__(self, board, r):
+        self.board = board
+        self.r = r
+
+    def __getitem__(self, c):
+        if not 0 <= c < self.board.size:
+            raise IndexError(c)
+        return Cell(self.board, self.r, c)
+
+    def __len__(self):
+        return self.board.size
+
+class GridView:
+    """Read/write `grid[r][c]` access on top of a bitboard, kept for the GUI"""
+    __slots__ = ('board',)
+
+    def __init__(self, board):
+        self.board = board
+
+    def __getitem__(self, r):
+        if not 0 <= r < self.board.size:
+            raise IndexError(r)
+        return GridRow(self.board, r)
+
+    def __len__(self):
+        return self.board.size
 
 class Ship:
     def __init__(self, size):
         self.size = size
         self.positions = []
+        self.mask = 0
+        self.hits = 0  # Kept up to date by Board.shoot
+
+    def is_sunk(self, board=None):
+        return self.hits == self.size
 
-    def is_sunk(self, board):
-        return all(board.grid[r][c].hit for r, c in self.positions)
+    @classmethod
+    def from_placement(cls, size, start, vertical, board_size):
+        """The ship covering `size` cells from cell index `start`, rightwards or downwards.
+
+        Raises ValueError if it runs off the board.
+        """
+        r, c = divmod(start, board_size)
+        if r >= board_size or (r if vertical else c) + size > board_size:
+            raise ValueError(f"a {size}-cell ship at {start} runs off the board")
+        step = board_size if vertical else 1
+        ship = cls(size)
+        ship.positions = [divmod(start + i * step, board_size) for i in range(size)]
+        ship.mask = sum(1 << (start + i * step) for i in range(size))
+        return ship
+
+    def placement(self, board_size):
+        """(first cell index, vertical), as from_placement takes them; 1-cell ships count as horizontal"""
+        r, c = self.positions[0]
+        return r * board_size + c, len(self.positions) > 1 and self.positions[1][1] == c
+
+    def copy(self):
+        ship = Ship(self.size)
+        ship.positions = self.positions
+        ship.mask = self.mask
+        ship.hits = self.hits
+        return ship
 
 class Board:
-    def __init__(self):
-        self.grid = [[Cell() for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    """Bitboard: bit r * size + c of each mask stands for cell (r, c).
+
+    Besides the masks the board keeps a cell -> ship index and hit counters per
+    ship and for the whole fleet, so ship lookup, sunk checks and the game-over
+    check are constant time. Shots must go through shoot() to keep them right.
+    Every function in sunk_listeners is called with (board, ship) the moment
+    that ship sinks.
+    """
+
+    def __init__(self, size=BOARD_SIZE):
+        self.size = size
+        self.full_mask = (1 << (size * size)) - 1
+        self.ship_mask = 0
+        self.shot_mask = 0
+        self.sunk_mask = 0
         self.ships = []
+        self.ship_at = {}  # cell index -> Ship
+        self.hits = 0
+        self.ship_cells = 0
+        self.sunk_listeners = []
+        self.heatmap_cache = None  # targeting.HeatmapCache, created on first use
 
-    def place_ship(self, size):
-        while True:
-            orientation = random.choice(['H', 'V'])
-            row = random.randint(0, BOARD_SIZE - 1)
-            col = random.randint(0, BOARD_SIZE - 1)
-            positions = []
-            for i in range(size):
-                r = row + (i if orientation == 'V' else 0)
-                c = col + (i if orientation == 'H' else 0)
-                if r >= BOARD_SIZE or c >= BOARD_SIZE or self.grid[r][c].has_ship:
-                    break
-                positions.append((r, c))
-            else:
-                for r, c in positions:
-                    self.grid[r][c].has_ship = True
-                ship = Ship(size)
-                ship.positions = positions
-                self.ships.append(ship)
-                break
+    @property
+    def grid(self):
+        return GridView(self)
+
+    @property
+    def hit_mask(self):
+        return self.shot_mask & self.ship_mask
+
+    @property
+    def miss_mask(self):
+        return self.shot_mask & ~self.ship_mask
+
+    def bit(self, r, c):
+        return 1 << (r * self.size + c)
+
+    def row_mask(self, r):
+        return ((1 << self.size) - 1) << (r * self.size)
+
+    def cell(self, index):
+        return divmod(index, self.size)
+
+    def cells(self, mask):
+        """(r, c) of every set bit in mask"""
+        return [divmod(i, self.size) for i in iter_bits(mask)]
+
+    def unhit_cells(self):
+        return self.cells(self.full_mask & ~self.shot_mask)
+
+    def shoot(self, r, c):
+        """Mark (r, c) as shot. Returns True if it hit a ship"""
+        index = r * self.size + c
+        bit = 1 << index
+        if self.shot_mask & bit:
+            return bool(self.ship_mask & bit)
+        self.shot_mask |= bit
+        ship = self.ship_at.get(index)
+        if ship is None:
+            return False
+        ship.hits += 1
+        self.hits += 1
+        if ship.hits == ship.size:
+            self.sunk_mask |= ship.mask
+            for listener in self.sunk_listeners:
+                listener(self, ship)
+        return True
+
+    def load_shots(self, shot_mask):
+        """Mark every cell of shot_mask as shot at once (restoring a saved game; no listeners fire)"""
+        self.shot_mask = shot_mask
+        self.hits = 0
+        self.sunk_mask = 0
+        for ship in self.ships:
+            ship.hits = (ship.mask & shot_mask).bit_count()
+            self.hits += ship.hits
+            if ship.hits == ship.size:
+                self.sunk_mask |= ship.mask
+
+    def is_shot(self, r, c):
+        return bool(self.shot_mask & self.bit(r, c))
+
+    def is_hit(self, r, c):
+        return bool(self.shot_mask & self.ship_mask & self.bit(r, c))
+
+    def hit_count(self):
+        return self.hits
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.size = self.size
+        board.full_mask = self.full_mask
+        board.ship_mask = self.ship_mask
+        board.shot_mask = self.shot_mask
+        board.sunk_mask = self.sunk_mask
+        board.ships = [ship.copy() for ship in self.ships]
+        board.ship_at = {}
+        for ship in board.ships:
+            for i in iter_bits(ship.mask):
+                board.ship_at[i] = ship
+        board.hits = self.hits
+        board.ship_cells = self.ship_cells
+        board.sunk_listeners = []
+        board.heatmap_cache = None
+        return board
+
+    def add_ship(self, ship):
+        self.ship_mask |= ship.mask
+        self.ships.append(ship)
+        self.ship_cells += ship.size
+        for i in iter_bits(ship.mask):
+            self.ship_at[i] = ship
+
+    def place_ship(self, size, rng=random):
+        self.place_fleet([size], rng)
+
+    def place_fleet(self, ship_sizes, rng=random):
+        """Place ships at random, each drawn from the placements still free"""
+        if self.ship_mask:
+            sampler = FleetSampler(self.size, ship_sizes, blocked=iter_bits(self.ship_mask))
+        else:
+            sampler = empty_board_sampler(self.size, tuple(ship_sizes))
+        with metrics.timer('placement.fleet'):
+            fleet = sampler.fleet(rng)
+        for size, cells in zip(ship_sizes, sampler.cells(fleet)):
+            ship = Ship(size)
+            ship.positions = [divmod(i, self.size) for i in cells]
+            ship.mask = sum(1 << i for i in cells)
+            self.add_ship(ship)
+
+    def remaining_ship_sizes(self):
+        return [ship.size for ship in self.ships if ship.hits < ship.size]
 
     def all_ships_sunk(self):
-        return all(self.grid[r][c].hit for ship in self.ships for r, c in ship.positions)
+        return self.hits == self.ship_cells
         
     def find_ship_by_position(self, r, c):
         """Find which ship is at the given position"""
-        for ship in self.ships:
-            if (r, c) in ship.positions:
-                return ship
-        return None
+        return self.ship_at.get(r * self.size + c)
+
+DIFFICULTIES = ["Easy", "Hard", "Learned"]
+
+TARGETING_STRATEGIES = ["montecarlo", "exact", "numpy", "parallel", "mcmc"]
+
+# Simulations per move for the sampling strategies when none are given
+DEFAULT_SIMULATIONS = {"montecarlo": 1000, "numpy": 100000, "parallel": 1000000, "mcmc": 5000}
 
-def enhanced_monte_carlo_attack(player, opponent_board, simulations=1000):
+# Monte Carlo targeting runs in rounds of ROUND_SIMULATIONS and stops early once the
+# hottest cell is SEPARATION_Z standard deviations ahead of the runner-up, or can't be
+# more than INDIFFERENCE (as a share of its count) ahead of it. When not one of the
+# first STARVED_SIMULATIONS fleets fits the board, it gives up and the shot is random.
+ROUND_SIMULATIONS = 100
+SEPARATION_Z = 2.5
+INDIFFERENCE = 0.5
+STARVED_SIMULATIONS = 200
+MOVE_SECONDS = 2.0  # Wall-clock cap on one Monte Carlo heatmap
+
+# Fleets sampled per board by batch_attack
+BATCH_SIMULATIONS = 5000
+
+def enhanced_monte_carlo_attack(player, opponent_board, simulations=1000, rng=random, strategy="montecarlo",
+                                sampler=None, stats=None):
+    """The Hard AI's next shot. `stats`, if a dict, gets the montecarlo sampler's
+    samples, accepted samples and stop reason (see monte_carlo_heatmap)"""
+    # Late in the game, search the few fleets that still fit for the best shot
+    cell = endgame_move(opponent_board, rng)
+    if cell is not None:
+        return cell
+
+    # Cells next to hits on ships still afloat come first
+    potential_targets = hit_targets(opponent_board)
+    if potential_targets:
+        return rng.choice(potential_targets)
+
+    # If no unsunk hits or no valid adjacent cells, fall back to a probability heatmap
+    heatmap = targeting_heatmap(opponent_board, simulations, rng, strategy, sampler, converge=True, stats=stats)
+    return best_cell(heatmap, opponent_board, rng)
+
+def hit_targets(opponent_board):
+    """Unshot cells next to hits on ships still afloat, extending lines of hits where there are any"""
+    n = opponent_board.size
+    potential_targets = []
     # First check if there are any hit ships that aren't sunk yet
-    unsunk_hits = []
-    for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            if opponent_board.grid[r][c].hit and opponent_board.grid[r][c].has_ship:
-                ship = opponent_board.find_ship_by_position(r, c)
-                if ship and not ship.is_sunk(opponent_board):
-                    unsunk_hits.append((r, c))
+    unsunk_hits = opponent_board.cells(opponent_board.hit_mask & ~opponent_board.sunk_mask)
     
     # If we have unsunk ships with hits, target adjacent cells
     if unsunk_hits:
@@ -76,7 +323,6 @@ def enhanced_monte_carlo_attack(player, opponent_board, simulations=1000):
                 ship_hits[ship_id].append((r, c))
         
         # For each ship with hits, find the adjacent cells to target
-        potential_targets = []
         for ship_id, hits in ship_hits.items():
             # Check if hits are in a line
             is_horizontal = all(hit[0] == hits[0][0] for hit in hits)
@@ -90,9 +336,9 @@ def enhanced_monte_carlo_attack(player, opponent_board, simulations=1000):
                     min_col, max_col = min(cols), max(cols)
                     
                     # Check left and right
-                    if min_col - 1 >= 0 and not opponent_board.grid[row][min_col - 1].hit:
+                    if min_col - 1 >= 0 and not opponent_board.is_shot(row, min_col - 1):
                         potential_targets.append((row, min_col - 1))
-                    if max_col + 1 < BOARD_SIZE and not opponent_board.grid[row][max_col + 1].hit:
+                    if max_col + 1 < n and not opponent_board.is_shot(row, max_col + 1):
                         potential_targets.append((row, max_col + 1))
                 
                 # For vertical ships
@@ -102,528 +348,1040 @@ def enhanced_monte_carlo_attack(player, opponent_board, simulations=1000):
                     min_row, max_row = min(rows), max(rows)
                     
                     # Check above and below
-                    if min_row - 1 >= 0 and not opponent_board.grid[min_row - 1][col].hit:
+                    if min_row - 1 >= 0 and not opponent_board.is_shot(min_row - 1, col):
                         potential_targets.append((min_row - 1, col))
-                    if max_row + 1 < BOARD_SIZE and not opponent_board.grid[max_row + 1][col].hit:
+                    if max_row + 1 < n and not opponent_board.is_shot(max_row + 1, col):
                         potential_targets.append((max_row + 1, col))
             else:
                 # Single hit or non-linear hits, check all four directions
                 for r, c in hits:
                     for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
                         nr, nc = r + dr, c + dc
-                        if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and 
-                            not opponent_board.grid[nr][nc].hit):
+                        if (0 <= nr < n and 0 <= nc < n and 
+                            not opponent_board.is_shot(nr, nc)):
                             potential_targets.append((nr, nc))
-        
-        # If we have potential targets, choose one randomly
-        if potential_targets:
-            return random.choice(potential_targets)
-    
-    # If no unsunk hits or no valid adjacent cells, fall back to Monte Carlo strategy
-    heatmap = [[0 for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-    known_hits = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)
-                  if opponent_board.grid[r][c].hit and opponent_board.grid[r][c].has_ship]
-    known_misses = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)
-                    if opponent_board.grid[r][c].hit and not opponent_board.grid[r][c].has_ship]
-
-    def valid_placement(r, c, size, orientation, used):
-        positions = []
-        for i in range(size):
-            nr, nc = r + (i if orientation == 'V' else 0), c + (i if orientation == 'H' else 0)
-            if not (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE):
-                return None
-            if (nr, nc) in used or (nr, nc) in known_misses:
-                return None
-            positions.append((nr, nc))
-        if known_hits and not any(hit in positions for hit in known_hits):
-            return None
-        return positions
-
-    for _ in range(simulations):
-        temp_used = set()
-        valid = True
-        for size in SHIP_SIZES:
-            placed = False
-            for _ in range(100):
-                orientation = random.choice(['H', 'V'])
-                r, c = random.randint(0, BOARD_SIZE - 1), random.randint(0, BOARD_SIZE - 1)
-                pos = valid_placement(r, c, size, orientation, temp_used)
-                if pos:
-                    temp_used.update(pos)
-                    placed = True
-                    break
-            if not placed:
-                valid = False
-                break
-        if not valid:
+
+    return potential_targets
+
+def endgame_move(opponent_board, rng=random):
+    """The endgame solver's shot, or None while too many fleets still fit the board (see endgame.py)"""
+    with metrics.timer('targeting.endgame'):
+        cell = endgame.best_shot(opponent_board.size, *visible_state(opponent_board), rng)
+    if cell is None:
+        return None
+    metrics.count('targeting.endgame.moves')
+    return opponent_board.cell(cell)
+
+def targeting_heatmap(opponent_board, simulations=1000, rng=random, strategy="montecarlo", sampler=None,
+                      converge=False, stats=None):
+    """The heatmap of one of TARGETING_STRATEGIES, as a flat list indexed r * size + c.
+
+    `converge` and `stats` apply to the montecarlo strategy: stop once the best
+    cell is settled, and report how the sampling went. Positions in the opening
+    book (see openings.py) are looked up instead, whatever the strategy.
+    """
+    heatmap = openings.lookup(opponent_board.size, *visible_state(opponent_board))
+    if heatmap is not None:
+        if stats is not None:
+            stats.update(samples=0, accepted=0, stop='book')
+        return heatmap
+    with metrics.timer('targeting.' + strategy):
+        if strategy == "exact":
+            return exact_heatmap(opponent_board)
+        if strategy == "montecarlo":
+            return monte_carlo_heatmap(opponent_board, simulations, rng, converge, stats)
+        metrics.count(f'targeting.{strategy}.samples', simulations)
+        if strategy == "numpy":
+            return sampled_heatmap(opponent_board, simulations, rng)
+        elif strategy == "parallel":
+            return parallel_heatmap(opponent_board, simulations, rng, sampler)
+        return mcmc_heatmap(opponent_board, simulations, rng)
+
+def best_cell(heatmap, board, rng=random):
+    """Pick randomly among the unshot cells with the highest heatmap score"""
+    unhit = list(iter_bits(board.full_mask & ~board.shot_mask))
+    max_val = max(heatmap[i] for i in unhit)
+    candidates = [i for i in unhit if heatmap[i] == max_val]
+    return board.cell(rng.choice(candidates))
+
+def batch_attack(boards, simulations=BATCH_SIMULATIONS, rng=random):
+    """enhanced_monte_carlo_attack for many boards at once: a (r, c) shot for each.
+
+    Book, endgame and hit-adjacent moves are found board by board as usual.
+    The boards left over need a heatmap; those of the same size and fleet
+    afloat are sampled as one batch (see targeting.batch_moves), the way the
+    numpy strategy samples one board.
+    """
+    moves = [None] * len(boards)
+    groups = {}
+    for i, board in enumerate(boards):
+        blocked, hits, sizes = visible_state(board)
+        heatmap = openings.lookup(board.size, blocked, hits, sizes)
+        if heatmap is not None:
+            moves[i] = best_cell(heatmap, board, rng)
             continue
-        for r, c in temp_used:
-            if (r, c) not in known_hits and (r, c) not in known_misses:
-                heatmap[r][c] += 1
+        cell = endgame_move(board, rng)
+        if cell is None:
+            targets = hit_targets(board)
+            cell = rng.choice(targets) if targets else None
+        if cell is not None:
+            moves[i] = cell
+        else:
+            groups.setdefault((board.size, tuple(sorted(sizes))), []).append((i, blocked, hits))
+
+    if groups:
+        targeting.require_numpy()
+        gen = targeting.np.random.default_rng(rng.getrandbits(64))
+    for (size, sizes), members in groups.items():
+        with metrics.timer('targeting.batch'):
+            blocked = targeting.np.array([targeting.mask_to_array(m[1], size * size) for m in members])
+            hits = targeting.np.array([targeting.mask_to_array(m[2], size * size) for m in members])
+            cells = targeting.batch_moves(size, blocked, hits, sizes, simulations, gen)
+        for (i, _, _), cell in zip(members, cells.tolist()):
+            moves[i] = boards[i].cell(cell)
+    return moves
+
+def visible_state(board):
+    """What an attacker can see: (blocked cells, hits on ships afloat, sizes afloat)"""
+    sunk = board.sunk_mask
+    return board.miss_mask | sunk, board.hit_mask & ~sunk, board.remaining_ship_sizes()
+
+def exact_heatmap(opponent_board):
+    """Heatmap from exact placement counting, cached on the board between turns"""
+    if opponent_board.heatmap_cache is None:
+        opponent_board.heatmap_cache = targeting.HeatmapCache(opponent_board.size)
+    return opponent_board.heatmap_cache.query(*visible_state(opponent_board))
+
+def sampled_heatmap(opponent_board, simulations=100000, rng=random):
+    """Heatmap from the vectorized numpy sampler (see targeting.sampled_heatmap)"""
+    return targeting.sampled_heatmap(opponent_board.size, *visible_state(opponent_board), simulations, rng)
+
+def parallel_heatmap(opponent_board, simulations=1000000, rng=random, sampler=None):
+    """Heatmap from the numpy sampler spread over a process pool (see targeting.ParallelSampler)"""
+    sampler = sampler or targeting.default_sampler()
+    return sampler.heatmap(opponent_board.size, *visible_state(opponent_board), simulations, rng.getrandbits(64))
+
+def mcmc_heatmap(opponent_board, samples=5000, rng=random):
+    """Heatmap from a Markov chain over fleets that fit every hit (see mcmc.py)"""
+    stats = {} if metrics.enabled else None
+    heatmap = mcmc.mcmc_heatmap(opponent_board.size, *visible_state(opponent_board), samples, rng, stats)
+    if stats:
+        metrics.count('targeting.mcmc.proposals', stats['proposals'])
+        metrics.count('targeting.mcmc.accepted', stats['accepted'])
+    if heatmap is None:
+        metrics.count('targeting.mcmc.fallbacks')
+        # No fleet fitting the board was found quickly; exact counting always has an answer
+        return exact_heatmap(opponent_board)
+    return heatmap
+
+def learned_heatmap(opponent_board):
+    """Heatmap from the learned policy (see policy.py)"""
+    import policy  # Loads numpy, which nothing else in a game may need
+    with metrics.timer('targeting.learned'):
+        sunk = opponent_board.sunk_mask
+        return policy.default_policy().heatmap(opponent_board.size, opponent_board.miss_mask,
+                                               opponent_board.hit_mask & ~sunk, sunk,
+                                               opponent_board.remaining_ship_sizes())
+
+def convergence(heatmap, cells):
+    """Whether sampling can stop: 'separated' once the hottest of `cells` is clearly ahead
+    of the runner-up, 'indifferent' once it can't be far ahead of it, else None"""
+    if len(cells) < 2:
+        return 'separated'
+    first, second = heapq.nlargest(2, (heatmap[i] for i in cells))
+    if not first:
+        return None
+    # Each sample covers either cell or not, so the gap's variance is at most first + second
+    spread = SEPARATION_Z * math.sqrt(first + second)
+    if first - second >= spread:
+        return 'separated'
+    if first - second + spread <= INDIFFERENCE * first:
+        return 'indifferent'
+    return None
+
+def monte_carlo_heatmap(opponent_board, simulations=1000, rng=random, converge=False, stats=None):
+    """Heatmap from random fleet simulations, as a flat list indexed r * size + c.
+
+    Simulations run in rounds. With `converge`, sampling stops as soon as
+    convergence() says the best cell is settled; it always stops after
+    MOVE_SECONDS. If `stats` is a dict it gets the samples run, the samples
+    accepted and the stop reason ('separated', 'indifferent', 'starved',
+    'budget' or 'time').
+    """
+    n = opponent_board.size
+    heatmap = [0] * (n * n)
+    known_hits = set(opponent_board.cells(opponent_board.hit_mask))
+    known_misses = set(opponent_board.cells(opponent_board.miss_mask))
+    fleet = [ship.size for ship in opponent_board.ships]
+    # Every ship avoids the misses and, once there are hits, has to cover one of them
+    sampler = FleetSampler(n, fleet, blocked=iter_bits(opponent_board.miss_mask),
+                           must_cover=iter_bits(opponent_board.hit_mask))
+
+    unshot = list(iter_bits(opponent_board.full_mask & ~opponent_board.shot_mask))
+    deadline = time.perf_counter() + MOVE_SECONDS
+    done = accepted = 0
+    stop = 'budget'
+    while done < simulations:
+        batch = min(ROUND_SIMULATIONS, simulations - done)
+        for _ in range(batch):
+            placements = sampler.sample(rng)
+            if placements is None:
+                continue
+            accepted += 1
+            for cells in sampler.cells(placements):
+                for i in cells:
+                    heatmap[i] += 1
+        done += batch
+        if time.perf_counter() > deadline:
+            stop = 'time'
+            break
+        if converge and not accepted and done >= STARVED_SIMULATIONS:
+            stop = 'starved'
+            break
+        if converge:
+            settled = convergence(heatmap, unshot)
+            if settled:
+                stop = settled
+                break
+    metrics.count('targeting.montecarlo.samples', done)
+    metrics.count('targeting.montecarlo.proposals', done)
+    metrics.count('targeting.montecarlo.accepted', accepted)
+    metrics.count('targeting.montecarlo.stop.' + stop)
+    if stats is not None:
+        stats.update(samples=done, accepted=accepted, stop=stop)
+    for r, c in known_hits | known_misses:
+        heatmap[r * n + c] = 0
+    return heatmap
+
+class MoveCancelled(Exception):
+    """Raised inside a move when GameEngine.cancel() was called"""
 
-    max_val = max(max(row) for row in heatmap)
-    candidates = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)
-                  if heatmap[r][c] == max_val and not opponent_board.grid[r][c].hit]
-    return random.choice(candidates) if candidates else random.choice(
-        [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE)
-         if not opponent_board.grid[r][c].hit])
+def parse_fleet(text):
+    """'5,4,3,3,2' or '5x2,4x6,3x10' (size x count) -> list of ship sizes"""
+    fleet = []
+    for part in text.split(','):
+        size, _, count = part.strip().partition('x')
+        fleet.extend([int(size)] * int(count or 1))
+    return fleet
+
+def check_game_config(board_size, ship_sizes):
+    if not 1 <= board_size <= MAX_BOARD_SIZE:
+        raise ValueError(f"board size must be between 1 and {MAX_BOARD_SIZE}")
+    if not ship_sizes or any(not 1 <= size <= board_size for size in ship_sizes):
+        raise ValueError(f"every ship must be between 1 and {board_size} cells long")
+    # Random placement needs some slack, so keep the fleet to half the board
+    if sum(ship_sizes) * 2 > board_size * board_size:
+        raise ValueError("the fleet needs more than half of the board")
+
+def warm_up(board_size=BOARD_SIZE, ship_sizes=None, strategy="montecarlo", sampler=None):
+    """Do the one-off work of the AI's first move now: the placement tables for
+    this board and fleet, the opening book, the learned policy and, for the
+    parallel strategy, the worker pool.
+
+    Everything built is shared module-wide and no game is touched, so this can
+    run in the background before a game starts (see BattleshipGUI).
+    """
+    ship_sizes = list(SHIP_SIZES if ship_sizes is None else ship_sizes)
+    rng = random.Random(0)
+    with metrics.timer('startup.warm_up'):
+        board = Board(board_size)
+        board.place_fleet(ship_sizes, rng)
+        openings.default_book()
+        if targeting.have_numpy():
+            learned_heatmap(board)
+        # The strategy itself rather than targeting_heatmap, which the book could answer
+        if strategy == "exact":
+            exact_heatmap(board)
+        elif strategy == "montecarlo":
+            monte_carlo_heatmap(board, ROUND_SIMULATIONS, rng)
+        elif strategy == "mcmc":
+            mcmc_heatmap(board, ROUND_SIMULATIONS, rng)
+        else:
+            if strategy == "parallel":
+                (sampler or targeting.default_sampler()).start(board_size, ship_sizes)
+            sampled_heatmap(board, ROUND_SIMULATIONS, rng)
+
+def report_warm_up(future):
+    """Done callback of a warm_up run in the background, whose errors would otherwise go unseen"""
+    if not future.cancelled() and future.exception() is not None:
+        traceback.print_exception(future.exception())
 
 class Player:
-    def __init__(self, is_user=False):
-        self.board = Board()
+    def __init__(self, is_user=False, board_size=BOARD_SIZE, powerups=None):
+        self.board = Board(board_size)
         self.is_user = is_user
         self.used_coords = set()
         self.target_queue = []
         self.current_hunt = []  # Track cells being targeted for current ship
-        self.powerups = {
-            'Missile': 3,
-            'Destroyer': 1,
-            'Intel': 2
-        }
-
-class BattleshipGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("Battleship")
-        self.user = Player(is_user=True)
-        self.computer = Player()
-        self.turn = 0
-        self.powerup_mode = None
-        self.difficulty = "Hard"  # Default to Hard difficulty
         self.last_hit = None  # For Easy mode tracking
+        self.powerups = dict(POWERUPS if powerups is None else powerups)
+        self.ai = None  # strategies.Strategy playing this side instead of its difficulty
 
-        # Create difficulty selection before starting the game
-        self.setup_frame = tk.Frame(self.root)
-        self.setup_frame.pack(pady=20)
-        
-        tk.Label(self.setup_frame, text="Select Difficulty:").grid(row=0, column=0, padx=10)
-        self.diff_var = tk.StringVar(value="Hard")
-        diff_combo = ttk.Combobox(self.setup_frame, textvariable=self.diff_var, values=["Easy", "Hard"])
-        diff_combo.grid(row=0, column=1, padx=10)
-        
-        tk.Button(self.setup_frame, text="Start Game", command=self.start_game).grid(row=1, column=0, columnspan=2, pady=20)
+class GameEngine:
+    """All the game rules, with no Tk dependency.
 
-    def start_game(self):
-        self.difficulty = self.diff_var.get()
-        self.setup_frame.destroy()
-        
-        for size in SHIP_SIZES:
-            self.user.board.place_ship(size)
-            self.computer.board.place_ship(size)
+    The engine owns both players, the turn counter, powerups and win
+    detection. Every move returns the list of cells it changed so a view
+    (BattleshipGUI, or nothing at all for self-play) can repaint them.
+    """
 
-        self.status = tk.Label(self.root, text=f"Game Started - {self.difficulty} Mode - Your Turn")
-        self.status.grid(row=0, column=0, columnspan=20)
+    def __init__(self, difficulty="Hard", seed=None, user_difficulty=None, simulations=None,
+                 strategy="montecarlo", user_strategy=None, sampler=None,
+                 board_size=BOARD_SIZE, ship_sizes=None, powerups=None):
+        self.board_size = board_size
+        self.ship_sizes = list(SHIP_SIZES if ship_sizes is None else ship_sizes)
+        check_game_config(board_size, self.ship_sizes)
+        self.rng = random.Random(seed)
+        self.user = Player(is_user=True, board_size=board_size, powerups=powerups)
+        self.computer = Player(board_size=board_size, powerups=powerups)
+        self.turn = 0
+        self.difficulty = difficulty
+        self.user_difficulty = user_difficulty  # Only set when the user side is also played by the AI
+        self.simulations = simulations  # None means DEFAULT_SIMULATIONS for the strategy
+        self.strategy = strategy  # Heatmap engine behind the Hard AI, see TARGETING_STRATEGIES
+        self.user_strategy = user_strategy or strategy
+        self.sampler = sampler  # targeting.ParallelSampler for the "parallel" strategy
+        self.winner = None
+        self.status = ""
+        self.changed = []
+        self.sunk = []  # Ships sunk by the last move
+        self.cancelled = threading.Event()
+        # Called as move_log(engine, event, side, cell, value) for every shot ('shot', hit),
+        # powerup ('powerup', kind), sinking ('sunk', ship size) and game end ('end', winner);
+        # side is the attacking side and cell an (r, c) or None. See replay.GameRecorder.
+        self.move_log = None
+        self.search_stats = {}  # How the Hard AI's last targeting heatmap was sampled (montecarlo only)
+        for player in (self.user, self.computer):
+            player.board.sunk_listeners.append(self.ship_sunk)
 
-        tk.Label(self.root, text="Enemy Board").grid(row=1, column=0, columnspan=10)
-        tk.Label(self.root, text="Your Board").grid(row=1, column=11, columnspan=10)
+    def place_fleets(self):
+        self.user.board.place_fleet(self.ship_sizes, self.rng)
+        self.computer.board.place_fleet(self.ship_sizes, self.rng)
 
-        self.enemy_frame = tk.Frame(self.root)
-        self.enemy_frame.grid(row=2, column=0, columnspan=10)
-        tk.Label(self.root, text=" " * 5).grid(row=2, column=10)
-        self.user_frame = tk.Frame(self.root)
-        self.user_frame.grid(row=2, column=11, columnspan=10)
+    def begin_move(self):
+        self.changed = []
+        self.sunk = []
 
-        self.enemy_buttons = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        self.user_buttons = [[None for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
+    def cancel(self):
+        """Stop a move running in another thread at its next shot or targeting step"""
+        self.cancelled.set()
 
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                e_btn = tk.Button(self.enemy_frame, width=2, height=1,
-                                  command=lambda r=r, c=c: self.enemy_clicked(r, c))
-                e_btn.grid(row=r, column=c)
-                self.enemy_buttons[r][c] = e_btn
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise MoveCancelled()
 
-                u_btn = tk.Button(self.user_frame, width=2, height=1)
-                u_btn.grid(row=r, column=c)
-                if self.user.board.grid[r][c].has_ship:
-                    u_btn.config(bg='gray')
-                self.user_buttons[r][c] = u_btn
+    def ship_sunk(self, board, ship):
+        self.sunk.append(ship)
 
-        powerup_frame = tk.Frame(self.root)
-        powerup_frame.grid(row=3, column=0, columnspan=20, pady=10)
-        
-        # Display difficulty
-        difficulty_label = tk.Label(powerup_frame, text=f"Difficulty: {self.difficulty}")
-        difficulty_label.pack(side=tk.RIGHT, padx=10)
-        
-        # Powerup buttons
-        self.powerup_buttons = {}
-        self.powerup_buttons['Missile'] = tk.Button(powerup_frame, text="Missile (3)", command=lambda: self.set_powerup('Missile'))
-        self.powerup_buttons['Missile'].pack(side=tk.LEFT, padx=5)
-        self.powerup_buttons['Destroyer'] = tk.Button(powerup_frame, text="Destroyer (1)", command=lambda: self.set_powerup('Destroyer'))
-        self.powerup_buttons['Destroyer'].pack(side=tk.LEFT, padx=5)
-        self.powerup_buttons['Intel'] = tk.Button(powerup_frame, text="Intel (2)", command=lambda: self.set_powerup('Intel'))
-        self.powerup_buttons['Intel'].pack(side=tk.LEFT, padx=5)
+    def shoot(self, board, r, c):
+        """Shoot a cell and remember it for the view. Returns True on a hit"""
+        self.check_cancelled()
+        sunk_before = len(self.sunk)
+        hit = board.shoot(r, c)
+        self.changed.append((r, c))
+        if self.move_log is not None:
+            side = 'computer' if board is self.user.board else 'user'
+            self.move_log(self, 'shot', side, (r, c), hit)
+            for ship in self.sunk[sunk_before:]:
+                self.move_log(self, 'sunk', side, ship.positions[0], ship.size)
+        return hit
 
-    def set_powerup(self, kind):
-        if self.user.powerups[kind] > 0:
-            self.powerup_mode = kind
-            self.status.config(text=f"{kind} selected! Click a cell to use.")
+    def log_powerup(self, attacker, kind, cell):
+        if self.move_log is not None:
+            self.move_log(self, 'powerup', 'user' if attacker.is_user else 'computer', cell, kind)
+
+    def end_turn(self, defender, winner):
+        if defender.board.all_ships_sunk():
+            self.winner = winner
+            if self.move_log is not None:
+                self.move_log(self, 'end', 'computer' if defender.is_user else 'user', None, winner)
         else:
-            self.status.config(text=f"No {kind}s left!")
+            self.turn += 1
 
-    def enemy_clicked(self, r, c):
-        if self.turn % 2 != 0:
-            return
+    def players(self, side):
+        """(attacker, defender, turn parity) for a side moving by hand: 'user' or 'computer'"""
+        if side == 'user':
+            return self.user, self.computer, 0
+        return self.computer, self.user, 1
 
-        if self.powerup_mode:
-            self.use_powerup(r, c)
-            return
+    def fire(self, r, c, side='user'):
+        """A player's shot at the other board. Returns the changed cells, or None if the shot is not allowed.
 
-        cell = self.computer.board.grid[r][c]
-        if cell.hit:
-            return
-        cell.hit = True
-        self.update_button(r, c, cell, self.enemy_buttons)
-        self.check_ship_sunk(self.computer.board, self.enemy_buttons)
-        self.status.config(text=f"You {'hit!' if cell.has_ship else 'missed.'}")
-        if self.computer.board.all_ships_sunk():
-            messagebox.showinfo("Game Over", "You Win!")
-            self.root.quit()
-        else:
-            self.turn += 1
-            self.root.after(1000, self.computer_turn)
+        `side` is 'user' for the GUI player; 'computer' lets a second human
+        play that side (e.g. over the network) instead of the AI.
+        """
+        attacker, defender, parity = self.players(side)
+        if self.winner or self.turn % 2 != parity:
+            return None
+        if not (0 <= r < self.board_size and 0 <= c < self.board_size) or defender.board.is_shot(r, c):
+            return None
+        self.begin_move()
+        hit = self.shoot(defender.board, r, c)
+        self.status = f"You {'hit!' if hit else 'missed.'}"
+        self.end_turn(defender, side)
+        return self.changed
 
-    def use_powerup(self, r, c):
-        kind = self.powerup_mode
-        if self.user.powerups[kind] <= 0:
-            self.status.config(text=f"No {kind}s left!")
-            self.powerup_mode = None
-            return
+    def use_powerup(self, kind, r, c, side='user'):
+        """A player's powerup aimed at (r, c). Returns the changed cells, or None if it can't be used.
+
+        Raises ValueError if (r, c) is off the board.
+        """
+        if not (0 <= r < self.board_size and 0 <= c < self.board_size):
+            raise ValueError(f"({r}, {c}) is off the {self.board_size}x{self.board_size} board")
+        attacker, defender, parity = self.players(side)
+        if self.winner or self.turn % 2 != parity:
+            return None
+        if attacker.powerups.get(kind, 0) <= 0:
+            self.status = f"No {kind}s left!"
+            return None
 
+        board = defender.board
+        n = board.size
+        self.begin_move()
+        self.log_powerup(attacker, kind, None if kind == 'Intel' else (r, c))
         if kind == 'Missile':
             for dr in range(-1, 2):
                 for dc in range(-1, 2):
                     nr, nc = r + dr, c + dc
-                    if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
-                        cell = self.computer.board.grid[nr][nc]
-                        if not cell.hit:
-                            cell.hit = True
-                            self.update_button(nr, nc, cell, self.enemy_buttons)
+                    if 0 <= nr < n and 0 <= nc < n and not board.is_shot(nr, nc):
+                        self.shoot(board, nr, nc)
         elif kind == 'Destroyer':
-            for i in range(BOARD_SIZE):
-                cell = self.computer.board.grid[r][i]
-                if not cell.hit:
-                    cell.hit = True
-                    self.update_button(r, i, cell, self.enemy_buttons)
+            for i in range(n):
+                if not board.is_shot(r, i):
+                    self.shoot(board, r, i)
         elif kind == 'Intel':
-            shots = 0
-            while shots < 5:
-                rr, cc = random.randint(0, 9), random.randint(0, 9)
-                cell = self.computer.board.grid[rr][cc]
-                if not cell.hit:
-                    cell.hit = True
-                    self.update_button(rr, cc, cell, self.enemy_buttons)
-                    shots += 1
-
-        self.user.powerups[kind] -= 1
-        self.powerup_buttons[kind].config(text=f"{kind} ({self.user.powerups[kind]})")
-        if self.user.powerups[kind] == 0:
-            self.powerup_buttons[kind].config(state=tk.DISABLED)
+            unhit_cells = self.get_random_unhit_cells(board, 5)
+            for rr, cc in unhit_cells:
+                self.shoot(board, rr, cc)
 
-        self.check_ship_sunk(self.computer.board, self.enemy_buttons)
-        self.status.config(text=f"{kind} used.")
-        self.powerup_mode = None
-        if self.computer.board.all_ships_sunk():
-            messagebox.showinfo("Game Over", "You Win!")
-            self.root.quit()
-        else:
-            self.turn += 1
-            self.root.after(1000, self.computer_turn)
+        attacker.powerups[kind] -= 1
+        self.status = f"{kind} used."
+        self.end_turn(defender, side)
+        return self.changed
 
     def computer_turn(self):
-        if self.difficulty == "Hard":
-            self.hard_mode_turn()
-        else:
-            self.easy_mode_turn()
+        """Play the computer's move. Returns the changed cells on the user board"""
+        return self.ai_turn(self.computer, self.user, self.difficulty)
+
+    def ai_side(self):
+        """(attacker, defender, difficulty) of the side to move"""
+        if self.turn % 2 == 0:
+            return self.user, self.computer, self.user_difficulty
+        return self.computer, self.user, self.difficulty
+
+    def play_ai_turn(self, target=None):
+        """Play whichever side is to move with the AI (used for self-play).
 
-    def easy_mode_turn(self):
+        `target` is a shot already picked for a Hard side (see batch_attack),
+        played unless the AI goes for a powerup.
+        """
+        return self.ai_turn(*self.ai_side(), target)
+
+    def ai_turn(self, attacker, defender, difficulty, target=None):
+        if self.winner:
+            return []
+        self.begin_move()
+        with metrics.timer('turn.' + ('strategy' if attacker.ai is not None else difficulty.lower())):
+            if attacker.ai is not None:
+                attacker.ai.move(self, attacker, defender)
+            elif difficulty == "Hard":
+                self.hard_mode_turn(attacker, defender, target)
+            elif difficulty == "Learned":
+                self.hard_mode_turn(attacker, defender, difficulty="Learned")
+            else:
+                self.easy_mode_turn(attacker, defender)
+        self.end_turn(defender, 'computer' if defender.is_user else 'user')
+        if not self.winner:
+            self.status = "Your Turn"
+        return self.changed
+
+    def easy_mode_turn(self, attacker, defender):
+        n = defender.board.size
         # Random chance to use a powerup
-        if random.random() < 0.4:  # 40% chance to use a powerup
-            available_powerups = [p for p, count in self.computer.powerups.items() if count > 0]
+        if self.rng.random() < 0.4:  # 40% chance to use a powerup
+            available_powerups = [p for p, count in attacker.powerups.items() if count > 0]
             if available_powerups:
-                powerup = random.choice(available_powerups)
-                self.use_computer_powerup(powerup)
+                powerup = self.rng.choice(available_powerups)
+                with metrics.timer('powerup.' + powerup.lower()):
+                    self.use_computer_powerup(attacker, defender, powerup, "Easy")
                 return
 
         # First check if we need to clear the target queue if we've sunk ships
-        self.clear_sunk_ship_targets()
+        self.clear_sunk_ship_targets(attacker, defender)
         
         # If we have targets in the queue (from previous hits), use those first
-        if self.computer.target_queue:
-            r, c = self.computer.target_queue.pop(0)
+        if attacker.target_queue:
+            r, c = attacker.target_queue.pop(0)
             # Skip invalid or already-hit cells
-            while (r < 0 or r >= BOARD_SIZE or c < 0 or c >= BOARD_SIZE 
-                  or self.user.board.grid[r][c].hit):
-                if not self.computer.target_queue:
+            while (r < 0 or r >= n or c < 0 or c >= n 
+                  or defender.board.is_shot(r, c)):
+                if not attacker.target_queue:
                     # If all targets are invalid, pick a random cell
-                    r, c = self.get_random_unhit_cell()
+                    r, c = self.get_random_unhit_cell(defender.board)
                     break
-                r, c = self.computer.target_queue.pop(0)
+                r, c = attacker.target_queue.pop(0)
         else:
             # Random shot if no targets
-            r, c = self.get_random_unhit_cell()
+            r, c = self.get_random_unhit_cell(defender.board)
 
-        cell = self.user.board.grid[r][c]
-        cell.hit = True
-        self.update_button(r, c, cell, self.user_buttons)
+        hit = self.shoot(defender.board, r, c)
 
         # If it's a hit, add adjacent cells to the target queue
-        if cell.has_ship:
-            self.last_hit = (r, c)
-            self.computer.current_hunt.append((r, c))
+        if hit:
+            attacker.last_hit = (r, c)
+            attacker.current_hunt.append((r, c))
             
             # Add adjacent cells to target queue
             for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
                 nr, nc = r + dr, c + dc
-                if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and 
-                    not self.user.board.grid[nr][nc].hit and
-                    (nr, nc) not in self.computer.target_queue):
-                    self.computer.target_queue.append((nr, nc))
+                if (0 <= nr < n and 0 <= nc < n and 
+                    not defender.board.is_shot(nr, nc) and
+                    (nr, nc) not in attacker.target_queue):
+                    attacker.target_queue.append((nr, nc))
             
             # If we have more than one hit on the same ship, prioritize in-line shots
-            if len(self.computer.current_hunt) > 1:
-                self.prioritize_inline_targets(r, c)
-        
-        self.finish_computer_turn()
+            if len(attacker.current_hunt) > 1:
+                self.prioritize_inline_targets(attacker, defender, r, c)
 
-    def clear_sunk_ship_targets(self):
+    def clear_sunk_ship_targets(self, attacker, defender):
         # Check if we need to clear target queue because we've completed a ship
-        if self.computer.current_hunt:
+        if attacker.current_hunt:
             # Check if all positions in current_hunt belong to the same ship
-            sample_r, sample_c = self.computer.current_hunt[0]
-            ship = self.user.board.find_ship_by_position(sample_r, sample_c)
+            sample_r, sample_c = attacker.current_hunt[0]
+            ship = defender.board.find_ship_by_position(sample_r, sample_c)
             
-            if ship and ship.is_sunk(self.user.board):
+            if ship and ship.is_sunk(defender.board):
                 # Clear current hunt and target queue if ship is sunk
-                self.computer.current_hunt = []
-                self.computer.target_queue = []
-                self.last_hit = None
+                attacker.current_hunt = []
+                attacker.target_queue = []
+                attacker.last_hit = None
 
-    def prioritize_inline_targets(self, r, c):
+    def prioritize_inline_targets(self, attacker, defender, r, c):
         """Prioritize targets that are in line with existing hits"""
-        if len(self.computer.current_hunt) < 2:
+        hunt = attacker.current_hunt
+        if len(hunt) < 2:
             return
+        board = defender.board
+        n = board.size
             
         # Determine if hits are in a horizontal or vertical line
-        is_horizontal = all(hit[0] == self.computer.current_hunt[0][0] for hit in self.computer.current_hunt)
-        is_vertical = all(hit[1] == self.computer.current_hunt[0][1] for hit in self.computer.current_hunt)
+        is_horizontal = all(hit[0] == hunt[0][0] for hit in hunt)
+        is_vertical = all(hit[1] == hunt[0][1] for hit in hunt)
         
         if is_horizontal:
             # Prioritize cells on the same row
-            row = self.computer.current_hunt[0][0]
-            cols = [hit[1] for hit in self.computer.current_hunt]
+            row = hunt[0][0]
+            cols = [hit[1] for hit in hunt]
             min_col, max_col = min(cols), max(cols)
             
             # Clear current queue
-            self.computer.target_queue = []
+            attacker.target_queue = []
             
             # Add cells to left and right
-            if min_col - 1 >= 0 and not self.user.board.grid[row][min_col - 1].hit:
-                self.computer.target_queue.append((row, min_col - 1))
-            if max_col + 1 < BOARD_SIZE and not self.user.board.grid[row][max_col + 1].hit:
-                self.computer.target_queue.append((row, max_col + 1))
+            if min_col - 1 >= 0 and not board.is_shot(row, min_col - 1):
+                attacker.target_queue.append((row, min_col - 1))
+            if max_col + 1 < n and not board.is_shot(row, max_col + 1):
+                attacker.target_queue.append((row, max_col + 1))
                 
         elif is_vertical:
             # Prioritize cells in the same column
-            col = self.computer.current_hunt[0][1]
-            rows = [hit[0] for hit in self.computer.current_hunt]
+            col = hunt[0][1]
+            rows = [hit[0] for hit in hunt]
             min_row, max_row = min(rows), max(rows)
             
             # Clear current queue
-            self.computer.target_queue = []
+            attacker.target_queue = []
             
             # Add cells above and below
-            if min_row - 1 >= 0 and not self.user.board.grid[min_row - 1][col].hit:
-                self.computer.target_queue.append((min_row - 1, col))
-            if max_row + 1 < BOARD_SIZE and not self.user.board.grid[max_row + 1][col].hit:
-                self.computer.target_queue.append((max_row + 1, col))
+            if min_row - 1 >= 0 and not board.is_shot(min_row - 1, col):
+                attacker.target_queue.append((min_row - 1, col))
+            if max_row + 1 < n and not board.is_shot(max_row + 1, col):
+                attacker.target_queue.append((max_row + 1, col))
 
-    def get_random_unhit_cell(self):
-        unhit_cells = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE) 
-                       if not self.user.board.grid[r][c].hit]
-        return random.choice(unhit_cells)
+    def get_random_unhit_cell(self, board):
+        return self.rng.choice(board.unhit_cells())
 
-    def hard_mode_turn(self):
+    def get_random_unhit_cells(self, board, count):
+        unhit_cells = board.unhit_cells()
+        return self.rng.sample(unhit_cells, min(count, len(unhit_cells)))
+
+    def hard_mode_turn(self, attacker, defender, target=None, difficulty="Hard"):
+        """A Hard move; a Learned move takes the same steps with the learned policy's heatmap"""
         # Random chance to use a powerup
-        if random.random() < 0.75:  # 30% chance to use a powerup in hard mode
-            available_powerups = [p for p, count in self.computer.powerups.items() if count > 0]
+        if self.rng.random() < 0.75:  # 30% chance to use a powerup in hard mode
+            available_powerups = [p for p, count in attacker.powerups.items() if count > 0]
             if available_powerups:
-                powerup = random.choice(available_powerups)
-                self.use_computer_powerup(powerup)
+                powerup = self.rng.choice(available_powerups)
+                with metrics.timer('powerup.' + powerup.lower()):
+                    self.use_computer_powerup(attacker, defender, powerup, difficulty)
                 return
 
         # Use enhanced Monte Carlo algorithm for targeting
-        r, c = enhanced_monte_carlo_attack(self.computer, self.user.board)
-        cell = self.user.board.grid[r][c]
-        cell.hit = True
-        self.update_button(r, c, cell, self.user_buttons)
-        
-        self.finish_computer_turn()
+        r, c = target or self.hard_target(attacker, defender, difficulty)
+        self.shoot(defender.board, r, c)
 
-    def use_computer_powerup(self, kind):
-        self.computer.powerups[kind] -= 1
-        hits_found = False
+    def targeting_settings(self, attacker):
+        """(strategy, simulations) of the Hard AI playing as attacker"""
+        ai = attacker.ai
+        if ai is not None and ai.targeting:
+            return ai.targeting, ai.simulations or DEFAULT_SIMULATIONS.get(ai.targeting, 1000)
+        strategy = self.user_strategy if attacker.is_user else self.strategy
+        return strategy, self.simulations or DEFAULT_SIMULATIONS.get(strategy, 1000)
+
+    def hard_target(self, attacker, defender, difficulty="Hard"):
+        self.check_cancelled()
+        if difficulty == "Learned":
+            return best_cell(learned_heatmap(defender.board), defender.board, self.rng)
+        strategy, simulations = self.targeting_settings(attacker)
+        self.search_stats = {}
+        return enhanced_monte_carlo_attack(attacker, defender.board, simulations, self.rng, strategy, self.sampler,
+                                           self.search_stats)
+
+    def hard_heatmap(self, attacker, defender, difficulty="Hard"):
+        """One heatmap of the defender's board for planning a powerup"""
+        self.check_cancelled()
+        if difficulty == "Learned":
+            return learned_heatmap(defender.board)
+        strategy, simulations = self.targeting_settings(attacker)
+        return targeting_heatmap(defender.board, simulations, self.rng, strategy, self.sampler)
+
+    def use_computer_powerup(self, attacker, defender, kind, difficulty):
+        attacker.powerups[kind] -= 1
+        board = defender.board
+        n = board.size
+        affected_positions = []
         
         if kind == 'Missile':
-            # Use enhanced Monte Carlo in hard mode for better targeting
-            r, c = enhanced_monte_carlo_attack(self.computer, self.user.board) if self.difficulty == "Hard" else self.get_random_unhit_cell()
-            affected_positions = []
+            if difficulty != "Easy":
+                # Aim at the 3x3 box holding the most heat, among boxes with a cell left to hit
+                heatmap = self.hard_heatmap(attacker, defender, difficulty)
+                unshot = list(iter_bits(board.full_mask & ~board.shot_mask))
+                open_cells = [0] * (n * n)
+                for i in unshot:
+                    open_cells[i] = 1
+                centers = [i for i, count in enumerate(targeting.box_scores(open_cells, n)) if count]
+                r, c = board.cell(targeting.top_cells(targeting.box_scores(heatmap, n), centers, 1, self.rng)[0])
+            else:
+                r, c = self.get_random_unhit_cell(board)
+            self.log_powerup(attacker, kind, (r, c))
             
             for dr in range(-1, 2):
                 for dc in range(-1, 2):
                     nr, nc = r + dr, c + dc
-                    if 0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE:
-                        cell = self.user.board.grid[nr][nc]
-                        if not cell.hit:
-                            cell.hit = True
-                            self.update_button(nr, nc, cell, self.user_buttons)
-                            if cell.has_ship and self.difficulty == "Easy":
-                                hits_found = True
-                                affected_positions.append((nr, nc))
+                    if 0 <= nr < n and 0 <= nc < n and not board.is_shot(nr, nc):
+                        hit = self.shoot(board, nr, nc)
+                        if hit and difficulty == "Easy":
+                            affected_positions.append((nr, nc))
             
-            # Add hits to current hunt for tracking
-            if self.difficulty == "Easy" and affected_positions:
-                self.computer.current_hunt.extend(affected_positions)
-                self.last_hit = affected_positions[-1]
-                self.update_target_queue_after_powerup()
-            
-            self.status.config(text="Computer used Missile!")
+            self.status = "Computer used Missile!"
             
         elif kind == 'Destroyer':
-            # In hard mode, use enhanced Monte Carlo to find a promising row
-            if self.difficulty == "Hard":
-                best_row = -1
-                max_score = -1
-                
-                # Evaluate each row
-                for row in range(BOARD_SIZE):
-                    unhit_cells = [(row, c) for c in range(BOARD_SIZE) if not self.user.board.grid[row][c].hit]
-                    if not unhit_cells:
-                        continue
-                    
-                    # Count hits on this row to prioritize rows with hits
-                    hit_count = sum(1 for c in range(BOARD_SIZE)
-                                   if self.user.board.grid[row][c].hit and self.user.board.grid[row][c].has_ship)
-                    
-                    # Score based on unhit cells and existing hits
-                    score = len(unhit_cells) + hit_count * 2
-                    
-                    if score > max_score:
-                        max_score = score
-                        best_row = row
-                
-                # If no good row found, choose random
-                r = best_row if best_row != -1 else random.randint(0, BOARD_SIZE - 1)
+            if difficulty != "Easy":
+                # The row holding the most heat, among rows with a cell left to hit
+                heatmap = self.hard_heatmap(attacker, defender, difficulty)
+                rows = [row for row in range(n) if board.row_mask(row) & ~board.shot_mask]
+                r = targeting.top_cells(targeting.row_scores(heatmap, n), rows, 1, self.rng)[0]
             else:
-                r = random.randint(0, BOARD_SIZE - 1)
-                
-            affected_positions = []
+                r = self.rng.randint(0, n - 1)
+            self.log_powerup(attacker, kind, (r, 0))
             
-            for c in range(BOARD_SIZE):
-                cell = self.user.board.grid[r][c]
-                if not cell.hit:
-                    cell.hit = True
-                    self.update_button(r, c, cell, self.user_buttons)
-                    if cell.has_ship and self.difficulty == "Easy":
-                        hits_found = True
+            for c in range(n):
+                if not board.is_shot(r, c):
+                    hit = self.shoot(board, r, c)
+                    if hit and difficulty == "Easy":
                         affected_positions.append((r, c))
             
-            # Add hits to current hunt for tracking
-            if self.difficulty == "Easy" and affected_positions:
-                self.computer.current_hunt.extend(affected_positions)
-                self.last_hit = affected_positions[-1]
-                self.update_target_queue_after_powerup()
-            
-            self.status.config(text=f"Computer used Destroyer on row {r+1}!")
+            self.status = f"Computer used Destroyer on row {r+1}!"
             
         elif kind == 'Intel':
-            shots = 0
-            affected_positions = []
-            
-            # In hard mode, use more strategic intel
-            if self.difficulty == "Hard":
-                # Create a probability map
-                for _ in range(5):
-                    r, c = enhanced_monte_carlo_attack(self.computer, self.user.board)
-                    cell = self.user.board.grid[r][c]
-                    if not cell.hit:
-                        cell.hit = True
-                        self.update_button(r, c, cell, self.user_buttons)
-                        shots += 1
+            self.log_powerup(attacker, kind, None)
+            if difficulty != "Easy":
+                # The five hottest cells of a single heatmap
+                heatmap = self.hard_heatmap(attacker, defender, difficulty)
+                unshot = iter_bits(board.full_mask & ~board.shot_mask)
+                for i in targeting.top_cells(heatmap, unshot, 5, self.rng):
+                    if board.all_ships_sunk():
+                        break
+                    self.shoot(board, *board.cell(i))
             else:
-                while shots < 5:
-                    r, c = self.get_random_unhit_cell()
-                    cell = self.user.board.grid[r][c]
-                    cell.hit = True
-                    self.update_button(r, c, cell, self.user_buttons)
-                    shots += 1
-                    if cell.has_ship:
-                        hits_found = True
+                for r, c in self.get_random_unhit_cells(board, 5):
+                    if self.shoot(board, r, c):
                         affected_positions.append((r, c))
             
-            # Add hits to current hunt for tracking
-            if self.difficulty == "Easy" and affected_positions:
-                self.computer.current_hunt.extend(affected_positions)
-                self.last_hit = affected_positions[-1]
-                self.update_target_queue_after_powerup()
-            
-            self.status.config(text="Computer used Intel to scan 5 cells!")
-        
-        self.finish_computer_turn()
+            self.status = "Computer used Intel to scan 5 cells!"
 
-    def update_target_queue_after_powerup(self):
+        # Add hits to current hunt for tracking
+        if difficulty == "Easy" and affected_positions:
+            attacker.current_hunt.extend(affected_positions)
+            attacker.last_hit = affected_positions[-1]
+            self.update_target_queue_after_powerup(attacker, defender)
+
+    def update_target_queue_after_powerup(self, attacker, defender):
         """Update target queue after powerup use"""
         # First check if any ships were sunk
-        self.clear_sunk_ship_targets()
+        self.clear_sunk_ship_targets(attacker, defender)
         
         # If we have current hunt coordinates, add adjacent cells
-        if self.computer.current_hunt:
+        if attacker.current_hunt:
+            n = defender.board.size
+            hunt = attacker.current_hunt
             # Create a fresh target queue
-            self.computer.target_queue = []
+            attacker.target_queue = []
             
             # Try to identify if hits are in line
-            if len(self.computer.current_hunt) > 1:
-                is_horizontal = all(hit[0] == self.computer.current_hunt[0][0] for hit in self.computer.current_hunt)
-                is_vertical = all(hit[1] == self.computer.current_hunt[0][1] for hit in self.computer.current_hunt)
+            if len(hunt) > 1:
+                is_horizontal = all(hit[0] == hunt[0][0] for hit in hunt)
+                is_vertical = all(hit[1] == hunt[0][1] for hit in hunt)
                 
                 if is_horizontal or is_vertical:
-                    self.prioritize_inline_targets(self.computer.current_hunt[-1][0], self.computer.current_hunt[-1][1])
+                    self.prioritize_inline_targets(attacker, defender, hunt[-1][0], hunt[-1][1])
                     return
             
             # If no line pattern identified, add all adjacent cells
-            for r, c in self.computer.current_hunt:
+            for r, c in hunt:
                 for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
                     nr, nc = r + dr, c + dc
-                    if (0 <= nr < BOARD_SIZE and 0 <= nc < BOARD_SIZE and 
-                        not self.user.board.grid[nr][nc].hit and
-                        (nr, nc) not in self.computer.target_queue):
-                        self.computer.target_queue.append((nr, nc))
+                    if (0 <= nr < n and 0 <= nc < n and 
+                        not defender.board.is_shot(nr, nc) and
+                        (nr, nc) not in attacker.target_queue):
+                        attacker.target_queue.append((nr, nc))
             
             # Shuffle to make it less predictable
-            random.shuffle(self.computer.target_queue)
+            self.rng.shuffle(attacker.target_queue)
+
+def load_tk():
+    """Import tkinter into this module's tk, messagebox and ttk on first use"""
+    global tk, messagebox, ttk
+    if tk is None:
+        import tkinter
+        from tkinter import messagebox as tk_messagebox, ttk as tk_ttk
+        tk, messagebox, ttk = tkinter, tk_messagebox, tk_ttk
+    return tk
+
+class BoardCanvas:
+    """A whole board drawn on one tk.Canvas, one rectangle item per cell.
+
+    Clicks are mapped to cells from their pixel position. Colours set with
+    set_color() are only pushed to Tk by redraw(), and only for the cells whose
+    colour actually changed since the last redraw.
+    """
+
+    def __init__(self, parent, size, on_click=None, cell_px=None):
+        self.size = size
+        # Shrink the cells of large boards so the whole board stays on screen
+        cell_px = cell_px or max(MIN_CELL_PX, min(CELL_PX, BOARD_VIEW_PX // size))
+        self.cell_px = cell_px
+        self.on_click = on_click
+        self.canvas = tk.Canvas(parent, width=size * cell_px, height=size * cell_px,
+                                highlightthickness=0, bg=GRID_LINE_COLOR)
+        self.items = []
+        for r in range(size):
+            for c in range(size):
+                x, y = c * cell_px, r * cell_px
+                self.items.append(self.canvas.create_rectangle(
+                    x + 1, y + 1, x + cell_px - 1, y + cell_px - 1, fill=EMPTY_COLOR, width=0))
+        self.colors = [EMPTY_COLOR] * (size * size)  # What Tk currently shows
+        self.dirty = {}  # cell index -> colour waiting for the next redraw
+        if on_click:
+            self.canvas.bind("<Button-1>", self.clicked)
+
+    def clicked(self, event):
+        r, c = event.y // self.cell_px, event.x // self.cell_px
+        if 0 <= r < self.size and 0 <= c < self.size:
+            self.on_click(r, c)
+
+    def set_color(self, r, c, color):
+        index = r * self.size + c
+        if self.colors[index] == color:
+            self.dirty.pop(index, None)
+        else:
+            self.dirty[index] = color
+
+    def redraw(self):
+        for index, color in self.dirty.items():
+            self.canvas.itemconfig(self.items[index], fill=color)
+            self.colors[index] = color
+        self.dirty.clear()
+
+class BattleshipGUI:
+    def __init__(self, root, board_size=BOARD_SIZE, ship_sizes=None, powerups=None, strategy="montecarlo",
+                 replay_log=None, debug=False, warm=True):
+        load_tk()
+        self.root = root
+        self.root.title("Battleship")
+        self.engine = None
+        self.game_config = dict(board_size=board_size, ship_sizes=ship_sizes, powerups=powerups, strategy=strategy)
+        self.powerup_mode = None
+        self.difficulty = "Hard"  # Default to Hard difficulty
+        self.ai_executor = ThreadPoolExecutor(max_workers=1)
+        self.ai_move = None  # Future of the computer move being computed, if any
+        self.replay_log = replay_log  # replay.ReplayWriter the game is recorded to, if any
+        self.debug = debug  # Show the metrics overlay (F3 hides it)
+        self.overlay = None
+        self.overlay_shown = True
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        if warm:
+            # Runs while the difficulty is being picked. The computer's moves go
+            # through the same single worker, so the first one waits for it to finish
+            self.ai_executor.submit(warm_up, board_size, ship_sizes, strategy).add_done_callback(report_warm_up)
+
+        # Create difficulty selection before starting the game
+        self.setup_frame = tk.Frame(self.root)
+        self.setup_frame.pack(pady=20)
+        
+        tk.Label(self.setup_frame, text="Select Difficulty:").grid(row=0, column=0, padx=10)
+        self.diff_var = tk.StringVar(value="Hard")
+        # The Learned AI runs on numpy
+        choices = [d for d in DIFFICULTIES if d != "Learned" or targeting.have_numpy()]
+        diff_combo = ttk.Combobox(self.setup_frame, textvariable=self.diff_var, values=choices)
+        diff_combo.grid(row=0, column=1, padx=10)
+        
+        tk.Button(self.setup_frame, text="Start Game", command=self.start_game).grid(row=1, column=0, columnspan=2, pady=20)
 
-    def finish_computer_turn(self):
-        self.check_ship_sunk(self.user.board, self.user_buttons)
-        if self.user.board.all_ships_sunk():
+    def start_game(self):
+        self.difficulty = self.diff_var.get()
+        self.setup_frame.destroy()
+
+        self.engine = GameEngine(self.difficulty, **self.game_config)
+        self.engine.place_fleets()
+        if self.replay_log:
+            self.replay_log.record(self.engine)
+        self.user = self.engine.user
+        self.computer = self.engine.computer
+
+        self.status = tk.Label(self.root, text=f"Game Started - {self.difficulty} Mode - Your Turn")
+        self.status.grid(row=0, column=0, columnspan=3)
+
+        tk.Label(self.root, text="Enemy Board").grid(row=1, column=0)
+        tk.Label(self.root, text="Your Board").grid(row=1, column=2)
+
+        self.enemy_view = BoardCanvas(self.root, self.computer.board.size, on_click=self.enemy_clicked)
+        self.enemy_view.canvas.grid(row=2, column=0, padx=5)
+        tk.Label(self.root, text=" " * 5).grid(row=2, column=1)
+        self.user_view = BoardCanvas(self.root, self.user.board.size)
+        self.user_view.canvas.grid(row=2, column=2, padx=5)
+
+        for r, c in self.user.board.cells(self.user.board.ship_mask):
+            self.user_view.set_color(r, c, 'gray')
+        self.user_view.redraw()
+
+        powerup_frame = tk.Frame(self.root)
+        powerup_frame.grid(row=3, column=0, columnspan=3, pady=10)
+        
+        # Display difficulty
+        difficulty_label = tk.Label(powerup_frame, text=f"Difficulty: {self.difficulty}")
+        difficulty_label.pack(side=tk.RIGHT, padx=10)
+        
+        # Powerup buttons
+        self.powerup_buttons = {}
+        for kind, count in self.user.powerups.items():
+            self.powerup_buttons[kind] = tk.Button(powerup_frame, text=f"{kind} ({count})",
+                                                   command=lambda kind=kind: self.set_powerup(kind))
+            self.powerup_buttons[kind].pack(side=tk.LEFT, padx=5)
+            if count == 0:
+                self.powerup_buttons[kind].config(state=tk.DISABLED)
+
+        if self.debug:
+            self.overlay = tk.Label(self.root, justify=tk.LEFT, anchor='w', font=('Courier', 9))
+            self.overlay.grid(row=4, column=0, columnspan=3, sticky='w', padx=5)
+            self.root.bind('<F3>', self.toggle_overlay)
+            self.refresh_overlay()
+
+    def refresh_overlay(self):
+        if self.overlay_shown:
+            self.overlay.config(text=metrics.summary())
+        self.root.after(OVERLAY_MS, self.refresh_overlay)
+
+    def toggle_overlay(self, event=None):
+        self.overlay_shown = not self.overlay_shown
+        if self.overlay_shown:
+            self.overlay.grid()
+        else:
+            self.overlay.grid_remove()
+
+    def set_powerup(self, kind):
+        if self.user.powerups[kind] > 0:
+            self.powerup_mode = kind
+            self.status.config(text=f"{kind} selected! Click a cell to use.")
+        else:
+            self.status.config(text=f"No {kind}s left!")
+
+    def enemy_clicked(self, r, c):
+        if self.engine.turn % 2 != 0 or self.ai_move:
+            return
+
+        with metrics.timer('gui.user_move'):
+            if self.powerup_mode:
+                self.use_powerup(r, c)
+                return
+
+            changed = self.engine.fire(r, c)
+            if changed is None:
+                return
+            self.show_user_move(changed)
+
+    def use_powerup(self, r, c):
+        kind = self.powerup_mode
+        self.powerup_mode = None
+        changed = self.engine.use_powerup(kind, r, c)
+        if changed is None:
+            self.status.config(text=self.engine.status)
+            return
+
+        self.powerup_buttons[kind].config(text=f"{kind} ({self.user.powerups[kind]})")
+        if self.user.powerups[kind] == 0:
+            self.powerup_buttons[kind].config(state=tk.DISABLED)
+        self.show_user_move(changed)
+
+    def show_user_move(self, changed):
+        self.show_shots(changed, self.computer.board, self.enemy_view)
+        self.status.config(text=self.engine.status)
+        if self.engine.winner:
+            messagebox.showinfo("Game Over", "You Win!")
+            self.root.quit()
+        else:
+            self.start_computer_turn()
+
+    def start_computer_turn(self):
+        """Compute the computer's move on a worker thread.
+
+        The move starts right away, so the usual pause before it is shown hides
+        the thinking time, and the Tk loop keeps repainting and handling events
+        meanwhile. The result comes back to this thread through root.after.
+        """
+        engine = self.engine
+        self.ai_move = self.ai_executor.submit(engine.computer_turn)
+        self.root.after(AI_POLL_MS, self.poll_computer_turn, engine, self.ai_move,
+                        time.monotonic() + AI_DELAY_MS / 1000)
+
+    def poll_computer_turn(self, engine, move, show_at):
+        if move is not self.ai_move or engine is not self.engine:
+            return  # The move was cancelled or the game was replaced
+        if not move.done() or time.monotonic() < show_at:
+            self.root.after(AI_POLL_MS, self.poll_computer_turn, engine, move, show_at)
+            return
+        self.ai_move = None
+        try:
+            changed = move.result()
+        except Exception as error:
+            # An exception left to the Tk callback would leave the game waiting on the computer for good
+            traceback.print_exception(error)
+            failed = engine.difficulty
+            if failed != "Hard":
+                # Hard needs nothing beyond the game itself, so let it finish the game
+                engine.difficulty = self.difficulty = "Hard"
+                self.status.config(text=f"The {failed} AI failed; the computer plays Hard from now on")
+                messagebox.showerror("Computer move failed", f"{type(error).__name__}: {error}\n\n"
+                                     "The computer plays Hard from now on.")
+                self.start_computer_turn()
+            else:
+                self.status.config(text="The computer's move failed")
+                messagebox.showerror("Computer move failed", f"{type(error).__name__}: {error}")
+            return
+        self.computer_turn(changed)
+
+    def cancel_computer_turn(self):
+        if self.ai_move:
+            self.engine.cancel()
+            self.ai_move.cancel()
+            self.ai_move = None
+
+    def close(self):
+        self.cancel_computer_turn()
+        self.ai_executor.shutdown(wait=False, cancel_futures=True)
+        if self.engine and self.engine.move_log:
+            self.engine.move_log.finish()  # Keep an unfinished game in the log too
+        self.root.destroy()
+
+    def computer_turn(self, changed):
+        with metrics.timer('gui.computer_turn'):
+            self.show_shots(changed, self.user.board, self.user_view)
+        if self.engine.winner:
             messagebox.showinfo("Game Over", "Computer Wins!")
             self.root.quit()
         else:
-            self.turn += 1
-            self.status.config(text="Your Turn")
+            self.status.config(text=self.engine.status)
 
-    def update_button(self, r, c, cell, button_grid):
-        btn = button_grid[r][c]
-        if cell.hit:
-            btn.config(bg='red' if cell.has_ship else 'blue')
+    def show_shots(self, changed, board, view):
+        with metrics.timer('gui.repaint'):
+            for r, c in changed:
+                self.update_cell(r, c, board, view)
+            with metrics.timer('gui.sunk_repaint'):
+                self.check_ship_sunk(self.engine.sunk, view)
+            view.redraw()
 
-    def check_ship_sunk(self, board, button_grid):
-        for ship in board.ships:
-            if ship.is_sunk(board):
-                for r, c in ship.positions:
-                    button_grid[r][c].config(bg='darkred')
+    def update_cell(self, r, c, board, view):
+        if board.is_shot(r, c):
+            view.set_color(r, c, 'red' if board.find_ship_by_position(r, c) else 'blue')
+
+    def check_ship_sunk(self, ships, view):
+        """Repaint the ships the last move sank"""
+        for ship in ships:
+            for r, c in ship.positions:
+                view.set_color(r, c, 'darkred')
+
+def play_headless(user_difficulty="Hard", difficulty="Hard", seed=None, replay_log=None, **config):
+    """Play one game with no window and the AI on both sides. `config` goes to
+    GameEngine (board_size, strategy, ...). Returns the finished engine"""
+    engine = GameEngine(difficulty, seed=seed, user_difficulty=user_difficulty, **config)
+    engine.place_fleets()
+    if replay_log:
+        replay_log.record(engine)
+    while not engine.winner:
+        engine.play_ai_turn()
+    return engine
+
+def main():
+    parser = argparse.ArgumentParser(description="Battleship")
+    parser.add_argument('--size', type=int, default=BOARD_SIZE, help="board size (up to %d)" % MAX_BOARD_SIZE)
+    parser.add_argument('--fleet', type=parse_fleet, default=None,
+                        help="ship sizes, e.g. 5,4,3,3,2 or 5x4,4x8,3x12 (size x count)")
+    parser.add_argument('--powerups', type=int, nargs=3, metavar=('MISSILE', 'DESTROYER', 'INTEL'),
+                        help="powerups each side starts with")
+    parser.add_argument('--strategy', choices=TARGETING_STRATEGIES, default=None,
+                        help="Hard AI targeting (default: montecarlo on the classic board, exact on larger ones)")
+    parser.add_argument('--record', default=None, help="replay log to append the game to")
+    parser.add_argument('--debug', action='store_true', help="collect metrics and show them under the boards")
+    parser.add_argument('--metrics', default=None,
+                        help="collect metrics and write them here on exit (Prometheus text for .prom, else JSON)")
+    parser.add_argument('--book', default=None, help="opening book to use instead of openings.book ('' for none)")
+    parser.add_argument('--no-warm-up', dest='warm_up', action='store_false',
+                        help="don't build the AI's tables in the background while the difficulty is picked")
+    parser.add_argument('--headless', nargs=2, metavar=('USER', 'COMPUTER'), default=None,
+                        help="play one game without a window, these difficulties on each side, and print the result")
+    parser.add_argument('--seed', type=int, default=None, help="seed of a --headless game")
+    args = parser.parse_args()
+    if args.headless and not set(args.headless) <= set(DIFFICULTIES):
+        parser.error(f"--headless difficulties must be among {', '.join(DIFFICULTIES)}")
+
+    strategy = args.strategy or ("montecarlo" if args.size == BOARD_SIZE else "exact")
+    powerups = dict(zip(POWERUPS, args.powerups)) if args.powerups else None
+    check_game_config(args.size, args.fleet or SHIP_SIZES)
+    if args.book is not None:
+        try:
+            openings.configure_default_book(args.book)
+        except FileNotFoundError:
+            parser.error(f"no opening book at {args.book}")
+
+    replay_log = None
+    if args.record:
+        from replay import ReplayWriter
+        replay_log = ReplayWriter(args.record)
+
+    metrics.enable(args.debug or bool(args.metrics))
+
+    if args.headless:
+        start = time.perf_counter()
+        engine = play_headless(*args.headless, seed=args.seed, replay_log=replay_log, strategy=strategy,
+                               board_size=args.size, ship_sizes=args.fleet, powerups=powerups)
+        winner = args.headless[0] + " (user side)" if engine.winner == 'user' else args.headless[1] + " (computer)"
+        print(f"{winner} won after {engine.turn + 1} turns in {time.perf_counter() - start:.2f}s")
+    else:
+        root = load_tk().Tk()
+        app = BattleshipGUI(root, args.size, args.fleet, powerups, strategy, replay_log, args.debug, args.warm_up)
+        root.mainloop()
+    if args.metrics:
+        metrics.write(args.metrics)
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = BattleshipGUI(root)
-    root.mainloop()
\ No newline at end of file
+    main()
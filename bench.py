@@ -0,0 +1,217 @@
+"""Benchmarks for AI latency, fleet placement, batched targeting and full-game throughput.
+
+Every scenario is built from a fixed seed, so two runs measure the same work.
+Results are written as JSON; pass an earlier file with --compare to see how
+each number moved.
+
+Example:
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+
+import fleets
+import targeting
+from battleship import (BATCH_SIMULATIONS, DEFAULT_SIMULATIONS, SHIP_SIZES, TARGETING_STRATEGIES, Board,
+                        GameEngine, batch_attack, enhanced_monte_carlo_attack, parse_fleet)
+from selfplay import play_game
+
+# Large-board scenario: board size, fleet, and how many moves of one game to time
+LARGE_BOARD = (100, '5x4,4x8,3x14,2x14', 1000)
+
+# Fleets per random_fleets call in the bulk placement benchmark
+BULK_FLEETS = 100000
+
+# Midgame boards answered by one batch_attack call in the batch benchmark
+BATCH_BOARDS = 256
+
+# Positions the Hard AI is timed on: (water cells already missed, ships already sunk)
+POSITIONS = {
+    'empty': (0, 0),
+    'midgame': (25, 1),
+    'lategame': (55, 3),
+}
+
+
+def make_position(misses, sunk, seed):
+    """A board with a seeded fleet, `misses` shots in the water and the first `sunk` ships sunk"""
+    rng = random.Random(seed)
+    board = Board()
+    board.place_fleet(SHIP_SIZES, rng)
+    water = board.cells(board.full_mask & ~board.ship_mask)
+    for r, c in rng.sample(water, misses):
+        board.shoot(r, c)
+    for ship in board.ships[:sunk]:
+        for r, c in ship.positions:
+            board.shoot(r, c)
+    return board
+
+
+def measure(fn, repeat, budget):
+    """Run fn up to `repeat` times or until `budget` seconds are spent; return timings in ms"""
+    times = []
+    deadline = time.perf_counter() + budget
+    while len(times) < repeat and (not times or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def summary(times, **extra):
+    result = {
+        'runs': len(times),
+        'median_ms': statistics.median(times),
+        'mean_ms': statistics.fmean(times),
+        'min_ms': min(times),
+    }
+    result.update(extra)
+    return result
+
+
+def simulations_for(strategy):
+    return DEFAULT_SIMULATIONS.get(strategy, 1000)
+
+
+def bench_hard_move(strategy, position, repeat, budget, seed):
+    board = make_position(*POSITIONS[position], seed)
+    rng = random.Random(seed)
+
+    def move():
+        # A fresh copy per run, so cached strategies are timed on a cold board
+        enhanced_monte_carlo_attack(None, board.copy(), simulations_for(strategy), rng, strategy)
+
+    return summary(measure(move, repeat, budget))
+
+
+def bench_intel_burst(strategy, repeat, budget, seed):
+    """Hard Intel: one heatmap and the five shots picked from it"""
+    board = make_position(*POSITIONS['midgame'], seed)
+
+    def burst():
+        engine = GameEngine("Hard", seed=seed, strategy=strategy, simulations=simulations_for(strategy))
+        engine.user.board = board.copy()
+        engine.user.board.sunk_listeners.append(engine.ship_sunk)
+        engine.use_computer_powerup(engine.computer, engine.user, 'Intel', "Hard")
+
+    return summary(measure(burst, repeat, budget))
+
+
+def bench_large_board(strategy, seed):
+    """Per-move latency over the opening of a Hard-vs-Hard game on a large board"""
+    size, fleet, moves = LARGE_BOARD
+    engine = GameEngine("Hard", seed=seed, user_difficulty="Hard", strategy=strategy,
+                        board_size=size, ship_sizes=parse_fleet(fleet))
+    engine.place_fleets()
+    times = measure(engine.play_ai_turn, moves, float('inf'))
+    times.sort()
+    return summary(times, p99_ms=times[int(len(times) * 0.99)], max_ms=times[-1])
+
+
+def bench_batch(batched, repeat, budget, seed):
+    """BATCH_BOARDS midgame moves, from one batch_attack call or from the numpy strategy board by board"""
+    boards = [make_position(*POSITIONS['midgame'], seed + i) for i in range(BATCH_BOARDS)]
+    rng = random.Random(seed)
+
+    def batch():
+        batch_attack(boards, BATCH_SIMULATIONS, rng)
+
+    def loop():
+        for board in boards:
+            enhanced_monte_carlo_attack(None, board, BATCH_SIMULATIONS, rng, "numpy")
+
+    times = measure(batch if batched else loop, repeat, budget)
+    return summary(times, moves_per_sec=BATCH_BOARDS * 1000 / statistics.fmean(times))
+
+
+def bench_placement(repeat, budget, seed):
+    rng = random.Random(seed)
+
+    def place():
+        Board().place_fleet(SHIP_SIZES, rng)
+
+    times = measure(place, repeat, budget)
+    return summary(times, fleets_per_sec=1000 / statistics.fmean(times))
+
+
+def bench_bulk_placement(repeat, budget, seed):
+    seeds = iter(range(seed, seed + repeat))
+    times = measure(lambda: fleets.random_fleets(10, SHIP_SIZES, BULK_FLEETS, next(seeds)), repeat, budget)
+    return summary(times, fleets_per_sec=BULK_FLEETS * 1000 / statistics.fmean(times))
+
+
+def bench_games(difficulty, strategy, games, budget, seed):
+    seeds = iter(range(seed, seed + games))
+    times = measure(lambda: play_game(next(seeds), difficulty, difficulty, simulations_for(strategy),
+                                      strategy, strategy), games, budget)
+    return summary(times, games_per_sec=1000 / statistics.fmean(times))
+
+
+def run(strategies, repeat, games, budget, seed):
+    results = {}
+    for strategy in strategies:
+        for position in POSITIONS:
+            results[f'hard_move.{position}.{strategy}'] = bench_hard_move(strategy, position, repeat, budget, seed)
+        results[f'hard_intel_burst.{strategy}'] = bench_intel_burst(strategy, repeat, budget, seed)
+        results[f'games.hard.{strategy}'] = bench_games("Hard", strategy, games, budget, seed)
+    results['games.easy'] = bench_games("Easy", "montecarlo", games, budget, seed)
+    results['hard_move.large.exact'] = bench_large_board("exact", seed)
+    results['placement.fleet'] = bench_placement(repeat * 10, budget, seed)
+    if targeting.have_numpy():
+        results['placement.bulk'] = bench_bulk_placement(repeat, budget, seed)
+        results['batch_attack.loop'] = bench_batch(False, repeat, budget, seed)
+        results['batch_attack.batch'] = bench_batch(True, repeat, budget, seed)
+    return results
+
+
+def compare(results, baseline):
+    print(f"{'benchmark':40} {'before':>10} {'after':>10} {'change':>8}")
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        before, after = old['median_ms'], result['median_ms']
+        print(f"{name:40} {before:10.3f} {after:10.3f} {after / before:7.2f}x")
+
+
+def main():
+    # The parallel strategy is left out by default: its timing depends on the machine's core count
+    available = ["montecarlo", "exact", "mcmc"] + (["numpy"] if targeting.have_numpy() else [])
+    parser = argparse.ArgumentParser(description="Battleship benchmarks")
+    parser.add_argument('--strategies', nargs='+', default=available, choices=TARGETING_STRATEGIES)
+    parser.add_argument('--repeat', type=int, default=20, help="runs per latency benchmark")
+    parser.add_argument('--games', type=int, default=50, help="games per throughput benchmark")
+    parser.add_argument('--budget', type=float, default=10.0, help="max seconds per benchmark")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default="bench.json")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = run(args.strategies, args.repeat, args.games, args.budget, args.seed)
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': targeting.require_numpy().__version__ if targeting.have_numpy() else None,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:40} {result['median_ms']:10.3f} ms  ({result['runs']} runs)")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
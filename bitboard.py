@@ -0,0 +1,57 @@
+"""Bit-level helpers shared by Board and the targeting engines.
+
+A board of size n is an int with one bit per cell; bit r * n + c is cell (r, c).
+"""
+from functools import lru_cache
+
+
+# Above this many bits, iter_bits scans the binary string instead of peeling bits off
+LARGE_MASK_BITS = 1024
+
+
+def iter_bits(mask):
+    """Iterate over the index of every set bit in mask, lowest first"""
+    if mask.bit_length() > LARGE_MASK_BITS:
+        # Each big-int operation costs O(bits), so peeling bits off a 100x100
+        # board is quadratic; one pass over its binary string is linear
+        digits = bin(mask)[:1:-1]
+        return (i for i, digit in enumerate(digits) if digit == '1')
+    return _iter_low_bits(mask)
+
+
+def _iter_low_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+@lru_cache(maxsize=None)
+def placement_indices(board_size, ship_size):
+    """Cell indices of every horizontal and vertical placement of a ship"""
+    placements = []
+    for r in range(board_size):
+        for c in range(board_size - ship_size + 1):
+            start = r * board_size + c
+            placements.append(tuple(range(start, start + ship_size)))
+    for r in range(board_size - ship_size + 1):
+        for c in range(board_size):
+            start = r * board_size + c
+            placements.append(tuple(range(start, start + ship_size * board_size, board_size)))
+    return tuple(placements)
+
+
+@lru_cache(maxsize=None)
+def placement_masks(board_size, ship_size):
+    """The placements of placement_indices, as cell bitmasks"""
+    return tuple(sum(1 << i for i in cells) for cells in placement_indices(board_size, ship_size))
+
+
+@lru_cache(maxsize=None)
+def cell_placements(board_size, ship_size):
+    """For every cell, the indices (in placement_indices order) of the placements covering it"""
+    covering = [[] for _ in range(board_size * board_size)]
+    for p, cells in enumerate(placement_indices(board_size, ship_size)):
+        for i in cells:
+            covering[i].append(p)
+    return covering
@@ -0,0 +1,275 @@
+"""Exact endgame search for the Hard AI.
+
+Late in a game the ships still afloat fit on the board in only a few ways.
+When so, every fleet consistent with the board is listed, and the shot is
+picked by searching all shot sequences for the one that finishes in the
+fewest shots on average. Every consistent fleet counts as equally likely,
+and a shot ends in a miss, a hit, or a hit that sinks a ship (which shows
+the whole ship).
+
+Every cell of the real fleet has to be hit before the game ends, so the
+expected shots to finish are the fleet cells still unshot (on average) plus
+the expected misses. The search minimizes the misses:
+
+  - A cell every fleet covers cannot miss, and its outcome only adds
+    information, so such cells are shot first.
+  - Otherwise every cell some fleet covers is tried, likeliest hit first.
+    A cell is dropped as soon as a lower bound on its misses (see
+    lower_bound) is no better than the best cell found, and positions below
+    it are searched only as far as that comparison needs.
+
+Positions are memoized on (fleets still possible, shots on their cells).
+The search grows exponentially with the number of fleets in open water, so
+it only runs below ENDGAME_CONFIGURATIONS fleets and gives up after
+ENDGAME_NODES positions; the heatmap plays those moves instead.
+"""
+import random
+from collections import Counter
+from functools import lru_cache
+
+from bitboard import iter_bits, placement_masks
+
+# The search runs only when at most this many fleets fit the board
+ENDGAME_CONFIGURATIONS = 16
+
+# Fleets are only listed when the product of each ship's legal placements is at most this
+ENDGAME_PRODUCT = 50000
+
+# Positions searched for one move before giving up and leaving it to the heatmap
+ENDGAME_NODES = 1000
+
+# Placements of each ship size checked against the board per pass (see configurations)
+SCAN_SLICE = 256
+
+
+class SearchTooLarge(Exception):
+    """More fleets or positions than the limits allow"""
+
+
+@lru_cache(maxsize=None)
+def distinct_masks(size, ship_size):
+    """placement_masks without repeats; a 1-cell ship has the same mask lying either way"""
+    return tuple(dict.fromkeys(placement_masks(size, ship_size)))
+
+
+def configurations(size, blocked_mask, hit_mask, ship_sizes, limit=None):
+    """Every fleet that avoids the blocked cells, covers every hit and has no ship made only of hits.
+
+    A fleet is a tuple of ship masks. Returns None when there are more than
+    `limit` fleets, or the placements multiply out past ENDGAME_PRODUCT.
+    """
+    limit = ENDGAME_CONFIGURATIONS if limit is None else limit
+    sizes = sorted(ship_sizes, reverse=True)
+    counts = Counter(sizes)
+    # Every size is scanned a slice at a time, so on an open board the product
+    # passes ENDGAME_PRODUCT after a slice or two instead of a scan of every placement
+    legal = {s: [] for s in counts}
+    longest = max(len(distinct_masks(size, s)) for s in counts)
+    for start in range(0, longest, SCAN_SLICE):
+        product = 1
+        for s, count in counts.items():
+            # A ship lying only on hits would have been reported sunk already
+            legal[s] += [m for m in distinct_masks(size, s)[start:start + SCAN_SLICE]
+                         if not m & blocked_mask and m & ~hit_mask]
+            product *= len(legal[s]) ** count
+        if product > ENDGAME_PRODUCT:
+            return None
+    if not product:
+        return None
+    options = [legal[s] for s in sizes]
+
+    fleets = []
+    ships = []
+
+    def place(j, occupied, start):
+        if j == len(sizes):
+            if occupied & hit_mask == hit_mask:
+                fleets.append(tuple(ships))
+                if len(fleets) > limit:
+                    raise SearchTooLarge()
+            return
+        # Ships of the same size are interchangeable; list each set of them once
+        first = start if j and sizes[j] == sizes[j - 1] else 0
+        for k in range(first, len(options[j])):
+            mask = options[j][k]
+            if not mask & occupied:
+                ships.append(mask)
+                place(j + 1, occupied | mask, k + 1)
+                ships.pop()
+
+    try:
+        place(0, 0, 0)
+    except SearchTooLarge:
+        return None
+    return fleets
+
+
+class EndgameSearch:
+    """Expected-misses search over a fixed list of fleets.
+
+    A set of fleets is an int with bit i set for fleets[i]. For every cell
+    the search keeps the set of fleets with a ship there, split by which
+    ship, so a shot's outcomes are a few mask operations.
+    """
+
+    def __init__(self, fleets, node_limit=None):
+        self.fleets = fleets
+        self.count = len(fleets)
+        self.occupied = [sum(fleet) for fleet in fleets]
+        # cell -> {ship mask: set of fleets with that ship over the cell}
+        self.ships_at = {}
+        for i, fleet in enumerate(fleets):
+            for ship in fleet:
+                for cell in iter_bits(ship):
+                    by_ship = self.ships_at.setdefault(cell, {})
+                    by_ship[ship] = by_ship.get(ship, 0) | 1 << i
+        self.fleets_at = {cell: sum(by_ship.values()) for cell, by_ship in self.ships_at.items()}
+        self.memo = {}
+        self.bounds = {}
+        self.nodes = 0
+        self.node_limit = ENDGAME_NODES if node_limit is None else node_limit
+
+    def outcomes(self, configs, shot, cell):
+        """Split configs by what shooting `cell` would show: a miss, a hit, or the ship it sinks"""
+        hit = configs & self.fleets_at[cell]
+        groups = [configs & ~hit] if configs & ~hit else []
+        after = shot | 1 << cell
+        for ship, owners in self.ships_at[cell].items():
+            if ship & after == ship and owners & hit:
+                groups.append(owners & hit)
+                hit &= ~owners
+        if hit:
+            groups.append(hit)
+        return groups
+
+    def lower_bound(self, configs, shot):
+        """Expected misses can't be lower than this.
+
+        Until a shot lands on the real fleet every shot misses. With c1 >= c2 >= ...
+        fleets over each unshot cell, the first j shots reach at most
+        c1 + ... + cj fleets, and each fleet reached by shot j has cost j - 1 misses.
+        """
+        left = configs.bit_count()
+        if left == 1:
+            return 0.0
+        key = (configs, shot)
+        if key in self.bounds:
+            return self.bounds[key]
+        counts = sorted([(configs & owners).bit_count() for cell, owners in self.fleets_at.items()
+                         if not shot >> cell & 1], reverse=True)
+        total = 0
+        for j, count in enumerate(counts):
+            reached = min(count, left)
+            total += j * reached
+            left -= reached
+            if not left:
+                break
+        bound = self.bounds[key] = total / configs.bit_count()
+        return bound
+
+    def candidates(self, configs, shot):
+        """[(fleets with a ship there, cell)] for every unshot cell some fleet covers, likeliest first"""
+        cells = []
+        for cell, owners in self.fleets_at.items():
+            if configs & owners and not shot >> cell & 1:
+                cells.append(((configs & owners).bit_count(), cell))
+        cells.sort(reverse=True)
+        return cells
+
+    def shot_value(self, configs, shot, cell, n, limit):
+        """Expected misses when shooting `cell` next.
+
+        Exact when below `limit`; otherwise some lower bound at or above it,
+        which is all a caller comparing against `limit` needs.
+        """
+        groups = self.outcomes(configs, shot, cell)
+        after = shot | 1 << cell
+        weights = [group.bit_count() / n for group in groups]
+        bounds = [self.lower_bound(group, after) for group in groups]
+        value = (configs & ~self.fleets_at[cell]).bit_count() / n + sum(w * b for w, b in zip(weights, bounds))
+        for group, weight, bound in zip(groups, weights, bounds):
+            if value >= limit:
+                return value
+            # What this outcome may cost before the shot is no better than `limit`
+            rest = value - weight * bound
+            value = rest + weight * self.misses(group, after, (limit - rest) / weight)
+        return value
+
+    def misses(self, configs, shot, limit=float('inf')):
+        """Least expected misses to finish from here; exact when below `limit`, else a bound at or above it"""
+        n = configs.bit_count()
+        if n == 1:
+            return 0.0
+        union = 0
+        for i in iter_bits(configs):
+            union |= self.occupied[i]
+        key = (configs, shot & union)
+        known = self.memo.get(key)
+        if known is not None:
+            value, exact = known
+            if exact or value >= limit:
+                return value
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise SearchTooLarge()
+
+        cells = self.candidates(configs, shot)
+
+        if not cells:
+            # Every cell of every fleet is shot; nothing is left to miss
+            value = 0.0
+        elif cells[0][0] == n:
+            # Shooting a cell every fleet covers costs nothing and can only tell more
+            value = self.shot_value(configs, shot, cells[0][1], n, limit)
+        else:
+            value = float('inf')
+            for hits, cell in cells:
+                if 1 - hits / n >= min(value, limit):
+                    break
+                value = min(value, self.shot_value(configs, shot, cell, n, min(value, limit)))
+        if value < limit:
+            self.memo[key] = (value, True)
+            return value
+        self.memo[key] = (limit, False)
+        return limit
+
+    def best_shot(self, shot, rng=random):
+        """Cell index of the best shot with every fleet still possible, or None if nothing is left to shoot.
+
+        A cell every fleet covers is taken without searching further;
+        misses((1 << count) - 1, shot) gives the expected misses from here.
+        """
+        configs = (1 << self.count) - 1
+        n = self.count
+        cells = self.candidates(configs, shot)
+        if not cells:
+            return None
+        certain = [cell for hits, cell in cells if hits == n]
+        if certain:
+            return rng.choice(certain)
+
+        best = float('inf')
+        choices = []
+        for hits, cell in cells:
+            if 1 - hits / n > best + 1e-12:
+                break
+            value = self.shot_value(configs, shot, cell, n, best + 1e-9)
+            if value < best - 1e-12:
+                best, choices = value, [cell]
+            elif value <= best + 1e-12:
+                choices.append(cell)
+        return rng.choice(choices)
+
+
+def best_shot(size, blocked_mask, hit_mask, ship_sizes, rng=random):
+    """The cell index to shoot with the fewest expected shots to finish, or None if the position is too large"""
+    if not ship_sizes or not ENDGAME_CONFIGURATIONS:
+        return None
+    fleets = configurations(size, blocked_mask, hit_mask, ship_sizes)
+    if not fleets:
+        return None
+    try:
+        cell = EndgameSearch(fleets).best_shot(blocked_mask | hit_mask, rng)
+    except SearchTooLarge:
+        return None
+    return cell
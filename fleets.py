@@ -0,0 +1,224 @@
+"""Random fleet placement without retry loops.
+
+A placement is identified by its index into bitboard.placement_indices for
+its ship size. Each ship is drawn uniformly from the placements still legal
+once the ships before it are down. That is the distribution the old
+draw-and-retry loop had, but no draw is ever thrown away.
+
+FleetSampler draws one fleet at a time in pure Python; random_fleets draws
+millions at once with numpy and returns them as a compact array.
+
+Example:
+    python fleets.py --count 1000000 --output fleets.npy
+"""
+import argparse
+import random
+import time
+from functools import lru_cache
+
+import targeting
+from bitboard import LARGE_MASK_BITS, cell_placements, placement_indices, placement_masks
+from targeting import placement_cells
+
+np = None  # numpy is optional; require_numpy() loads it for random_fleets
+
+# Give up on a fleet after this many dead ends (earlier ships boxing a later one in)
+FLEET_ATTEMPTS = 1000
+
+# Upper bound on the cells random_fleets looks at per batch, to bound its memory use
+BULK_CELLS = 1 << 24
+
+
+@lru_cache(maxsize=None)
+def placement_ids(board_size, ship_size):
+    """Placement bitmask -> its id"""
+    return {mask: pid for pid, mask in enumerate(placement_masks(board_size, ship_size))}
+
+
+class FleetSampler:
+    """Draws random fleets of `ship_sizes` on one board.
+
+    Cells in `blocked` are never used. If `must_cover` is given, every ship
+    has to cover at least one of its cells (the rule the original Monte Carlo
+    engine applies to known hits).
+    """
+
+    def __init__(self, board_size, ship_sizes, blocked=(), must_cover=()):
+        self.board_size = board_size
+        self.ship_sizes = list(ship_sizes)
+        blocked = set(blocked)
+        must_cover = set(must_cover)
+        # Per ship size: the candidate placement ids, and each id's slot in that list (-1 if not a candidate)
+        self.candidates = {}
+        self.slots = {}
+        for ship_size in set(self.ship_sizes):
+            placements = placement_indices(board_size, ship_size)
+            if blocked or must_cover:
+                candidates = [pid for pid, cells in enumerate(placements)
+                              if blocked.isdisjoint(cells) and (not must_cover or not must_cover.isdisjoint(cells))]
+                slots = [-1] * len(placements)
+                for slot, pid in enumerate(candidates):
+                    slots[pid] = slot
+            else:
+                candidates = list(range(len(placements)))
+                slots = list(candidates)
+            self.candidates[ship_size] = candidates
+            self.slots[ship_size] = slots
+        # On small boards filtering the candidates by bitmask beats keeping the lists up to date
+        self.small = board_size * board_size <= LARGE_MASK_BITS
+        if self.small:
+            self.masks = {size: [placement_masks(board_size, size)[pid] for pid in ids]
+                          for size, ids in self.candidates.items()}
+
+    def sample(self, rng=random):
+        """One fleet as a list of placement ids in ship order, or None on a dead end"""
+        if self.small:
+            return self._sample_masks(rng)
+        live = {size: list(ids) for size, ids in self.candidates.items()}
+        slots = {size: list(ids) for size, ids in self.slots.items()}
+        fleet = []
+        for ship_size in self.ship_sizes:
+            ids = live[ship_size]
+            if not ids:
+                return None
+            pid = ids[rng.randrange(len(ids))]
+            fleet.append(pid)
+            # Every placement that shares a cell with this ship is no longer legal
+            for cell in placement_indices(self.board_size, ship_size)[pid]:
+                for size, ids in live.items():
+                    slot_of = slots[size]
+                    for other in cell_placements(self.board_size, size)[cell]:
+                        slot = slot_of[other]
+                        if slot < 0:
+                            continue
+                        last = ids.pop()
+                        if last != other:
+                            ids[slot] = last
+                            slot_of[last] = slot
+                        slot_of[other] = -1
+        return fleet
+
+    def _sample_masks(self, rng):
+        occupied = 0
+        fleet = []
+        for ship_size in self.ship_sizes:
+            legal = [mask for mask in self.masks[ship_size] if not mask & occupied]
+            if not legal:
+                return None
+            mask = legal[rng.randrange(len(legal))]
+            occupied |= mask
+            fleet.append(placement_ids(self.board_size, ship_size)[mask])
+        return fleet
+
+    def fleet(self, rng=random):
+        """Like sample(), but starts over on dead ends; raises ValueError if the fleet will not fit"""
+        for _ in range(FLEET_ATTEMPTS):
+            fleet = self.sample(rng)
+            if fleet is not None:
+                return fleet
+        raise ValueError(f"could not fit ships {self.ship_sizes} on a {self.board_size}x{self.board_size} board")
+
+    def cells(self, fleet):
+        """Placement ids -> the cell indices of each ship"""
+        return [placement_indices(self.board_size, size)[pid] for size, pid in zip(self.ship_sizes, fleet)]
+
+
+@lru_cache(maxsize=64)
+def empty_board_sampler(board_size, ship_sizes):
+    """A shared FleetSampler for placing a whole fleet on an empty board"""
+    return FleetSampler(board_size, ship_sizes)
+
+
+def require_numpy():
+    global np
+    if np is None:
+        try:
+            np = targeting.require_numpy()
+        except ImportError:
+            raise ImportError("bulk fleet generation needs numpy (pip install numpy)") from None
+
+
+def random_fleets(board_size, ship_sizes, count, seed=None):
+    """`count` random fleets as an array of placement ids, shape (count, len(ship_sizes)).
+
+    The ids fit in uint16 on any board the game allows, so a million standard
+    fleets take 10 MB. The same seed always gives the same array. Raises
+    ValueError for a fleet that doesn't fit the board, as
+    battleship.check_game_config does.
+    """
+    if not ship_sizes or any(not 1 <= size <= board_size for size in ship_sizes):
+        raise ValueError(f"every ship must be between 1 and {board_size} cells long")
+    if sum(ship_sizes) * 2 > board_size * board_size:
+        raise ValueError("the fleet needs more than half of the board")
+    require_numpy()
+    gen = np.random.default_rng(seed)
+    tables = [placement_cells(board_size, size) for size in ship_sizes]
+    dtype = np.uint16 if max(len(table) for table in tables) < 1 << 16 else np.uint32
+    batch = max(1, BULK_CELLS // max(table.size for table in tables))
+
+    fleets = np.empty((count, len(ship_sizes)), dtype=dtype)
+    done = 0
+    while done < count:
+        # At least FLEET_ATTEMPTS rows, so a batch with no fleet in it means the fleet doesn't fit
+        n = min(batch, max(count - done, FLEET_ATTEMPTS))
+        fleet, ok = _draw_fleets(board_size, tables, n, gen)
+        fleet = fleet[ok][:count - done]
+        if not len(fleet):
+            raise ValueError(f"no fleet fit the board in {n} tries")
+        fleets[done:done + len(fleet)] = fleet
+        done += len(fleet)
+    return fleets
+
+
+def _draw_fleets(board_size, tables, n, gen):
+    """One batch of random_fleets; also returns which rows avoided a dead end"""
+    rows = np.arange(n)
+    occupied = np.zeros((n, board_size * board_size), dtype=bool)
+    fleet = np.empty((n, len(tables)), dtype=np.int64)
+    ok = np.ones(n, dtype=bool)
+    for j, table in enumerate(tables):
+        legal = ~occupied[:, table].any(axis=2)
+        # Pick the k-th legal placement of each row, with k uniform over that row's legal count.
+        # The legal entries of all rows are listed in one flat array, row after row.
+        available = legal.sum(axis=1)
+        ok &= available > 0
+        if not ok.any():
+            return fleet, ok  # Every row is at a dead end
+        k = (gen.random(n) * available).astype(np.int64)
+        starts = np.cumsum(available) - available
+        listed = np.flatnonzero(legal)
+        pid = listed[np.minimum(starts + k, len(listed) - 1)] - rows * len(table)
+        pid[available == 0] = 0  # dead ends are dropped by the caller; any in-range id will do
+        fleet[:, j] = pid
+        occupied[rows[:, None], table[pid]] = True
+    return fleet, ok
+
+
+def fleet_cells(board_size, ship_sizes, fleets):
+    """Placement ids from random_fleets -> cell indices, shape (count, sum(ship_sizes))"""
+    require_numpy()
+    return np.concatenate([placement_cells(board_size, size)[fleets[:, j].astype(np.intp)]
+                           for j, size in enumerate(ship_sizes)], axis=1)
+
+
+def main():
+    from battleship import BOARD_SIZE, SHIP_SIZES, parse_fleet
+
+    parser = argparse.ArgumentParser(description="Generate random Battleship fleets")
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--size', type=int, default=BOARD_SIZE, help="board size")
+    parser.add_argument('--fleet', type=parse_fleet, default=SHIP_SIZES, help="ship sizes, e.g. 5,4,3,3,2 or 5x4,3x12")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default="fleets.npy", help="placement ids, saved with numpy.save")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    fleets = random_fleets(args.size, args.fleet, args.count, args.seed)
+    elapsed = time.perf_counter() - start
+    np.save(args.output, fleets)
+    print(f"{args.count} fleets in {elapsed:.2f}s ({args.count / elapsed:.0f} fleets/s), "
+          f"{fleets.nbytes / 1e6:.1f} MB -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
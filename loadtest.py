@@ -0,0 +1,129 @@
+"""Load-test client for server.py: many simulated players over loopback.
+
+Each simulated player opens a session against the AI and fires at the cells
+of the enemy board in a random order until the game ends or --moves shots are
+fired. A round is one shot plus the AI's reply. Its latency runs from
+sending the shot to receiving the AI's move.
+
+Example:
+    python server.py &
+    python loadtest.py --sessions 2000 --concurrency 500
+
+or, with the server in the same process:
+    python loadtest.py --serve --sessions 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from battleship import DIFFICULTIES, TARGETING_STRATEGIES
+from server import MAX_LINE, GameServer
+
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b'\n')
+    await writer.drain()
+    return await receive(reader)
+
+
+async def receive(reader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("server closed the connection")
+    return json.loads(line)
+
+
+async def play_session(host, port, seed, args, rounds, counts):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+    try:
+        state = await request(reader, writer, {'op': 'new', 'difficulty': args.difficulty,
+                                               'strategy': args.strategy, 'seed': seed})
+        if not state['ok']:
+            raise RuntimeError(state['error'])
+        n = state['size']
+        cells = [(r, c) for r in range(n) for c in range(n)]
+        rng.shuffle(cells)
+        for r, c in cells[:args.moves]:
+            start = time.perf_counter()
+            reply = await request(reader, writer, {'op': 'fire', 'r': r, 'c': c})
+            if not reply['ok']:
+                continue  # already hit by an earlier move
+            counts['moves'] += 1
+            if reply['winner']:
+                break
+            event = await receive(reader)
+            rounds.append(time.perf_counter() - start)
+            if not event.get('ok', True):
+                counts['errors'] += 1  # The AI move failed and the server ended the session
+                return
+            counts['moves'] += 1
+            if event['winner']:
+                break
+        counts['games'] += 1
+    finally:
+        writer.close()
+
+
+async def run(args):
+    server = None
+    host, port = args.host, args.port
+    if args.serve:
+        server = GameServer(args.ai_workers)
+        listener = await asyncio.start_server(server.handle, host, 0, limit=MAX_LINE)
+        port = listener.sockets[0].getsockname()[1]
+
+    rounds = []
+    counts = {'moves': 0, 'games': 0, 'errors': 0}
+    gate = asyncio.Semaphore(args.concurrency or args.sessions)
+
+    async def one(seed):
+        async with gate:
+            try:
+                await play_session(host, port, seed, args, rounds, counts)
+            except (ConnectionError, OSError, RuntimeError, ValueError):
+                counts['errors'] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(args.seed + i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        listener.close()
+        server.close()
+    return rounds, counts, elapsed
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Battleship server load test")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--serve', action='store_true', help="run the server in this process on a free port")
+    parser.add_argument('--ai-workers', type=int, default=None, help="AI threads of the --serve server")
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=None, help="sessions open at once (default: all)")
+    parser.add_argument('--moves', type=int, default=100, help="shots per session at most")
+    parser.add_argument('--difficulty', default="Easy", choices=DIFFICULTIES)
+    parser.add_argument('--strategy', default="exact", choices=TARGETING_STRATEGIES)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rounds, counts, elapsed = asyncio.run(run(args))
+    print(f"{counts['games']} sessions, {counts['moves']} moves in {elapsed:.2f}s "
+          f"({counts['moves'] / elapsed:.0f} moves/s), {counts['errors']} failed")
+    if rounds:
+        rounds.sort()
+        print(f"round latency: median {statistics.median(rounds) * 1000:.1f} ms, "
+              f"p95 {percentile(rounds, 0.95) * 1000:.1f} ms, p99 {percentile(rounds, 0.99) * 1000:.1f} ms, "
+              f"max {rounds[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
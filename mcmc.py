@@ -0,0 +1,193 @@
+"""Markov chain Monte Carlo targeting for positions with unresolved hits.
+
+Rejection sampling throws away almost every fleet once a few hits have to be
+covered. This sampler instead finds one fleet that fits every miss and every
+hit, then walks from legal fleet to legal fleet with small moves:
+
+    shift     slide one ship a cell along its length
+    rotate    turn one ship about its first cell
+    swap      two ships trade places (each takes the other's first cell and direction)
+    relocate  move one ship to any placement on the board
+
+Every move is its own inverse with the same probability, and an illegal
+proposal leaves the fleet where it is, so the chain settles on the uniform
+distribution over fleets consistent with the board. The heatmap counts the
+cells covered by the fleet after every sweep (one proposal per ship).
+"""
+import random
+from collections import Counter
+
+from bitboard import cell_placements, iter_bits, placement_indices, placement_masks
+from fleets import FleetSampler
+
+# Sweeps the chain runs before it starts counting
+BURN_IN_SWEEPS = 50
+
+# Move mix: chance of shift, rotate and swap; relocate takes the rest
+SHIFT_RATE = 0.4
+ROTATE_RATE = 0.2
+SWAP_RATE = 0.2
+
+# Search steps spent looking for a starting fleet before giving up
+START_SEARCH_STEPS = 20000
+
+
+def placement_origin(board_size, ship_size, pid):
+    """Placement id -> (vertical, row, col) of the ship's first cell"""
+    across = board_size * (board_size - ship_size + 1)
+    if pid < across:
+        r, c = divmod(pid, board_size - ship_size + 1)
+        return False, r, c
+    r, c = divmod(pid - across, board_size)
+    return True, r, c
+
+
+def placement_id(board_size, ship_size, vertical, r, c):
+    """(vertical, row, col) -> placement id, or None if the ship would leave the board"""
+    if r < 0 or c < 0:
+        return None
+    if vertical:
+        if r + ship_size > board_size or c >= board_size:
+            return None
+        return board_size * (board_size - ship_size + 1) + r * board_size + c
+    if r >= board_size or c + ship_size > board_size:
+        return None
+    return r * (board_size - ship_size + 1) + c
+
+
+def starting_fleet(size, blocked_mask, hit_mask, ship_sizes, rng=random):
+    """A random fleet that avoids blocked cells and covers every hit.
+
+    Ships are put on the lowest uncovered hit first, backtracking when the
+    hits cannot all be covered; the ships left over once every hit is
+    covered are placed by FleetSampler. Returns placement ids in ship_sizes
+    order, or None if no such fleet turned up within START_SEARCH_STEPS.
+    """
+    fleet = [None] * len(ship_sizes)
+    steps = 0
+
+    def place(occupied, unplaced):
+        nonlocal steps
+        steps += 1
+        if steps > START_SEARCH_STEPS:
+            return False
+        uncovered = hit_mask & ~occupied
+        if uncovered.bit_count() > sum(ship_sizes[j] for j in unplaced):
+            return False
+        if not uncovered:
+            return place_rest(occupied, unplaced)
+
+        cell = (uncovered & -uncovered).bit_length() - 1
+        choices = []
+        tried = set()
+        for j in unplaced:
+            if ship_sizes[j] in tried:
+                continue  # ships of the same size are interchangeable
+            tried.add(ship_sizes[j])
+            masks = placement_masks(size, ship_sizes[j])
+            choices.extend((j, pid) for pid in cell_placements(size, ship_sizes[j])[cell]
+                           if not masks[pid] & (blocked_mask | occupied))
+        rng.shuffle(choices)
+        for j, pid in choices:
+            fleet[j] = pid
+            if place(occupied | placement_masks(size, ship_sizes[j])[pid], [k for k in unplaced if k != j]):
+                return True
+        return False
+
+    def place_rest(occupied, unplaced):
+        if not unplaced:
+            return True
+        sampler = FleetSampler(size, [ship_sizes[j] for j in unplaced], blocked=iter_bits(blocked_mask | occupied))
+        for _ in range(10):
+            rest = sampler.sample(rng)
+            if rest is not None:
+                for j, pid in zip(unplaced, rest):
+                    fleet[j] = pid
+                return True
+        return False
+
+    if place(0, list(range(len(ship_sizes)))):
+        return fleet
+    return None
+
+
+def mcmc_heatmap(size, blocked_mask, hit_mask, ship_sizes, samples, rng=random, stats=None):
+    """Heatmap over the unshot cells from `samples` sweeps of the chain.
+
+    Returns None when no starting fleet is found. If `stats` is a dict it is
+    filled with the proposal and acceptance counts.
+    """
+    ship_sizes = list(ship_sizes)
+    fleet = starting_fleet(size, blocked_mask, hit_mask, ship_sizes, rng)
+    if fleet is None:
+        return None
+    masks = [placement_masks(size, s)[pid] for s, pid in zip(ship_sizes, fleet)]
+    occupied = sum(masks)
+    ships = len(ship_sizes)
+    proposals = accepted = 0
+    seen = Counter()
+
+    def fits(mask, others):
+        return not mask & (blocked_mask | others)
+
+    for sweep in range(BURN_IN_SWEEPS + samples):
+        for _ in range(ships):
+            proposals += 1
+            j = rng.randrange(ships)
+            s = ship_sizes[j]
+            others = occupied & ~masks[j]
+            move = rng.random()
+            if move < SHIFT_RATE + ROTATE_RATE:
+                vertical, r, c = placement_origin(size, s, fleet[j])
+                if move < SHIFT_RATE:
+                    step = rng.choice((-1, 1))
+                    pid = placement_id(size, s, vertical, r + step * vertical, c + step * (not vertical))
+                else:
+                    pid = placement_id(size, s, not vertical, r, c)
+            elif move < SHIFT_RATE + ROTATE_RATE + SWAP_RATE:
+                if ships < 2:
+                    continue
+                k = rng.randrange(ships - 1)
+                k += k >= j
+                t = ship_sizes[k]
+                pid_j = placement_id(size, s, *placement_origin(size, t, fleet[k]))
+                pid_k = placement_id(size, t, *placement_origin(size, s, fleet[j]))
+                if pid_j is None or pid_k is None:
+                    continue
+                mask_j = placement_masks(size, s)[pid_j]
+                mask_k = placement_masks(size, t)[pid_k]
+                others &= ~masks[k]
+                if mask_j & mask_k or not fits(mask_j | mask_k, others):
+                    continue
+                if (others | mask_j | mask_k) & hit_mask != hit_mask:
+                    continue
+                fleet[j], fleet[k] = pid_j, pid_k
+                masks[j], masks[k] = mask_j, mask_k
+                occupied = others | mask_j | mask_k
+                accepted += 1
+                continue
+            else:
+                pid = rng.randrange(len(placement_masks(size, s)))
+
+            if pid is None:
+                continue
+            mask = placement_masks(size, s)[pid]
+            if not fits(mask, others) or (others | mask) & hit_mask != hit_mask:
+                continue
+            fleet[j] = pid
+            masks[j] = mask
+            occupied = others | mask
+            accepted += 1
+
+        if sweep >= BURN_IN_SWEEPS:
+            seen.update(zip(ship_sizes, fleet))
+
+    heatmap = [0] * (size * size)
+    for (s, pid), count in seen.items():
+        for i in placement_indices(size, s)[pid]:
+            heatmap[i] += count
+    for i in iter_bits(blocked_mask | hit_mask):
+        heatmap[i] = 0
+    if stats is not None:
+        stats.update(proposals=proposals, accepted=accepted, samples=samples)
+    return heatmap
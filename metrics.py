@@ -0,0 +1,174 @@
+"""Timers, counters and latency histograms for the AI, placement, powerup and GUI paths.
+
+Collection is off until enable() is called. Every hook checks the module's
+`enabled` flag first, so an instrumented call costs one global lookup when
+metrics are off. Hooks run once per move, heatmap or repaint, never once per
+simulation; samplers add their totals when they finish.
+
+    with metrics.timer('targeting.exact'):    time a block into a histogram
+    metrics.count('targeting.montecarlo.accepted', kept)
+
+Names are dotted. Two kinds of figures are derived when a snapshot is taken:
+    NAME.accepted / NAME.proposals    -> acceptance rate of NAME
+    NAME.samples / time spent in NAME -> samples per second of NAME
+
+snapshot() returns everything as a dict (written as JSON), prometheus()
+as Prometheus text exposition, and summary() as short lines for the GUI's
+debug overlay.
+"""
+import bisect
+import json
+import re
+import threading
+import time
+
+enabled = False
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_PREFIX = 'battleship_'
+
+_lock = threading.Lock()
+counters = {}
+histograms = {}
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction):
+        """Estimate of the given quantile, interpolated inside its bucket"""
+        rank = fraction * self.count
+        seen = 0
+        lower = 0.0
+        for bound, count in zip(BUCKETS, self.buckets):
+            if count and seen + count >= rank:
+                return min(self.max, lower + (bound - lower) * (rank - seen) / count)
+            seen += count
+            lower = bound
+        return self.max
+
+
+class timer:
+    """Context manager adding the time spent in its block to histogram `name`"""
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter() if enabled else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            observe(self.name, time.perf_counter() - self.start)
+
+
+def enable(on=True):
+    global enabled
+    enabled = on
+
+
+def reset():
+    with _lock:
+        counters.clear()
+        histograms.clear()
+
+
+def count(name, amount=1):
+    if enabled:
+        with _lock:
+            counters[name] = counters.get(name, 0) + amount
+
+
+def observe(name, seconds):
+    if enabled:
+        with _lock:
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+
+def derived():
+    """{'NAME.acceptance': rate, 'NAME.samples_per_second': rate} from the counters and timers"""
+    rates = {}
+    for name, accepted in counters.items():
+        if name.endswith('.accepted'):
+            base = name[:-len('.accepted')]
+            proposals = counters.get(base + '.proposals')
+            if proposals:
+                rates[base + '.acceptance'] = accepted / proposals
+        elif name.endswith('.samples'):
+            base = name[:-len('.samples')]
+            if base in histograms and histograms[base].sum:
+                rates[base + '.samples_per_second'] = counters[name] / histograms[base].sum
+    return rates
+
+
+def snapshot():
+    with _lock:
+        return {
+            'counters': dict(counters),
+            'timers': {name: {'count': h.count, 'sum_seconds': h.sum, 'max_seconds': h.max,
+                              'p50_seconds': h.quantile(0.5), 'p95_seconds': h.quantile(0.95),
+                              'buckets': dict(zip([*map(str, BUCKETS), '+Inf'], h.buckets))}
+                       for name, h in histograms.items()},
+            'derived': derived(),
+        }
+
+
+def metric_name(name):
+    return PROMETHEUS_PREFIX + re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def prometheus():
+    lines = []
+    with _lock:
+        for name, value in sorted(counters.items()):
+            name = metric_name(name) + '_total'
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        for name, h in sorted(histograms.items()):
+            name = metric_name(name) + '_seconds'
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip([*map(str, BUCKETS), '+Inf'], h.buckets):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{name}_sum {h.sum}", f"{name}_count {h.count}"]
+        for name, value in sorted(derived().items()):
+            name = metric_name(name)
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return '\n'.join(lines) + '\n'
+
+
+def summary():
+    """A few lines for the debug overlay: per-timer count, median and p95, then the rates"""
+    lines = []
+    with _lock:
+        for name, h in sorted(histograms.items()):
+            lines.append(f"{name:28} {h.count:6}  p50 {h.quantile(0.5) * 1000:7.1f} ms  "
+                         f"p95 {h.quantile(0.95) * 1000:7.1f} ms  max {h.max * 1000:7.1f} ms")
+        for name, value in sorted(derived().items()):
+            text = f"{value:.1%}" if name.endswith('.acceptance') else f"{value:,.0f}/s"
+            lines.append(f"{name:28} {text}")
+    return '\n'.join(lines) or "no metrics yet"
+
+
+def write(path):
+    """Write a snapshot to `path`: Prometheus text for .prom/.txt files, JSON otherwise"""
+    text = prometheus() if path.endswith(('.prom', '.txt')) else json.dumps(snapshot(), indent=2)
+    with open(path, 'w') as f:
+        f.write(text)
@@ -0,0 +1,297 @@
+"""Opening book: precomputed heatmaps for the positions early in a game.
+
+Until its first hit the Hard AI sees nothing but misses, and it answers the
+same few miss patterns in game after game. The book stores a heatmap for
+each of them, so those moves (and Hard powerup aims on a near-empty board)
+cost a lookup instead of a round of sampling.
+
+A position is its miss mask, reduced by the board's 8 symmetries (4
+rotations, each optionally mirrored): the smallest of the 8 transformed
+masks is the key, and the heatmap is stored in that orientation. A lookup
+applies the same transform and maps the heatmap back.
+
+The book is one file: a header, then one record per position sorted by key.
+
+    header   magic, version, board size, number of ships, number of records
+    fleet    one byte per ship size
+    record   key (the miss mask, big-endian so that byte order is numeric
+             order), then the heatmap as one u16 per cell: the share of
+             sampled fleets with a ship there, 65535 = all of them
+
+OpeningBook memory-maps the file and binary-searches it, so a lookup reads
+a few pages and every process on the machine shares one copy of the table.
+
+The book is built offline by playing out every reply the Hard AI could make
+from the empty board, a few moves deep:
+
+    python openings.py --output openings.book --moves 4
+"""
+import argparse
+import mmap
+import os
+import struct
+import time
+from functools import lru_cache
+
+import metrics
+import targeting
+from bitboard import iter_bits
+
+MAGIC = b'BSOB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHHI')  # magic, version, board size, ships, records
+
+# Heatmap values are stored as the share of fleets covering a cell, scaled to this
+SCALE = 0xFFFF
+
+# Where default_book() looks unless configure_default_book says otherwise
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openings.book')
+
+# Fleets sampled per position when building a book
+BOOK_SAMPLES = 1000000
+
+# Shots the Hard AI hits on intel, as in GameEngine.use_computer_powerup
+INTEL_CELLS = 5
+
+
+@lru_cache(maxsize=None)
+def symmetries(size):
+    """The 8 symmetries of a square board, each as a tuple: cell i -> cell perm[i]"""
+    last = size - 1
+    maps = [
+        lambda r, c: (r, c),
+        lambda r, c: (c, last - r),
+        lambda r, c: (last - r, last - c),
+        lambda r, c: (last - c, r),
+        lambda r, c: (r, last - c),
+        lambda r, c: (c, r),
+        lambda r, c: (last - r, c),
+        lambda r, c: (last - c, last - r),
+    ]
+    perms = []
+    for f in maps:
+        perm = []
+        for i in range(size * size):
+            r, c = f(*divmod(i, size))
+            perm.append(r * size + c)
+        perms.append(tuple(perm))
+    return perms
+
+
+def transform(mask, perm):
+    result = 0
+    for i in iter_bits(mask):
+        result |= 1 << perm[i]
+    return result
+
+
+def canonical(size, mask):
+    """(key, perm): the smallest of the 8 transforms of mask and the symmetry giving it"""
+    return min((transform(mask, perm), perm) for perm in symmetries(size))
+
+
+class OpeningBook:
+    """A book file, memory-mapped. heatmap() looks a position up"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, ships, self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an opening book this version can read")
+        self.fleet = sorted(self.map[HEADER.size:HEADER.size + ships])
+        self.start = HEADER.size + ships
+        n_cells = self.size * self.size
+        self.key_bytes = (n_cells + 7) // 8
+        self.cells = struct.Struct(f'<{n_cells}H')
+        self.record_size = self.key_bytes + self.cells.size
+        if len(self.map) != self.start + self.count * self.record_size:
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def find(self, key):
+        """Offset of the record with this key, or None"""
+        key = key.to_bytes(self.key_bytes, 'big')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = self.start + mid * self.record_size
+            probe = self.map[offset:offset + self.key_bytes]
+            if probe == key:
+                return offset
+            if probe < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def heatmap(self, size, blocked_mask, hit_mask, ship_sizes):
+        """The stored heatmap of this position (see targeting.py for the arguments), or None if it isn't in the book"""
+        if size != self.size or hit_mask or sorted(ship_sizes) != self.fleet:
+            return None
+        key, perm = canonical(size, blocked_mask)
+        offset = self.find(key)
+        if offset is None:
+            return None
+        stored = self.cells.unpack_from(self.map, offset + self.key_bytes)
+        return [stored[perm[i]] for i in range(size * size)]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+_default_book = None
+
+
+def default_book():
+    """The book at BOOK_PATH, opened on first use; None if there is none"""
+    global _default_book
+    if _default_book is None:
+        _default_book = OpeningBook(BOOK_PATH) if BOOK_PATH and os.path.exists(BOOK_PATH) else False
+    return _default_book or None
+
+
+def configure_default_book(path):
+    """Make default_book() use the book at `path`; '' turns the book off"""
+    global BOOK_PATH, _default_book
+    if path and not os.path.exists(path):
+        raise FileNotFoundError(path)
+    if _default_book:
+        _default_book.close()
+    BOOK_PATH = path
+    _default_book = None
+
+
+def lookup(size, blocked_mask, hit_mask, ship_sizes):
+    """The default book's heatmap for this position, or None"""
+    book = default_book()
+    if book is None:
+        return None
+    with metrics.timer('targeting.book'):
+        heatmap = book.heatmap(size, blocked_mask, hit_mask, ship_sizes)
+    metrics.count('targeting.book.hits' if heatmap is not None else 'targeting.book.misses')
+    return heatmap
+
+
+# Building a book
+
+def position_heatmap(size, mask, ship_sizes, samples, gen):
+    """The share of `samples` random fleets avoiding `mask` covering each cell, scaled to SCALE"""
+    counts = targeting.sample_counts(size, mask, 0, ship_sizes, samples, gen)
+    fleets = int(counts.sum()) // sum(ship_sizes)
+    if not fleets:
+        return None
+    heatmap = targeting.finish_counts(counts, size, mask, 0)
+    # Cells the position's own symmetries swap are equally likely; averaging
+    # over them cancels some sampling noise and makes their scores tie exactly
+    perms = [perm for perm in symmetries(size) if transform(mask, perm) == mask]
+    return [round(sum(heatmap[perm[i]] for perm in perms) * SCALE / (fleets * len(perms)))
+            for i in range(size * size)]
+
+
+def replies(size, mask, heatmap):
+    """Miss masks after each move the Hard AI could make here if it all missed:
+    any of the hottest cells, missile boxes and destroyer rows, or the intel cells"""
+    unshot = [i for i in range(size * size) if not mask >> i & 1]
+    if not unshot:
+        return []
+    positions = []
+    hottest = max(heatmap[i] for i in unshot)
+    positions += [mask | 1 << i for i in unshot if heatmap[i] == hottest]
+
+    open_cells = [0 if mask >> i & 1 else 1 for i in range(size * size)]
+    centers = [i for i, count in enumerate(targeting.box_scores(open_cells, size)) if count]
+    boxes = targeting.box_scores(heatmap, size)
+    best = max(boxes[i] for i in centers)
+    for i in centers:
+        if boxes[i] == best:
+            r, c = divmod(i, size)
+            box = 0
+            for nr in range(max(r - 1, 0), min(r + 2, size)):
+                for nc in range(max(c - 1, 0), min(c + 2, size)):
+                    box |= 1 << (nr * size + nc)
+            positions.append(mask | box)
+
+    rows = [r for r in range(size) if any(open_cells[r * size:(r + 1) * size])]
+    totals = targeting.row_scores(heatmap, size)
+    best = max(totals[r] for r in rows)
+    positions += [mask | ((1 << size) - 1) << (r * size) for r in rows if totals[r] == best]
+
+    intel = sorted(unshot, key=lambda i: -heatmap[i])[:INTEL_CELLS]
+    positions.append(mask | sum(1 << i for i in intel))
+    return positions
+
+
+def build(size, ship_sizes, moves, samples=BOOK_SAMPLES, seed=0, limit=None, progress=None):
+    """{key: heatmap} for every position the Hard AI reaches in `moves` all-miss moves from the empty board.
+
+    Positions are taken breadth first; `limit` caps how many are stored.
+    """
+    targeting.require_numpy()
+    gen = targeting.np.random.default_rng(seed)
+    book = {}
+    level = [0]
+    for depth in range(moves + 1):
+        following = set()
+        for key in level:
+            if limit is not None and len(book) >= limit:
+                return book
+            heatmap = position_heatmap(size, key, ship_sizes, samples, gen)
+            if heatmap is None:
+                continue
+            book[key] = heatmap
+            if progress:
+                progress(depth, len(book))
+            if depth < moves:
+                following.update(canonical(size, child)[0] for child in replies(size, key, heatmap))
+        level = sorted(following - book.keys())
+    return book
+
+
+def write_book(path, size, ship_sizes, book):
+    key_bytes = (size * size + 7) // 8
+    cells = struct.Struct(f'<{size * size}H')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, len(ship_sizes), len(book)))
+        f.write(bytes(sorted(ship_sizes)))
+        for key in sorted(book):
+            f.write(key.to_bytes(key_bytes, 'big'))
+            f.write(cells.pack(*book[key]))
+
+
+def main():
+    from battleship import BOARD_SIZE, SHIP_SIZES, check_game_config, parse_fleet
+
+    parser = argparse.ArgumentParser(description="Build an opening book for the Hard AI")
+    parser.add_argument('--output', default='openings.book')
+    parser.add_argument('--moves', type=int, default=4, help="all-miss moves deep to play out from the empty board")
+    parser.add_argument('--samples', type=int, default=BOOK_SAMPLES, help="fleets sampled per position")
+    parser.add_argument('--limit', type=int, default=None, help="most positions to store")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=int, default=BOARD_SIZE, help="board size")
+    parser.add_argument('--fleet', type=parse_fleet, default=None, help="ship sizes, e.g. 5,4,3,3,2 or 5x4,3x12")
+    args = parser.parse_args()
+    ship_sizes = args.fleet or SHIP_SIZES
+    try:
+        check_game_config(args.size, ship_sizes)
+    except ValueError as error:
+        parser.error(str(error))
+    if max(ship_sizes) > 255:
+        parser.error("ships longer than 255 cells can't be stored in a book")
+
+    start = time.perf_counter()
+
+    def progress(depth, positions):
+        print(f"\rmove {depth}: {positions} positions ({time.perf_counter() - start:.0f}s)", end='', flush=True)
+
+    book = build(args.size, ship_sizes, args.moves, args.samples, args.seed, args.limit, progress)
+    print()
+    write_book(args.output, args.size, ship_sizes, book)
+    print(f"Wrote {len(book)} positions to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Learned targeting: a tiny convolutional network over what the attacker can see.
+
+The input is a stack of planes the size of the board:
+
+    unknown, miss, hit (on a ship afloat), sunk     one plane each
+    ships afloat of length 2, 3, 4 and 5+           one constant plane each, count / 2
+    on board                                        all ones, so the zero padding marks the edges
+
+Two 5x5 convolutions (HIDDEN channels, ReLU, then one channel) turn them
+into a logit per cell, trained to say whether a ship lies there. The
+Learned AI shoots the unshot cell most likely to hold a ship and plans
+powerups from the same probabilities, the way the Hard AI does from its
+heatmap. Inference is two small matrix products, well under a millisecond
+a move on the classic board, and the network works on any board size.
+
+Weights live in policy.json next to this file. They are trained offline,
+on states from self-play between the existing AIs:
+
+    python policy.py generate --games 3000 --output states.npz
+    python policy.py train states.npz --output policy.json
+
+Training is plain numpy: backpropagation by hand and Adam, with every
+state also seen in a random rotation or mirror image.
+"""
+import argparse
+import json
+import os
+import time
+from functools import lru_cache
+
+import targeting
+
+# Everything here is numpy; battleship imports this module on the first Learned move
+np = targeting.require_numpy()
+
+# Ship lengths with their own fleet plane; longer ships count toward the last
+FLEET_PLANES = (2, 3, 4, 5)
+CHANNELS = 4 + len(FLEET_PLANES) + 1
+
+KERNEL = 5
+HIDDEN = 16
+
+POLICY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'policy.json')
+
+# Training defaults
+EPOCHS = 12
+BATCH = 256
+LEARNING_RATE = 0.003
+VALIDATION = 0.05  # share of the states held out to report the loss on
+
+
+def fleet_counts(ship_sizes):
+    counts = [0] * len(FLEET_PLANES)
+    for size in ship_sizes:
+        counts[min(max(size, FLEET_PLANES[0]), FLEET_PLANES[-1]) - FLEET_PLANES[0]] += 1
+    return counts
+
+
+def stack_planes(size, miss, hit, sunk, counts):
+    """Input planes of N positions: miss/hit/sunk are (N, cells) bool arrays, counts (N, fleet planes).
+
+    Returns a (N, CHANNELS, size, size) float32 array.
+    """
+    n = len(miss)
+    x = np.empty((n, CHANNELS, size, size), dtype=np.float32)
+    shape = (n, size, size)
+    x[:, 0] = ~(miss | hit | sunk).reshape(shape)
+    x[:, 1] = miss.reshape(shape)
+    x[:, 2] = hit.reshape(shape)
+    x[:, 3] = sunk.reshape(shape)
+    x[:, 4:4 + len(FLEET_PLANES)] = (np.asarray(counts, dtype=np.float32) / 2)[:, :, None, None]
+    x[:, -1] = 1
+    return x
+
+
+@lru_cache(maxsize=None)
+def patch_index(c, h, w, k):
+    """Flat indices into a zero-padded (C, H + k - 1, W + k - 1) array that gather every cell's k x k patch"""
+    p = k // 2
+    width = w + 2 * p
+    channel = np.arange(c)[:, None, None] * (h + 2 * p) * width
+    offset = (np.arange(k)[:, None] * width + np.arange(k)).ravel()
+    corner = (np.arange(h)[:, None] * width + np.arange(w)).ravel()
+    return (corner[:, None, None] + channel.reshape(1, c, 1) + offset).reshape(h * w, c * k * k)
+
+
+def patches(x, k):
+    """(N, C, H, W) -> (N * H * W, C * k * k): the k x k neighbourhood of every cell, zero beyond the board"""
+    n, c, h, w = x.shape
+    p = k // 2
+    padded = np.zeros((n, c, h + 2 * p, w + 2 * p), dtype=x.dtype)
+    padded[:, :, p:p + h, p:p + w] = x
+    return np.take(padded.reshape(n, -1), patch_index(c, h, w, k), axis=1).reshape(n * h * w, c * k * k)
+
+
+def unpatch(grad, shape, k):
+    """The gradient of patches(): sums each (N * H * W, C * k * k) entry back onto the cell it came from"""
+    n, c, h, w = shape
+    p = k // 2
+    grad = grad.reshape(n, h, w, c, k, k)
+    padded = np.zeros((n, c, h + 2 * p, w + 2 * p), dtype=grad.dtype)
+    for i in range(k):
+        for j in range(k):
+            padded[:, :, i:i + h, j:j + w] += grad[:, :, :, :, i, j].transpose(0, 3, 1, 2)
+    return padded[:, :, p:p + h, p:p + w]
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+class Policy:
+    """The network's weights: w1 (CHANNELS * k * k, hidden), b1, w2 (hidden * k * k), b2"""
+
+    def __init__(self, w1, b1, w2, b2, kernel=KERNEL):
+        self.w1 = np.asarray(w1, dtype=np.float32)
+        self.b1 = np.asarray(b1, dtype=np.float32)
+        self.w2 = np.asarray(w2, dtype=np.float32)
+        self.b2 = np.float32(b2)
+        self.kernel = kernel
+        self.hidden = self.w1.shape[1]
+
+    @classmethod
+    def initial(cls, hidden=HIDDEN, kernel=KERNEL, seed=0, base_rate=0.17):
+        gen = np.random.default_rng(seed)
+        fan_in = CHANNELS * kernel * kernel
+        w1 = gen.normal(0, np.sqrt(2 / fan_in), (fan_in, hidden))
+        w2 = gen.normal(0, np.sqrt(1 / (hidden * kernel * kernel)), hidden * kernel * kernel)
+        return cls(w1, np.zeros(hidden), w2, np.log(base_rate / (1 - base_rate)), kernel)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('channels') != CHANNELS:
+            raise ValueError(f"{path} was trained on different input planes")
+        return cls(data['w1'], data['b1'], data['w2'], data['b2'], data['kernel'])
+
+    def save(self, path):
+        def rounded(a):
+            return np.vectorize(lambda v: float(f"{v:.5g}"), otypes=[float])(a).tolist()
+
+        data = {'channels': CHANNELS, 'kernel': self.kernel, 'hidden': self.hidden,
+                'w1': rounded(self.w1), 'b1': rounded(self.b1), 'w2': rounded(self.w2), 'b2': float(self.b2)}
+        with open(path, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+
+    def forward(self, x):
+        """Logits of a (N, CHANNELS, H, W) batch as (N, H, W), plus what backward() needs"""
+        n, _, h, w = x.shape
+        cols1 = patches(x, self.kernel)
+        hidden = np.maximum(cols1 @ self.w1 + self.b1, 0)
+        cols2 = patches(hidden.reshape(n, h, w, self.hidden).transpose(0, 3, 1, 2), self.kernel)
+        logits = (cols2 @ self.w2 + self.b2).reshape(n, h, w)
+        return logits, (cols1, hidden, cols2)
+
+    def backward(self, grad, cache):
+        """Weight gradients from the gradient of the loss with respect to the logits"""
+        cols1, hidden, cols2 = cache
+        n, h, w = grad.shape
+        grad = grad.reshape(-1)
+        grads = {'w2': cols2.T @ grad, 'b2': grad.sum()}
+        grad_hidden = unpatch(np.outer(grad, self.w2), (n, self.hidden, h, w), self.kernel)
+        grad_hidden = grad_hidden.transpose(0, 2, 3, 1).reshape(-1, self.hidden) * (hidden > 0)
+        grads['w1'] = cols1.T @ grad_hidden
+        grads['b1'] = grad_hidden.sum(axis=0)
+        return grads
+
+    def heatmap(self, size, miss_mask, hit_mask, sunk_mask, ship_sizes):
+        """Probability of a ship on every cell, as a flat list; known cells score 0"""
+        n_cells = size * size
+        miss, hit, sunk = (targeting.mask_to_array(m, n_cells)[None] for m in (miss_mask, hit_mask, sunk_mask))
+        logits, _ = self.forward(stack_planes(size, miss, hit, sunk, [fleet_counts(ship_sizes)]))
+        scores = sigmoid(logits.reshape(-1))
+        scores[(miss | hit | sunk)[0]] = 0
+        return scores.tolist()
+
+
+_default_policy = None
+
+
+def default_policy():
+    """The policy at POLICY_PATH, loaded on first use"""
+    global _default_policy
+    if _default_policy is None:
+        targeting.require_numpy()
+        _default_policy = Policy.load(POLICY_PATH)
+    return _default_policy
+
+
+# Training data: one row per position an AI had to move from
+
+def generate(games, seed=0, players=("Hard", "Hard"), strategy="exact", board_size=10, ship_sizes=None,
+             progress=None):
+    """Play games between `players` and return every position a side moved from, as a dict of arrays:
+    miss, hit, sunk, ships (N, cells) bool and counts (N, fleet planes)"""
+    from battleship import GameEngine
+
+    rows = {'miss': [], 'hit': [], 'sunk': [], 'ships': [], 'counts': []}
+    n_cells = board_size * board_size
+    for g in range(games):
+        # Alternate who moves first, as selfplay.py does
+        first, second = players if g % 2 == 0 else players[::-1]
+        engine = GameEngine(difficulty=second, seed=seed + g, user_difficulty=first, strategy=strategy,
+                            user_strategy=strategy, board_size=board_size, ship_sizes=ship_sizes)
+        engine.place_fleets()
+        while not engine.winner:
+            board = engine.ai_side()[1].board
+            sunk = board.sunk_mask
+            for name, mask in (('miss', board.miss_mask), ('hit', board.hit_mask & ~sunk), ('sunk', sunk),
+                               ('ships', board.ship_mask)):
+                rows[name].append(targeting.mask_to_array(mask, n_cells))
+            rows['counts'].append(fleet_counts(board.remaining_ship_sizes()))
+            engine.play_ai_turn()
+        if progress:
+            progress(g + 1, len(rows['miss']))
+    data = {name: np.array(values) for name, values in rows.items()}
+    data['counts'] = data['counts'].astype(np.uint8)
+    data['size'] = np.array(board_size)
+    return data
+
+
+def augment(size, arrays, gen):
+    """The same random rotation and mirror image of every (N, cells) array"""
+    turns, flip = gen.integers(4), gen.integers(2)
+    result = []
+    for a in arrays:
+        a = np.rot90(a.reshape(-1, size, size), turns, axes=(1, 2))
+        if flip:
+            a = a[:, :, ::-1]
+        result.append(a.reshape(len(a), -1))
+    return result
+
+
+def loss_and_grad(policy, size, miss, hit, sunk, counts, ships):
+    """Mean cross-entropy over the unknown cells, and its weight gradients"""
+    logits, cache = policy.forward(stack_planes(size, miss, hit, sunk, counts))
+    logits = logits.reshape(len(miss), -1)
+    unknown = ~(miss | hit | sunk)
+    weight = unknown / max(unknown.sum(), 1)
+    p = sigmoid(logits)
+    loss = -(weight * (ships * np.log(p + 1e-7) + (~ships) * np.log(1 - p + 1e-7))).sum()
+    grads = policy.backward(((p - ships) * weight).reshape(len(miss), size, size).astype(np.float32), cache)
+    return loss, grads
+
+
+def train(data, epochs=EPOCHS, batch=BATCH, learning_rate=LEARNING_RATE, hidden=HIDDEN, seed=0, progress=None):
+    targeting.require_numpy()
+    size = int(data['size'])
+    gen = np.random.default_rng(seed)
+    total = len(data['miss'])
+    order = gen.permutation(total)
+    held = order[:int(total * VALIDATION)]
+    order = order[len(held):]
+
+    policy = Policy.initial(hidden, seed=seed)
+    names = ('w1', 'b1', 'w2', 'b2')
+    moments = {name: [np.zeros_like(getattr(policy, name)), np.zeros_like(getattr(policy, name))] for name in names}
+    beta1, beta2 = 0.9, 0.999
+    step = 0
+    for epoch in range(epochs):
+        gen.shuffle(order)
+        # Decay the step size over the last third of training
+        rate = learning_rate * min(1.0, 3 * (epochs - epoch) / epochs)
+        for start in range(0, len(order), batch):
+            rows = order[start:start + batch]
+            miss, hit, sunk, ships = augment(size, [data[k][rows] for k in ('miss', 'hit', 'sunk', 'ships')], gen)
+            _, grads = loss_and_grad(policy, size, miss, hit, sunk, data['counts'][rows], ships)
+            step += 1
+            for name in names:
+                m, v = moments[name]
+                m *= beta1
+                m += (1 - beta1) * grads[name]
+                v *= beta2
+                v += (1 - beta2) * grads[name] ** 2
+                update = rate * (m / (1 - beta1 ** step)) / (np.sqrt(v / (1 - beta2 ** step)) + 1e-8)
+                setattr(policy, name, (getattr(policy, name) - update).astype(np.float32))
+        if progress:
+            loss, _ = loss_and_grad(policy, size, *(data[k][held] for k in ('miss', 'hit', 'sunk', 'counts', 'ships')))
+            progress(epoch + 1, loss)
+    return policy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Learned AI's targeting network")
+    commands = parser.add_subparsers(dest='command', required=True)
+    gen_parser = commands.add_parser('generate', help="play self-play games and save the positions")
+    gen_parser.add_argument('--games', type=int, default=3000)
+    gen_parser.add_argument('--seed', type=int, default=0)
+    gen_parser.add_argument('--players', nargs=2, default=["Hard", "Hard"], metavar=('A', 'B'),
+                            help="difficulties playing each other (Learned uses the current policy)")
+    gen_parser.add_argument('--strategy', default="exact", help="Hard AI targeting strategy")
+    gen_parser.add_argument('--output', default='states.npz')
+    train_parser = commands.add_parser('train', help="train on saved positions")
+    train_parser.add_argument('data', nargs='+', help="files written by generate")
+    train_parser.add_argument('--epochs', type=int, default=EPOCHS)
+    train_parser.add_argument('--batch', type=int, default=BATCH)
+    train_parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE)
+    train_parser.add_argument('--hidden', type=int, default=HIDDEN, help="channels of the hidden layer")
+    train_parser.add_argument('--seed', type=int, default=0)
+    train_parser.add_argument('--output', default='policy.json')
+    args = parser.parse_args()
+    targeting.require_numpy()
+    start = time.perf_counter()
+
+    if args.command == 'generate':
+        def progress(games, positions):
+            print(f"\r{games} games, {positions} positions ({time.perf_counter() - start:.0f}s)", end='', flush=True)
+
+        data = generate(args.games, args.seed, args.players, args.strategy, progress=progress)
+        print()
+        np.savez_compressed(args.output, **data)
+        print(f"Wrote {len(data['miss'])} positions to {args.output}")
+    else:
+        files = [np.load(path) for path in args.data]
+        if len({int(f['size']) for f in files}) > 1:
+            parser.error("all data files must be for the same board size")
+        data = {name: np.concatenate([f[name] for f in files]) for name in ('miss', 'hit', 'sunk', 'ships', 'counts')}
+        data['size'] = files[0]['size']
+
+        def progress(epoch, loss):
+            print(f"epoch {epoch}: held-out loss {loss:.4f} ({time.perf_counter() - start:.0f}s)", flush=True)
+
+        policy = train(data, args.epochs, args.batch, args.learning_rate, args.hidden, args.seed, progress)
+        policy.save(args.output)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
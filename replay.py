@@ -0,0 +1,287 @@
+"""Replay logs: every shot, powerup, sinking and game end, in fixed-size records.
+
+A log is a small header followed by 16-byte records. Each game is written
+as one contiguous block when it ends, so a game can be found from where its
+GAME record sits. Records are little-endian: type, side, cell, turn, value
+(u8, u8, u16, u16, u16), then game and time (u32, u32).
+
+    type     side                 cell             turn    value                         time
+    GAME     difficulties         board size       ships   strategies                    unix time
+    SHIP     owner                first cell       -       size, +0x8000 if vertical     -
+    SHOT     attacker             cell             turn    1 on a hit                    ms into the game
+    POWERUP  attacker             aim (or NONE)    turn    index in POWERUP_KINDS        ms into the game
+    SUNK     attacker             first cell       turn    ship size                     ms into the game
+    END      winner               -                turn    -                             ms into the game
+
+Sides are 0 for the engine's user side and 1 for the computer side. In a
+GAME record the low nibble of side is the computer's difficulty and the
+high nibble the user side's plus one (0 = played by a human); the low byte
+of value is the computer's strategy and the high byte the user side's.
+
+ReplayReader memory-maps a log and reads games by index or streams them
+without loading the file. The CLI prints a summary or re-runs one game move
+by move:
+
+    python replay.py info games.log
+    python replay.py show games.log 12 --boards
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from battleship import DIFFICULTIES, POWERUPS, TARGETING_STRATEGIES, Board, Ship
+
+MAGIC = b'BSRL'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')  # magic, version, record size
+RECORD = struct.Struct('<BBHHHII')
+
+GAME, SHIP, SHOT, POWERUP, SUNK, END = range(1, 7)
+NONE = 0xFFFF  # cell of a powerup with no aim (Intel)
+VERTICAL = 0x8000
+
+SIDES = ['user', 'computer']
+POWERUP_KINDS = list(POWERUPS)
+
+Record = namedtuple('Record', 'type side cell turn value game time')
+
+
+class GameRecorder:
+    """The engine's move_log while one game is recorded.
+
+    Records are kept in memory until the game ends, then handed to `sink`
+    (usually ReplayWriter.write_game). Without a sink, data holds the
+    finished game, e.g. to send it back from a worker process.
+    """
+
+    def __init__(self, engine, sink=None):
+        self.sink = sink
+        self.data = bytearray()
+        self.start = time.monotonic()
+        self.size = engine.board_size
+        user_difficulty = 0 if engine.user_difficulty is None else DIFFICULTIES.index(engine.user_difficulty) + 1
+        self.add(GAME, user_difficulty << 4 | DIFFICULTIES.index(engine.difficulty), engine.board_size,
+                 len(engine.ship_sizes),
+                 TARGETING_STRATEGIES.index(engine.user_strategy) << 8 | TARGETING_STRATEGIES.index(engine.strategy),
+                 int(time.time()))
+        for side, player in enumerate((engine.user, engine.computer)):
+            for ship in player.board.ships:
+                start, vertical = ship.placement(self.size)
+                self.add(SHIP, side, start, 0, ship.size | (VERTICAL if vertical else 0), 0)
+        engine.move_log = self
+
+    def add(self, kind, side, cell, turn, value, when):
+        self.data += RECORD.pack(kind, side, cell, turn, value, 0, when)
+
+    def __call__(self, engine, event, side, cell, value):
+        index = NONE if cell is None else cell[0] * self.size + cell[1]
+        when = int((time.monotonic() - self.start) * 1000)
+        side = SIDES.index(side)
+        if event == 'shot':
+            self.add(SHOT, side, index, engine.turn, int(value), when)
+        elif event == 'powerup':
+            self.add(POWERUP, side, index, engine.turn, POWERUP_KINDS.index(value), when)
+        elif event == 'sunk':
+            self.add(SUNK, side, index, engine.turn, value, when)
+        elif event == 'end':
+            self.add(END, side, 0, engine.turn, 0, when)
+            self.finish()
+
+    def finish(self):
+        """Hand the game to the sink; also used for games abandoned before the end"""
+        if self.sink is not None and self.data:
+            self.sink(bytes(self.data))
+            self.data.clear()
+
+
+class ReplayWriter:
+    """Appends games to a log file; safe to share between threads"""
+
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        if new:
+            self.games = 0
+        else:
+            reader = ReplayReader(path)
+            self.games = len(reader)
+            reader.close()
+        self.file = open(path, 'ab')
+        if new:
+            self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size))
+        self.lock = threading.Lock()
+
+    def record(self, engine):
+        """Start recording a game whose fleets are already placed"""
+        return GameRecorder(engine, self.write_game)
+
+    def write_game(self, data):
+        """Append one game's records (from GameRecorder.data), numbering it as the next game"""
+        data = bytearray(data)
+        with self.lock:
+            for offset in range(0, len(data), RECORD.size):
+                struct.pack_into('<I', data, offset + 8, self.games)
+            self.games += 1
+            self.file.write(data)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayReader:
+    """A replay log, memory-mapped. len() is the number of games; reader[i] is the records of game i"""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a replay log this version can read")
+        self.count = (len(self.map) - HEADER.size) // RECORD.size
+        # The type byte of every record, to find where the games start
+        types = self.map[HEADER.size:HEADER.size + self.count * RECORD.size:RECORD.size]
+        self.starts = []
+        start = types.find(GAME)
+        while start >= 0:
+            self.starts.append(start)
+            start = types.find(GAME, start + 1)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, index):
+        start = self.starts[index]
+        stop = self.starts[index + 1] if index + 1 < len(self.starts) else self.count
+        return self.records(start, stop)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def records(self, start=0, stop=None):
+        """Records start..stop (by position in the file), as a list"""
+        stop = self.count if stop is None else stop
+        first = HEADER.size + start * RECORD.size
+        return [Record(*fields) for fields in RECORD.iter_unpack(self.map[first:HEADER.size + stop * RECORD.size])]
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def rebuild(records):
+    """The two boards of a recorded game, as placed before the first shot"""
+    size = records[0].cell
+    boards = [Board(size), Board(size)]
+    for record in records:
+        if record.type == SHIP:
+            ship = Ship.from_placement(record.value & ~VERTICAL, record.cell, bool(record.value & VERTICAL), size)
+            boards[record.side].add_ship(ship)
+    return boards
+
+
+def moves(records):
+    """Group a game's records into moves: runs of records with the same turn and side"""
+    move = []
+    for record in records:
+        if record.type in (GAME, SHIP):
+            continue
+        if move and (record.turn != move[0].turn or record.side != move[0].side):
+            yield move
+            move = []
+        move.append(record)
+    if move:
+        yield move
+
+
+def describe_game(records):
+    game = records[0]
+    difficulty = DIFFICULTIES[game.side & 0xF]
+    user = game.side >> 4
+    opponent = DIFFICULTIES[user - 1] if user else "human"
+    return (f"game {game.game}: {game.cell}x{game.cell}, {game.turn} ships each, "
+            f"user side {opponent} ({TARGETING_STRATEGIES[game.value >> 8]}) vs "
+            f"computer {difficulty} ({TARGETING_STRATEGIES[game.value & 0xFF]}), "
+            f"started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(game.time))}")
+
+
+def show_board(board):
+    rows = []
+    for r in range(board.size):
+        row = []
+        for c in range(board.size):
+            ship = board.find_ship_by_position(r, c)
+            if board.is_shot(r, c):
+                row.append(('#' if ship.is_sunk() else 'X') if ship else 'o')
+            else:
+                row.append('S' if ship else '.')
+        rows.append(' '.join(row))
+    return '\n'.join(rows)
+
+
+def replay(records, show_boards=False, step=False):
+    """Re-run a recorded game move by move, checking every recorded hit against the boards"""
+    print(describe_game(records))
+    boards = rebuild(records)
+    size = records[0].cell
+    mismatches = 0
+    for move in moves(records):
+        side = SIDES[move[0].side]
+        target = boards[1 - move[0].side]
+        parts = []
+        for record in move:
+            if record.type == POWERUP:
+                aim = "" if record.cell == NONE else f" at {divmod(record.cell, size)}"
+                parts.append(f"{POWERUP_KINDS[record.value]}{aim}:")
+            elif record.type == SHOT:
+                r, c = divmod(record.cell, size)
+                hit = target.shoot(r, c)
+                if hit != bool(record.value):
+                    mismatches += 1
+                parts.append(f"{(r, c)} {'hit' if hit else 'miss'}")
+            elif record.type == SUNK:
+                parts.append(f"sank a {record.value}")
+            elif record.type == END:
+                parts.append(f"{side} wins")
+        print(f"turn {move[0].turn:4} {move[0].time / 1000:8.2f}s {side:8} " + ", ".join(parts))
+        if show_boards:
+            print(show_board(target) + "\n")
+        if step:
+            input()
+    if mismatches:
+        print(f"{mismatches} recorded shots disagree with the rebuilt boards")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Battleship replay logs")
+    commands = parser.add_subparsers(dest='command', required=True)
+    info = commands.add_parser('info', help="summarize a log")
+    info.add_argument('log')
+    show = commands.add_parser('show', help="re-run one game move by move")
+    show.add_argument('log')
+    show.add_argument('game', type=int, help="game number (0 is the first game in the file)")
+    show.add_argument('--boards', action='store_true', help="print the target board after every move")
+    show.add_argument('--step', action='store_true', help="wait for Enter after every move")
+    args = parser.parse_args()
+
+    reader = ReplayReader(args.log)
+    if args.command == 'info':
+        ends = [records[-1] for records in reader if records[-1].type == END]
+        wins = [0, 0]
+        for end in ends:
+            wins[end.side] += 1
+        print(f"{len(reader)} games, {reader.count} records, {len(reader) - len(ends)} unfinished")
+        if ends:
+            print(f"user side won {wins[0]}, computer side won {wins[1]}, "
+                  f"average {sum(end.turn + 1 for end in ends) / len(ends):.1f} turns")
+    else:
+        replay(reader[args.game], args.boards, args.step)
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Headless self-play runner: plays AI-vs-AI games on GameEngine with no GUI.
+
+Example:
+    python selfplay.py --games 2000 --jobs 8 --seed 1
+"""
+import argparse
+import itertools
+import multiprocessing
+import random
+import time
+
+import metrics
+import openings
+import targeting
+from battleship import BATCH_SIMULATIONS, BOARD_SIZE, TARGETING_STRATEGIES, GameEngine, batch_attack, parse_fleet
+from replay import GameRecorder, ReplayWriter
+
+
+def play_game(seed, first="Easy", second="Hard", simulations=None,
+              first_strategy="montecarlo", second_strategy="montecarlo",
+              board_size=BOARD_SIZE, ship_sizes=None, record=False):
+    """Play one game to the end. `first` moves first (the engine's user side).
+
+    Returns (True if `first` won, number of turns played, the game's replay
+    records if `record` is set, else None).
+    """
+    engine = GameEngine(difficulty=second, seed=seed, user_difficulty=first, simulations=simulations,
+                        strategy=second_strategy, user_strategy=first_strategy,
+                        board_size=board_size, ship_sizes=ship_sizes)
+    engine.place_fleets()
+    recorder = GameRecorder(engine) if record else None
+    while not engine.winner:
+        engine.play_ai_turn()
+    return engine.winner == 'user', engine.turn + 1, recorder and bytes(recorder.data)
+
+
+def _play(args):
+    return play_game(*args)
+
+
+def play_batch(tasks):
+    """play_game for every task (its argument tuple) at once, in lockstep.
+
+    Each round, the shots of all Hard sides to move come from one
+    batch_attack call over their boards, with `simulations` fleets per board.
+    """
+    games = []
+    for seed, first, second, simulations, first_strategy, second_strategy, board_size, ship_sizes, record in tasks:
+        engine = GameEngine(difficulty=second, seed=seed, user_difficulty=first, simulations=simulations,
+                            strategy=second_strategy, user_strategy=first_strategy,
+                            board_size=board_size, ship_sizes=ship_sizes)
+        engine.place_fleets()
+        games.append((engine, GameRecorder(engine) if record else None))
+    rng = random.Random(tasks[0][0])
+    simulations = tasks[0][3] or BATCH_SIMULATIONS
+
+    playing = [engine for engine, _ in games]
+    while playing:
+        hard = [engine for engine in playing if engine.ai_side()[2] == "Hard"]
+        targets = batch_attack([engine.ai_side()[1].board for engine in hard], simulations, rng)
+        planned = {id(engine): target for engine, target in zip(hard, targets)}
+        for engine in playing:
+            engine.play_ai_turn(planned.get(id(engine)))
+        playing = [engine for engine in playing if not engine.winner]
+    return [(engine.winner == 'user', engine.turn + 1, recorder and bytes(recorder.data))
+            for engine, recorder in games]
+
+
+def run(games, seed=0, jobs=1, simulations=None, a="Easy", b="Hard",
+        a_strategy="montecarlo", b_strategy="montecarlo", board_size=BOARD_SIZE, ship_sizes=None, record=None,
+        batch=None):
+    """Play `games` games between a and b; `record` is a replay log path to append every game to.
+
+    With `batch`, games are played `batch` at a time by play_batch.
+    """
+    # Alternate who moves first so neither AI gets the first-move advantage
+    tasks = []
+    for i in range(games):
+        if i % 2 == 0:
+            tasks.append((seed + i, a, b, simulations, a_strategy, b_strategy, board_size, ship_sizes, bool(record)))
+        else:
+            tasks.append((seed + i, b, a, simulations, b_strategy, a_strategy, board_size, ship_sizes, bool(record)))
+
+    start = time.perf_counter()
+    if batch:
+        units = [tasks[i:i + batch] for i in range(0, games, batch)]
+        if jobs > 1:
+            with multiprocessing.Pool(jobs) as pool:
+                results = list(itertools.chain.from_iterable(pool.map(play_batch, units)))
+        else:
+            results = list(itertools.chain.from_iterable(map(play_batch, units)))
+    elif jobs > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.map(_play, tasks, chunksize=max(1, games // (jobs * 8)))
+    else:
+        results = [_play(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+
+    if record:
+        writer = ReplayWriter(record)
+        for _, _, data in results:
+            writer.write_game(data)
+        writer.close()
+
+    wins = {'a': 0, 'b': 0}
+    turns = {'a': [], 'b': []}
+    for i, (first_won, n, _) in enumerate(results):
+        winner = 'a' if first_won == (i % 2 == 0) else 'b'
+        wins[winner] += 1
+        turns[winner].append(n)
+    return {
+        'games': games,
+        'elapsed': elapsed,
+        'games_per_minute': games / elapsed * 60 if elapsed else 0.0,
+        'wins': wins,
+        'avg_turns_to_win': {k: (sum(v) / len(v) if v else None) for k, v in turns.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Battleship AI self-play")
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=1, help="worker processes")
+    parser.add_argument('--simulations', type=int, default=None,
+                        help="simulations per Hard move for the sampling strategies (default depends on strategy)")
+    parser.add_argument('--a', default="Easy", help="first difficulty")
+    parser.add_argument('--b', default="Hard", help="second difficulty")
+    parser.add_argument('--a-strategy', default="montecarlo", choices=TARGETING_STRATEGIES,
+                        help="heatmap engine when the first difficulty is Hard")
+    parser.add_argument('--b-strategy', default="montecarlo", choices=TARGETING_STRATEGIES,
+                        help="heatmap engine when the second difficulty is Hard")
+    parser.add_argument('--size', type=int, default=BOARD_SIZE, help="board size")
+    parser.add_argument('--fleet', type=parse_fleet, default=None, help="ship sizes, e.g. 5,4,3,3,2 or 5x4,3x12")
+    parser.add_argument('--record', default=None, help="replay log to append every game to")
+    parser.add_argument('--metrics', default=None,
+                        help="collect metrics and write them here (Prometheus text for .prom, else JSON); needs --jobs 1")
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help="processes per move for the parallel strategy (default: one per CPU)")
+    parser.add_argument('--parallel-threshold', type=int, default=None,
+                        help="simulations below which the parallel strategy stays in one process")
+    parser.add_argument('--batch', type=int, default=None,
+                        help="play this many games at a time, aiming every Hard shot of a round in one batch "
+                             "(numpy sampler; --simulations is then fleets per board, default %d)" % BATCH_SIMULATIONS)
+    parser.add_argument('--book', default=None, help="opening book to use instead of openings.book ('' for none)")
+    args = parser.parse_args()
+    if args.metrics and args.jobs > 1:
+        parser.error("--metrics is collected in this process only; use --jobs 1")
+    metrics.enable(bool(args.metrics))
+    targeting.configure_default_sampler(args.pool_size, args.parallel_threshold)
+    if args.book is not None:
+        try:
+            openings.configure_default_book(args.book)
+        except FileNotFoundError:
+            parser.error(f"no opening book at {args.book}")
+
+    stats = run(args.games, args.seed, args.jobs, args.simulations, args.a, args.b,
+                args.a_strategy, args.b_strategy, args.size, args.fleet, args.record, args.batch)
+    print(f"{stats['games']} games in {stats['elapsed']:.2f}s ({stats['games_per_minute']:.0f} games/min)")
+    for side, name, strategy in (('a', args.a, args.a_strategy), ('b', args.b, args.b_strategy)):
+        label = f"{name} ({strategy})" if name == "Hard" else name
+        avg = stats['avg_turns_to_win'][side]
+        avg_text = f"{avg:.1f}" if avg is not None else "-"
+        print(f"{side}: {label}: {stats['wins'][side]} wins, avg turns to win {avg_text}")
+    if args.metrics:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,410 @@
+"""Asyncio game server: many Battleship matches in one process.
+
+Clients talk line-delimited JSON over TCP, one request object per line and
+one reply per request. Each connection plays in one session. The server
+also pushes events nobody asked for: the AI's move, the opponent's move,
+and the opponent joining.
+
+Requests:
+    {"op": "new", "mode": "ai", "difficulty": "Hard", "strategy": "exact",
+     "seed": 1, "size": 10, "fleet": [5, 4, 3, 3, 2]}
+        start a match against the AI (every field but "op" is optional);
+        "mode": "pvp" opens a match for a second player instead
+    {"op": "join", "session": "12"}      take the second seat of a pvp match
+    {"op": "fire", "r": 3, "c": 4}
+    {"op": "powerup", "kind": "Missile", "r": 3, "c": 4}
+    {"op": "state"}
+    {"op": "metrics", "format": "prometheus"}
+        the server's metrics (see metrics.py) as Prometheus text, or as
+        JSON without "format"; collected only when started with --metrics
+    {"op": "quit"}
+
+Replies carry "ok"; a failed request gets {"ok": false, "error": ...}.
+Moves come back as "changed": [[r, c, hit], ...] plus "sunk", "turn" and
+"winner". Winners are "first" and "second"; the player who opened the
+session is first. An AI move that fails is logged and pushed as
+{"event": "move", "by": "ai", "ok": false, "error": ...}, and the server
+then ends the session and closes the connection.
+
+AI moves run on a thread pool, so a slow Hard move only holds up its own
+session. The stdlib has no WebSocket server, so only plain TCP is served.
+
+With --spool, sessions idle for --idle seconds are written to that directory
+as snapshots (see snapshot.py) and dropped from memory; the next request on
+the session loads it back.
+
+Example:
+    python server.py --port 8765
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import openings
+import snapshot
+from battleship import BOARD_SIZE, DIFFICULTIES, POWERUPS, TARGETING_STRATEGIES, GameEngine, MoveCancelled
+from replay import ReplayWriter
+
+log = logging.getLogger('server')
+
+# Longest request line accepted, in bytes
+MAX_LINE = 64 * 1024
+
+# Threads computing AI moves (shared by every session)
+AI_WORKERS = 4
+
+# Seconds without a request before a session is spooled to disk (with --spool)
+IDLE_SECONDS = 300
+
+# Engine side of each seat: the session's opener plays the engine's user side
+SIDES = ('user', 'computer')
+SEAT_NAMES = {'user': 'first', 'computer': 'second'}
+
+
+class Session:
+    """One match: its engine and the connections seated at it"""
+
+    def __init__(self, session_id, engine, mode):
+        self.id = session_id
+        self.engine = engine
+        self.mode = mode  # "ai" or "pvp"
+        self.seats = [None, None]  # Connection writers, one per side
+        self.lock = asyncio.Lock()  # Moves of one session never overlap
+        self.ai_task = None
+        self.last_active = time.monotonic()
+        self.spooled = None  # Snapshot file holding the engine while it is evicted
+        self.recorder = None  # replay.GameRecorder, with --record
+
+    def idle_since(self, cutoff):
+        """True if the session can be evicted: loaded, no move running, no request since cutoff"""
+        return (self.engine is not None and self.ai_task is None and not self.lock.locked()
+                and self.last_active < cutoff)
+
+    def evict(self, path):
+        """Write the engine to a snapshot file and drop it from memory"""
+        snapshot.save(self.engine, path)
+        self.engine = None
+        self.spooled = path
+
+    def resume(self, sampler=None):
+        """Load the engine back if it was evicted, and mark the session active"""
+        if self.engine is None:
+            self.engine = snapshot.load(self.spooled, sampler)
+            self.engine.move_log = self.recorder
+            os.remove(self.spooled)
+            self.spooled = None
+        self.last_active = time.monotonic()
+        return self.engine
+
+    def opponent(self, seat):
+        return self.seats[1 - seat]
+
+    def state(self, seat):
+        """What the player in `seat` may see"""
+        engine = self.engine
+        me, them, _ = engine.players(SIDES[seat])
+        return {
+            'session': self.id,
+            'mode': self.mode,
+            'seat': SEAT_NAMES[SIDES[seat]],
+            'size': engine.board_size,
+            'fleet': engine.ship_sizes,
+            'turn': engine.turn,
+            'your_turn': not engine.winner and engine.turn % 2 == seat,
+            'winner': self.winner(),
+            'ships': [ship.positions for ship in me.board.ships],
+            'powerups': me.powerups,
+            'shots_taken': shots(them.board),
+            'shots_received': shots(me.board),
+        }
+
+    def winner(self):
+        return SEAT_NAMES.get(self.engine.winner)
+
+
+def is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def shots(board):
+    """[[r, c, hit], ...] of every shot on a board"""
+    return [[r, c, board.is_hit(r, c)] for r, c in board.cells(board.shot_mask)]
+
+
+def move_result(engine, board, changed):
+    """Reply body for a move that changed `changed` on `board`"""
+    return {
+        'changed': [[r, c, board.is_hit(r, c)] for r, c in changed],
+        'sunk': [ship.positions for ship in engine.sunk],
+        'turn': engine.turn,
+        'winner': SEAT_NAMES.get(engine.winner),
+    }
+
+
+class GameServer:
+    def __init__(self, ai_workers=None, simulations=None, sampler=None, spool=None, idle_seconds=None,
+                 replay_log=None):
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.executor = ThreadPoolExecutor(max_workers=ai_workers or AI_WORKERS)
+        self.simulations = simulations
+        self.sampler = sampler
+        self.spool = spool  # Directory idle sessions are evicted to, or None to keep them all in memory
+        self.idle_seconds = idle_seconds or IDLE_SECONDS
+        self.replay_log = replay_log  # replay.ReplayWriter every game is recorded to, or None
+        self.moves = 0  # Moves played by humans and AI, for monitoring
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        if self.spool:
+            os.makedirs(self.spool, exist_ok=True)
+            asyncio.ensure_future(self.evict_idle())
+        async with server:
+            await server.serve_forever()
+
+    async def evict_idle(self):
+        while True:
+            await asyncio.sleep(self.idle_seconds / 2)
+            self.evict_idle_sessions(time.monotonic() - self.idle_seconds)
+
+    def evict_idle_sessions(self, cutoff):
+        """Spool every session with no request since cutoff; returns how many were evicted"""
+        evicted = 0
+        for session in list(self.sessions.values()):
+            if session.idle_since(cutoff):
+                session.evict(os.path.join(self.spool, f'{session.id}.snap'))
+                evicted += 1
+        return evicted
+
+    async def handle(self, reader, writer):
+        """One client connection"""
+        seat = None
+        session = None
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    op = request['op']
+                except (ValueError, KeyError, TypeError):
+                    await send(writer, {'ok': False, 'error': "expected a JSON object with an \"op\""})
+                    continue
+
+                if op == 'quit':
+                    break
+                if session is not None:
+                    session.resume(self.sampler)
+                if op in ('new', 'join'):
+                    if session is not None:
+                        reply = {'ok': False, 'error': "already in a session"}
+                    else:
+                        try:
+                            session, seat = self.new_session(request) if op == 'new' else self.join(request)
+                        except ValueError as e:
+                            reply = {'ok': False, 'error': str(e)}
+                        else:
+                            session.seats[seat] = writer
+                            reply = {'ok': True, **session.state(seat)}
+                            if op == 'join':
+                                await send(session.opponent(seat), {'event': 'joined', **session.state(1 - seat)})
+                    await send(writer, reply)
+                elif op == 'metrics':
+                    if request.get('format') == 'prometheus':
+                        await send(writer, {'ok': True, 'metrics': metrics.prometheus()})
+                    else:
+                        await send(writer, {'ok': True, 'metrics': metrics.snapshot()})
+                elif session is None:
+                    await send(writer, {'ok': False, 'error': "start or join a session first"})
+                elif op == 'state':
+                    await send(writer, {'ok': True, **session.state(seat)})
+                elif op in ('fire', 'powerup'):
+                    await self.move(session, seat, request, writer)
+                else:
+                    await send(writer, {'ok': False, 'error': f"unknown op {op!r}"})
+        finally:
+            if session is not None:
+                self.leave(session, seat)
+            writer.close()
+
+    def new_session(self, request):
+        mode = request.get('mode', 'ai')
+        if mode not in ('ai', 'pvp'):
+            raise ValueError("mode must be \"ai\" or \"pvp\"")
+        difficulty = request.get('difficulty', 'Hard')
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f"difficulty must be one of {DIFFICULTIES}")
+        strategy = request.get('strategy', 'exact')
+        if strategy not in TARGETING_STRATEGIES:
+            raise ValueError(f"strategy must be one of {TARGETING_STRATEGIES}")
+        try:
+            size = int(request.get('size', BOARD_SIZE))
+        except (TypeError, ValueError):
+            raise ValueError("size must be an integer")
+        fleet = request.get('fleet')
+        if fleet is not None and not (isinstance(fleet, list)
+                                      and all(is_int(length) and length > 0 for length in fleet)):
+            raise ValueError("fleet must be a list of positive integer ship lengths")
+        seed = request.get('seed')
+        if seed is not None and not is_int(seed):
+            raise ValueError("seed must be an integer")
+        engine = GameEngine(difficulty, seed=seed, simulations=self.simulations, strategy=strategy,
+                            sampler=self.sampler, board_size=size, ship_sizes=fleet)
+        engine.place_fleets()
+        session = Session(str(next(self.ids)), engine, mode)
+        if self.replay_log:
+            session.recorder = self.replay_log.record(engine)
+        self.sessions[session.id] = session
+        return session, 0
+
+    def join(self, request):
+        session = self.sessions.get(str(request.get('session')))
+        if session is None or session.mode != 'pvp':
+            raise ValueError("no such pvp session")
+        if session.seats[1] is not None:
+            raise ValueError("session is full")
+        session.resume(self.sampler)
+        return session, 1
+
+    def leave(self, session, seat):
+        session.seats[seat] = None
+        if session.opponent(seat) is None:
+            if session.ai_task is not None:
+                session.engine.cancel()
+            if session.spooled:
+                os.remove(session.spooled)
+            if session.recorder:
+                session.recorder.finish()
+            self.sessions.pop(session.id, None)
+        else:
+            asyncio.ensure_future(send(session.opponent(seat), {'event': 'left'}))
+
+    async def move(self, session, seat, request, writer):
+        engine = session.engine
+        side = SIDES[seat]
+        _, defender, _ = engine.players(side)
+        if session.mode == 'pvp' and session.opponent(seat) is None:
+            await send(writer, {'ok': False, 'error': "waiting for an opponent"})
+            return
+        async with session.lock:
+            error = None
+            try:
+                r, c = int(request['r']), int(request['c'])
+            except (KeyError, TypeError, ValueError):
+                error = "a move needs integer \"r\" and \"c\""
+            else:
+                kind = request.get('kind')
+                if request['op'] == 'powerup' and not (isinstance(kind, str) and kind in POWERUPS):
+                    error = f"\"kind\" must be one of {list(POWERUPS)}"
+                elif engine.winner:
+                    error = "the game is over"
+                elif engine.turn % 2 != seat:
+                    error = "not your turn"
+                else:
+                    engine.status = ""
+                    try:
+                        if request['op'] == 'fire':
+                            changed = engine.fire(r, c, side)
+                        else:
+                            changed = engine.use_powerup(kind, r, c, side)
+                    except ValueError as e:  # A powerup aimed off the board
+                        error = str(e)
+                    else:
+                        if changed is None:
+                            error = engine.status or "that cell can't be shot"
+            if error:
+                await send(writer, {'ok': False, 'error': error})
+                return
+            self.moves += 1
+            result = move_result(engine, defender.board, changed)
+            await send(writer, {'ok': True, **result})
+
+        if session.mode == 'pvp':
+            await send(session.opponent(seat), {'event': 'move', 'by': 'opponent', **result})
+        elif not engine.winner:
+            session.ai_task = asyncio.ensure_future(self.ai_move(session, writer))
+
+    async def ai_move(self, session, writer):
+        engine = session.engine
+        async with session.lock:
+            loop = asyncio.get_running_loop()
+            try:
+                changed = await loop.run_in_executor(self.executor, engine.computer_turn)
+            except MoveCancelled:  # The player left mid-move
+                return
+            except Exception:
+                # The engine may be half way through the move, so the game can't go on.
+                # Closing the connection ends the session through handle() and leave()
+                log.exception("AI move failed in session %s", session.id)
+                metrics.count('server.ai_errors')
+                await send(writer, {'event': 'move', 'by': 'ai', 'ok': False,
+                                    'error': "the AI move failed; the session is over"})
+                writer.close()
+                return
+            finally:
+                session.ai_task = None
+            self.moves += 1
+            result = move_result(engine, engine.user.board, changed)
+        await send(writer, {'event': 'move', 'by': 'ai', **result})
+
+    def close(self):
+        for session in self.sessions.values():
+            if session.engine is not None:
+                session.engine.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def send(writer, message):
+    if writer is None or writer.is_closing():
+        return
+    writer.write(json.dumps(message).encode() + b'\n')
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Battleship game server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--ai-workers', type=int, default=AI_WORKERS, help="threads computing AI moves")
+    parser.add_argument('--simulations', type=int, default=None,
+                        help="simulations per Hard move for the sampling strategies")
+    parser.add_argument('--spool', default=None, help="directory to evict idle sessions to")
+    parser.add_argument('--idle', type=float, default=IDLE_SECONDS, help="seconds before an idle session is evicted")
+    parser.add_argument('--record', default=None, help="replay log to append every game to")
+    parser.add_argument('--metrics', action='store_true', help="collect metrics for the \"metrics\" op")
+    parser.add_argument('--book', default=None, help="opening book to use instead of openings.book ('' for none)")
+    args = parser.parse_args()
+
+    metrics.enable(args.metrics)
+    if args.book is not None:
+        try:
+            openings.configure_default_book(args.book)
+        except FileNotFoundError:
+            parser.error(f"no opening book at {args.book}")
+    replay_log = ReplayWriter(args.record) if args.record else None
+    server = GameServer(args.ai_workers, args.simulations, spool=args.spool, idle_seconds=args.idle,
+                        replay_log=replay_log)
+    print(f"Serving on {args.host}:{args.port}")
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Compact binary snapshots of a GameEngine, for save/resume and moving sessions.
+
+A snapshot holds everything needed to carry on with the game exactly where it
+stopped: the settings (difficulty, strategies, simulations), turn and winner,
+both fleets, both shot masks, powerup counts, the Easy AI's hunt state and
+the engine's RNG state. A classic 10x10 game takes about 2.6 KB, most of it the
+Mersenne Twister state. All integers are little-endian.
+
+    header    magic, version, board size, difficulties, strategies, winner,
+              turn, simulations (0 = default), number of ship sizes
+    fleet     one byte per ship size
+    player    user, then computer:
+                ships (count, then size, vertical, first cell for each)
+                shot mask (one bit per cell)
+                powerups (count, then kind, amount for each)
+                target_queue and current_hunt (count, then cells), last_hit
+    rng       Random.getstate(): version, 625 words, gauss_next (NaN = none)
+
+Cells are stored as r * size + c.
+"""
+import math
+import struct
+
+from battleship import DIFFICULTIES, POWERUPS, TARGETING_STRATEGIES, GameEngine, Ship
+
+MAGIC = b'BSNP'
+VERSION = 1
+
+HEADER = struct.Struct('<4sBBBBBBBIIH')
+SHIP = struct.Struct('<BBH')
+COUNT = struct.Struct('<H')
+POWERUP = struct.Struct('<BH')
+RNG = struct.Struct('<B625Id')
+
+POWERUP_KINDS = list(POWERUPS)
+WINNERS = [None, 'user', 'computer']
+NO_CELL = 0xFFFF  # last_hit of None
+NO_DIFFICULTY = 0xFF  # user_difficulty of None
+
+
+def encode(engine):
+    """GameEngine -> snapshot bytes"""
+    n = engine.board_size
+    parts = [HEADER.pack(
+        MAGIC, VERSION, n,
+        DIFFICULTIES.index(engine.difficulty),
+        NO_DIFFICULTY if engine.user_difficulty is None else DIFFICULTIES.index(engine.user_difficulty),
+        TARGETING_STRATEGIES.index(engine.strategy),
+        TARGETING_STRATEGIES.index(engine.user_strategy),
+        WINNERS.index(engine.winner),
+        engine.turn,
+        engine.simulations or 0,
+        len(engine.ship_sizes),
+    ), bytes(engine.ship_sizes)]
+
+    mask_bytes = (n * n + 7) // 8
+    for player in (engine.user, engine.computer):
+        board = player.board
+        parts.append(COUNT.pack(len(board.ships)))
+        for ship in board.ships:
+            start, vertical = ship.placement(n)
+            parts.append(SHIP.pack(ship.size, vertical, start))
+        parts.append(board.shot_mask.to_bytes(mask_bytes, 'little'))
+        parts.append(COUNT.pack(len(player.powerups)))
+        for kind, count in player.powerups.items():
+            parts.append(POWERUP.pack(POWERUP_KINDS.index(kind), count))
+        for cells in (player.target_queue, player.current_hunt):
+            parts.append(COUNT.pack(len(cells)))
+            parts.append(struct.pack(f'<{len(cells)}H', *(r * n + c for r, c in cells)))
+        last_hit = player.last_hit
+        parts.append(COUNT.pack(NO_CELL if last_hit is None else last_hit[0] * n + last_hit[1]))
+
+    version, words, gauss = engine.rng.getstate()
+    parts.append(RNG.pack(version, *words, math.nan if gauss is None else gauss))
+    return b''.join(parts)
+
+
+def decode(data, sampler=None):
+    """Snapshot bytes -> GameEngine; `sampler` is handed to the engine as is.
+
+    Raises ValueError if data is not one whole snapshot of this version.
+    """
+    try:
+        engine, end = read(data, sampler)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f"truncated or corrupt snapshot: {e}") from e
+    if end != len(data):
+        raise ValueError(f"{len(data) - end} stray bytes after the snapshot")
+    return engine
+
+
+def read(data, sampler):
+    """The engine in data and the offset where its snapshot ends"""
+    (magic, version, n, difficulty, user_difficulty, strategy, user_strategy, winner,
+     turn, simulations, fleet_count) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("not a Battleship snapshot, or from another version")
+    offset = HEADER.size
+    ship_sizes = list(data[offset:offset + fleet_count])
+    offset += fleet_count
+
+    engine = GameEngine(DIFFICULTIES[difficulty], seed=0,
+                        user_difficulty=None if user_difficulty == NO_DIFFICULTY else DIFFICULTIES[user_difficulty],
+                        simulations=simulations or None, strategy=TARGETING_STRATEGIES[strategy],
+                        user_strategy=TARGETING_STRATEGIES[user_strategy], sampler=sampler,
+                        board_size=n, ship_sizes=ship_sizes)
+    engine.turn = turn
+    engine.winner = WINNERS[winner]
+
+    mask_bytes = (n * n + 7) // 8
+    for player in (engine.user, engine.computer):
+        board = player.board
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        for size, vertical, start in SHIP.iter_unpack(data[offset:offset + count * SHIP.size]):
+            board.add_ship(Ship.from_placement(size, start, vertical, n))
+        offset += count * SHIP.size
+        board.load_shots(int.from_bytes(data[offset:offset + mask_bytes], 'little'))
+        if len(data) < offset + mask_bytes:
+            raise ValueError("truncated shot mask")
+        offset += mask_bytes
+
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        player.powerups = {}
+        for kind, amount in POWERUP.iter_unpack(data[offset:offset + count * POWERUP.size]):
+            player.powerups[POWERUP_KINDS[kind]] = amount
+        offset += count * POWERUP.size
+
+        queues = []
+        for _ in range(2):
+            count, = COUNT.unpack_from(data, offset)
+            offset += COUNT.size
+            queues.append([divmod(i, n) for i in struct.unpack_from(f'<{count}H', data, offset)])
+            offset += 2 * count
+        player.target_queue, player.current_hunt = queues
+        last_hit, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        player.last_hit = None if last_hit == NO_CELL else divmod(last_hit, n)
+
+    state = RNG.unpack_from(data, offset)
+    gauss = state[-1]
+    engine.rng.setstate((state[0], state[1:-1], None if math.isnan(gauss) else gauss))
+    return engine, offset + RNG.size
+
+
+def save(engine, path):
+    with open(path, 'wb') as f:
+        f.write(encode(engine))
+
+
+def load(path, sampler=None):
+    with open(path, 'rb') as f:
+        return decode(f.read(), sampler)
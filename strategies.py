@@ -0,0 +1,92 @@
+"""Pluggable AI players for GameEngine.
+
+A Strategy plays one move for the side it is attached to (Player.ai). The
+built-in ones wrap the engine's own AIs, so a change to the Easy hunt/target
+logic or to enhanced_monte_carlo_attack shows up in a tournament as is:
+
+    Random              a random unshot cell every turn, no powerups
+    Easy                GameEngine.easy_mode_turn
+    Hard[:TARGETING[:SIMULATIONS]]
+                        GameEngine.hard_mode_turn with its own heatmap engine
+                        and budget, e.g. Hard:exact or Hard:montecarlo:200
+    Learned             GameEngine.hard_mode_turn with the learned policy (policy.py)
+
+New strategies subclass Strategy and are registered under a name:
+
+    class Greedy(Strategy):
+        def move(self, engine, attacker, defender):
+            ...
+
+    register('Greedy', Greedy)
+
+Extra ':'-separated fields of a spec are passed to the constructor as strings.
+"""
+import importlib
+
+from battleship import TARGETING_STRATEGIES
+
+STRATEGIES = {}
+
+
+def register(name, cls):
+    STRATEGIES[name] = cls
+
+
+def load_plugins(modules):
+    """Import modules that register their own strategies"""
+    for name in modules or ():
+        importlib.import_module(name)
+
+
+def make_strategy(spec):
+    """'Hard:exact:500' -> HardAI('exact', '500')"""
+    name, *args = spec.split(':')
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown strategy {name!r} (known: {', '.join(STRATEGIES)})")
+    return STRATEGIES[name](*args)
+
+
+class Strategy:
+    """An AI player. move() plays one whole move for attacker through the engine
+    (engine.shoot, engine.use_computer_powerup, ...); the engine handles the turn
+    and win detection around it.
+    """
+    # A heatmap engine from TARGETING_STRATEGIES and its budget, used by
+    # GameEngine.targeting_settings when the strategy plays Hard moves
+    targeting = None
+    simulations = None
+
+    def move(self, engine, attacker, defender):
+        raise NotImplementedError
+
+
+class RandomAI(Strategy):
+    def move(self, engine, attacker, defender):
+        engine.shoot(defender.board, *engine.get_random_unhit_cell(defender.board))
+
+
+class EasyAI(Strategy):
+    def move(self, engine, attacker, defender):
+        engine.easy_mode_turn(attacker, defender)
+
+
+class HardAI(Strategy):
+    def __init__(self, targeting="montecarlo", simulations=None):
+        if targeting not in TARGETING_STRATEGIES:
+            raise ValueError(f"unknown targeting strategy {targeting!r}")
+        self.targeting = targeting
+        self.simulations = int(simulations) if simulations else None
+
+    def move(self, engine, attacker, defender):
+        engine.hard_mode_turn(attacker, defender)
+
+
+class LearnedAI(Strategy):
+    def move(self, engine, attacker, defender):
+        engine.hard_mode_turn(attacker, defender, difficulty="Learned")
+
+
+register('Random', RandomAI)
+register('Easy', EasyAI)
+register('Hard', HardAI)
+register('Learned', LearnedAI)
@@ -0,0 +1,468 @@
+"""Targeting engines for the Hard AI.
+
+An engine turns what the attacker can see of a board into a heatmap: a flat
+list with one score per cell (index r * size + c), higher meaning more likely
+to hold a ship. What the attacker sees is passed in as bitmasks:
+
+    blocked_mask  cells no remaining ship can use (misses and sunk ships)
+    hit_mask      hits on ships that are still afloat
+    ship_sizes    sizes of the ships still afloat
+"""
+import heapq
+import importlib.util
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import metrics
+from bitboard import cell_placements, iter_bits, placement_indices, placement_masks
+
+# numpy is optional and only the vectorized engines need it. It takes longer
+# to import than the rest of the game together, so require_numpy() loads it
+# on first use.
+np = None
+
+# A placement through an unresolved hit is this many times likelier per hit it covers
+HIT_WEIGHT = 25
+
+# Simulations per chunk in the vectorized sampler, to bound its memory use
+SAMPLE_CHUNK = 20000
+
+# ParallelSampler defaults: pool size (None = one per CPU), simulations per
+# work unit, and the request size below which the work stays in the calling process
+PARALLEL_WORKERS = None
+PARALLEL_UNIT = 50000
+PARALLEL_THRESHOLD = 200000
+
+
+def exact_heatmap(size, blocked_mask, hit_mask, ship_sizes):
+    """Count every legal placement of every remaining ship exactly.
+
+    Each horizontal and vertical placement that avoids blocked cells adds its
+    weight to the unshot cells it covers. The result is deterministic, so
+    repeated calls on the same position always agree. The game uses
+    HeatmapCache, which gets the same numbers incrementally; this full
+    recount is what test_targeting.py checks it against.
+    """
+    heatmap = [0] * (size * size)
+    hit_cells = set(iter_bits(hit_mask))
+    for ship_size, count in Counter(ship_sizes).items():
+        for mask, cells in zip(placement_masks(size, ship_size), placement_indices(size, ship_size)):
+            if mask & blocked_mask:
+                continue
+            weight = count * HIT_WEIGHT ** (mask & hit_mask).bit_count()
+            for i in cells:
+                if i not in hit_cells:
+                    heatmap[i] += weight
+    return heatmap
+
+
+def placement_weight(mask, blocked_mask, hit_mask):
+    if mask & blocked_mask:
+        return 0
+    return HIT_WEIGHT ** (mask & hit_mask).bit_count()
+
+
+@lru_cache(maxsize=None)
+def empty_board_map(board_size, ship_size):
+    """Heatmap of a single ship of ship_size on a board with no shots yet"""
+    heat = [0] * (board_size * board_size)
+    for cells in placement_indices(board_size, ship_size):
+        for i in cells:
+            heat[i] += 1
+    return tuple(heat)
+
+
+class HeatmapCache:
+    """exact_heatmap for one board, kept up to date between turns.
+
+    Results are keyed on the visible shot state, so asking again about the same
+    position is a single tuple compare. Each ship size starts from its
+    empty-board heatmap; after that only the placements crossing a changed cell
+    are re-weighed, and the entries of a ship size are dropped once no ship of
+    that size is afloat. The cost of a query is therefore proportional to the
+    cells that changed, not to the board. The returned list is shared with the
+    cache and must not be modified.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.key = None
+        self.blocked_mask = 0
+        self.hit_mask = 0
+        self.hit_cells = set()
+        self.weights = {}  # ship size -> current weight of each placement
+        self.maps = {}  # ship size -> heatmap of a single ship of that size
+        self.heatmap = [0] * (size * size)
+
+    def query(self, blocked_mask, hit_mask, ship_sizes):
+        counts = Counter(ship_sizes)
+        key = (blocked_mask, hit_mask, tuple(sorted(counts.items())))
+        if key == self.key:
+            return self.heatmap
+
+        for ship_size in list(self.maps):
+            if ship_size not in counts:
+                del self.maps[ship_size]
+                del self.weights[ship_size]
+
+        changed = (blocked_mask ^ self.blocked_mask) | (hit_mask ^ self.hit_mask)
+        hit_cells = set(iter_bits(hit_mask))
+        for ship_size in counts:
+            if ship_size in self.maps:
+                self._update(ship_size, blocked_mask, hit_mask, changed, self.hit_cells, hit_cells)
+            else:
+                # Start from the unshot board and apply every shot so far
+                self.weights[ship_size] = [1] * len(placement_masks(self.size, ship_size))
+                self.maps[ship_size] = list(empty_board_map(self.size, ship_size))
+                self._update(ship_size, blocked_mask, hit_mask, blocked_mask | hit_mask, set(), hit_cells)
+
+        heatmap = [0] * (self.size * self.size)
+        for ship_size, count in counts.items():
+            heatmap = [h + count * v for h, v in zip(heatmap, self.maps[ship_size])]
+        self.key = key
+        self.blocked_mask = blocked_mask
+        self.hit_mask = hit_mask
+        self.hit_cells = hit_cells
+        self.heatmap = heatmap
+        return heatmap
+
+    def _update(self, ship_size, blocked_mask, hit_mask, changed, old_hit_cells, hit_cells):
+        masks = placement_masks(self.size, ship_size)
+        indices = placement_indices(self.size, ship_size)
+        covering = cell_placements(self.size, ship_size)
+        touched = set()
+        for i in iter_bits(changed):
+            touched.update(covering[i])
+
+        weights = self.weights[ship_size]
+        heat = self.maps[ship_size]
+        for p in touched:
+            old = weights[p]
+            if old:
+                for i in indices[p]:
+                    if i not in old_hit_cells:
+                        heat[i] -= old
+            weight = placement_weight(masks[p], blocked_mask, hit_mask)
+            weights[p] = weight
+            if weight:
+                for i in indices[p]:
+                    if i not in hit_cells:
+                        heat[i] += weight
+
+
+# Powerup planning. Scores sum a heatmap over the cells a powerup would fire
+# on; known cells score 0 in every engine's heatmap, so a score is the
+# expected number of new hits up to a constant.
+
+def box_scores(heatmap, size, radius=1):
+    """Sum of the heatmap over the (2 * radius + 1)^2 box around every cell, clipped to the board"""
+    # Summed-area table with a zero row and column in front
+    table = [[0] * (size + 1) for _ in range(size + 1)]
+    for r in range(size):
+        running = 0
+        above, row = table[r], table[r + 1]
+        for c in range(size):
+            running += heatmap[r * size + c]
+            row[c + 1] = above[c + 1] + running
+    scores = [0] * (size * size)
+    for r in range(size):
+        top, bottom = max(r - radius, 0), min(r + radius + 1, size)
+        for c in range(size):
+            left, right = max(c - radius, 0), min(c + radius + 1, size)
+            scores[r * size + c] = (table[bottom][right] - table[top][right]
+                                    - table[bottom][left] + table[top][left])
+    return scores
+
+
+def row_scores(heatmap, size):
+    """Sum of the heatmap over every row"""
+    return [sum(heatmap[r * size:(r + 1) * size]) for r in range(size)]
+
+
+def top_cells(heatmap, candidates, count, rng):
+    """The `count` highest-scoring candidate cells, ties broken at random"""
+    return heapq.nlargest(count, candidates, key=lambda i: (heatmap[i], rng.random()))
+
+
+def require_numpy():
+    """Import numpy into this module if it isn't yet, and return it"""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("this targeting strategy needs numpy (pip install numpy)") from None
+        np = numpy
+    return np
+
+
+def have_numpy():
+    """Whether numpy can be loaded; doesn't import it"""
+    return np is not None or importlib.util.find_spec('numpy') is not None
+
+
+def mask_to_array(mask, n_cells):
+    """Bitmask -> numpy bool array of length n_cells"""
+    raw = np.frombuffer(mask.to_bytes((n_cells + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(raw, bitorder='little')[:n_cells].astype(bool)
+
+
+@lru_cache(maxsize=None)
+def placement_cells(board_size, ship_size):
+    """placement_indices as an array of shape (placements, ship_size)"""
+    require_numpy()
+    return np.array(placement_indices(board_size, ship_size), dtype=np.int32).reshape(-1, ship_size)
+
+
+def sampled_heatmap(size, blocked_mask, hit_mask, ship_sizes, simulations, rng):
+    """Vectorized Monte Carlo: draw `simulations` whole fleets at once with numpy.
+
+    Every ship is drawn uniformly from its placements that avoid blocked cells,
+    for all simulations in one call. Fleets whose ships overlap, or that leave
+    an unresolved hit uncovered, are dropped with array masks, and the
+    survivors are added to the heatmap with a single bincount.
+    `rng` is a random.Random; the numpy generator is seeded from it so games
+    stay reproducible.
+    """
+    require_numpy()
+    gen = np.random.default_rng(rng.getrandbits(64))
+    counts = sample_counts(size, blocked_mask, hit_mask, ship_sizes, simulations, gen)
+    count_accepted('targeting.numpy', counts, ship_sizes, simulations)
+    return finish_counts(counts, size, blocked_mask, hit_mask)
+
+
+def sample_counts(size, blocked_mask, hit_mask, ship_sizes, simulations, gen):
+    """Raw per-cell counts of the accepted fleets, as an int64 array"""
+    require_numpy()
+    n_cells = size * size
+    blocked = mask_to_array(blocked_mask, n_cells)
+    hit_cells = np.fromiter(iter_bits(hit_mask), dtype=np.int64)
+
+    tables = []
+    for ship_size in ship_sizes:
+        table = placement_cells(size, ship_size)
+        table = table[~blocked[table].any(axis=1)]
+        if not len(table):
+            return np.zeros(n_cells, dtype=np.int64)
+        tables.append(table)
+
+    counts = np.zeros(n_cells, dtype=np.int64)
+    for start in range(0, simulations, SAMPLE_CHUNK):
+        n = min(SAMPLE_CHUNK, simulations - start)
+        fleet = np.concatenate([table[gen.integers(0, len(table), n)] for table in tables], axis=1)
+        ordered = np.sort(fleet, axis=1)
+        valid = ~(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+        if len(hit_cells):
+            occupied = np.zeros((n, n_cells), dtype=bool)
+            occupied[np.arange(n)[:, None], fleet] = True
+            valid &= occupied[:, hit_cells].all(axis=1)
+        counts += np.bincount(fleet[valid].ravel(), minlength=n_cells)
+    return counts
+
+
+def count_accepted(name, counts, ship_sizes, simulations):
+    """Report how many of the simulated fleets made it into counts to the metrics layer"""
+    if metrics.enabled and ship_sizes:
+        metrics.count(name + '.proposals', simulations)
+        metrics.count(name + '.accepted', int(counts.sum()) // sum(ship_sizes))
+
+
+def finish_counts(counts, size, blocked_mask, hit_mask):
+    """Zero the cells that are already known and return the heatmap as a list"""
+    n_cells = size * size
+    counts[mask_to_array(blocked_mask | hit_mask, n_cells)] = 0
+    return counts.tolist()
+
+
+# Batches: many boards of the same size and fleet at once. A board's state is
+# a row of two (boards, cells) bool arrays, `blocked` and `hits`, with the
+# same meaning as blocked_mask and hit_mask.
+
+@lru_cache(maxsize=None)
+def placement_words(board_size, ship_size):
+    """Every placement as a bitmask split into 64-bit words: shape (words, placements), uint64"""
+    require_numpy()
+    table = placement_cells(board_size, ship_size)
+    words = (board_size * board_size + 63) // 64
+    bits = np.zeros((len(table), words * 64), dtype=bool)
+    bits[np.arange(len(table))[:, None], table] = True
+    return np.ascontiguousarray(pack_words(bits[:, :board_size * board_size]).T)
+
+
+@lru_cache(maxsize=None)
+def placement_incidence(board_size, ship_size):
+    """(placements, cells) float64 matrix with a 1 where a placement covers a cell"""
+    require_numpy()
+    table = placement_cells(board_size, ship_size)
+    incidence = np.zeros((len(table), board_size * board_size))
+    incidence[np.arange(len(table))[:, None], table] = 1
+    return incidence
+
+
+def pack_words(cells):
+    """(rows, cells) bool array -> (rows, words) uint64 array, cell i at bit i % 64 of word i // 64"""
+    rows, n_cells = cells.shape
+    words = (n_cells + 63) // 64
+    padded = np.zeros((rows, words * 64), dtype=bool)
+    padded[:, :n_cells] = cells
+    return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+
+def batch_counts(size, blocked, hits, ship_sizes, simulations, gen):
+    """sample_counts for every board of a batch at once, as a (boards, cells) int64 array.
+
+    Each board draws its fleets from its own usable placements, exactly as
+    sample_counts does. The rest is shared across the batch: placements are
+    bitmasks of a word or two, so the overlap and hit checks are AND/OR over
+    (boards, fleets) arrays, every ship is drawn for all boards in one call,
+    and accepted placements are counted by id and turned into cell counts
+    with one matrix product per ship size at the end. Known cells are zeroed.
+    """
+    require_numpy()
+    boards, n_cells = blocked.shape
+    counts = np.zeros((boards, n_cells), dtype=np.int64)
+    if not boards or not ship_sizes:
+        return counts
+    alive = np.ones(boards, dtype=bool)
+    ships = []
+    for ship_size in ship_sizes:
+        usable = ~blocked[:, placement_cells(size, ship_size)].any(axis=2)
+        # Each board's usable placements first, so a draw is an index below its count
+        order = np.argsort(~usable, axis=1, kind='stable').ravel()
+        total = usable.sum(axis=1)
+        alive &= total > 0
+        # Placement p of board b is order[b * placements + p]
+        offsets = (np.arange(boards) * usable.shape[1])[:, None]
+        ships.append((ship_size, order, total[:, None], offsets))
+
+    # One (boards, 1) column per word, so every check is elementwise on (boards, fleets) arrays
+    hit_words = [column[:, None] for column in pack_words(hits).T]
+    check_hits = hits.any()
+    placements = {s: np.zeros(boards * placement_words(size, s).shape[1], dtype=np.int64) for s in set(ship_sizes)}
+    # Keep a chunk near SAMPLE_CHUNK fleets whatever the batch size
+    per_chunk = max(1, SAMPLE_CHUNK // boards)
+    for start in range(0, simulations, per_chunk):
+        n = min(per_chunk, simulations - start)
+        occupied = None
+        clash = np.zeros((boards, n), dtype=bool)
+        drawn = []
+        for ship_size, order, total, offsets in ships:
+            # One uniform per fleet, shared by every board and scaled to each board's usable placements
+            draws = (gen.random(n) * total).astype(np.int64)
+            ids = order.take(draws + offsets)
+            ship = [column[ids] for column in placement_words(size, ship_size)]
+            if occupied is None:
+                occupied = ship
+            else:
+                for word, new in zip(occupied, ship):
+                    clash |= (word & new) != 0
+                    word |= new
+            drawn.append((ship_size, ids, offsets))
+        valid = ~clash & alive[:, None]
+        if check_hits:
+            for word, hit in zip(occupied, hit_words):
+                valid &= (word & hit) == hit
+        for ship_size, ids, offsets in drawn:
+            placements[ship_size] += np.bincount((ids + offsets)[valid], minlength=len(placements[ship_size]))
+    for ship_size, placed in placements.items():
+        placed = placed.reshape(boards, -1).astype(float)
+        counts += np.rint(placed @ placement_incidence(size, ship_size)).astype(np.int64)
+    if metrics.enabled:
+        metrics.count('targeting.batch.proposals', boards * simulations)
+        metrics.count('targeting.batch.accepted', int(counts.sum()) // sum(ship_sizes))
+    counts[blocked | hits] = 0
+    return counts
+
+
+def batch_moves(size, blocked, hits, ship_sizes, simulations, gen):
+    """The hottest unshot cell of every board in a batch (see batch_counts), ties broken at random"""
+    counts = batch_counts(size, blocked, hits, ship_sizes, simulations, gen)
+    # Counts are whole numbers, so adding noise below 1 only reorders ties
+    scores = counts + gen.random(counts.shape)
+    scores[blocked | hits] = -1
+    return scores.argmax(axis=1)
+
+
+def _sample_unit(args):
+    """One work unit of ParallelSampler; runs in a pool worker"""
+    size, blocked_mask, hit_mask, ship_sizes, simulations, seed, unit = args
+    gen = require_numpy().random.default_rng([seed, unit])
+    return sample_counts(size, blocked_mask, hit_mask, ship_sizes, simulations, gen)
+
+
+class ParallelSampler:
+    """Runs sampled_heatmap's simulations across a process pool.
+
+    The simulations are cut into fixed units of `unit_size`, and unit i is
+    seeded with (seed, i) no matter which worker runs it. The integer partial
+    heatmaps are summed, so the merged heatmap is bit-for-bit the same for any
+    pool size, including running every unit in this process. Requests smaller
+    than `threshold` simulations never leave the calling process.
+    """
+
+    def __init__(self, workers=None, threshold=None, unit_size=None):
+        self.workers = workers or PARALLEL_WORKERS or os.cpu_count() or 1
+        self.threshold = PARALLEL_THRESHOLD if threshold is None else threshold
+        self.unit_size = unit_size or PARALLEL_UNIT
+        self.pool = None
+
+    def heatmap(self, size, blocked_mask, hit_mask, ship_sizes, simulations, seed):
+        require_numpy()
+        units = []
+        for i, start in enumerate(range(0, simulations, self.unit_size)):
+            n = min(self.unit_size, simulations - start)
+            units.append((size, blocked_mask, hit_mask, tuple(ship_sizes), n, seed, i))
+
+        if simulations < self.threshold or self.workers <= 1 or len(units) == 1:
+            partials = map(_sample_unit, units)
+        else:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            partials = self.pool.map(_sample_unit, units)
+
+        counts = np.zeros(size * size, dtype=np.int64)
+        for partial in partials:
+            counts += partial
+        count_accepted('targeting.parallel', counts, ship_sizes, simulations)
+        return finish_counts(counts, size, blocked_mask, hit_mask)
+
+    def start(self, size, ship_sizes):
+        """Start the worker processes now instead of on the first large request,
+        each with its placement tables for this board and fleet built"""
+        if self.workers <= 1 or self.pool is not None:
+            return
+        require_numpy()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        # Workers are spawned as tasks come in; one tiny unit each brings them all up
+        unit = (size, 0, 0, tuple(ship_sizes), 1, 0, 0)
+        list(self.pool.map(_sample_unit, [unit] * self.workers))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+
+_default_sampler = None
+
+
+def default_sampler():
+    """The shared ParallelSampler used when a caller doesn't bring its own"""
+    global _default_sampler
+    if _default_sampler is None:
+        _default_sampler = ParallelSampler()
+    return _default_sampler
+
+
+def configure_default_sampler(workers=None, threshold=None):
+    """Change the pool size and in-process threshold of default_sampler()"""
+    global PARALLEL_WORKERS, PARALLEL_THRESHOLD, _default_sampler
+    if workers is not None:
+        PARALLEL_WORKERS = workers
+    if threshold is not None:
+        PARALLEL_THRESHOLD = threshold
+    if _default_sampler is not None:
+        _default_sampler.close()
+        _default_sampler = None
@@ -0,0 +1,31 @@
+import random
+
+import endgame
+
+FULL = (1 << 25) - 1  # Every cell of a 5x5 board
+
+
+def test_one_cell_ship_listed_once():
+    # Two open cells: a 1-cell ship fits each of them one way
+    blocked = FULL & ~0b11
+    assert sorted(endgame.configurations(5, blocked, 0, [1])) == [(0b01,), (0b10,)]
+
+
+def test_one_cell_ship_best_shot():
+    assert endgame.best_shot(5, FULL & ~0b11, 0, [1], random.Random(0)) in (0, 1)
+    assert endgame.best_shot(5, FULL & ~0b1, 0, [1]) == 0
+
+
+def test_one_cell_ships_play_out():
+    # The last ships of a [4, 1] fleet on a 6x6 board, searched until every fleet is told apart
+    blocked = (1 << 36) - 1 & ~0b111 & ~(0b1111 << 12)
+    rng = random.Random(1)
+    cell = endgame.best_shot(6, blocked, 0, [4, 1], rng)
+    assert cell is not None and not blocked >> cell & 1
+
+
+def test_certain_cell_needs_no_search():
+    # A 3-cell ship in cells 0-3 of a 5x5 board covers cells 1 and 2 either way
+    fleets = endgame.configurations(5, FULL & ~0b1111, 0, [3])
+    search = endgame.EndgameSearch(fleets, node_limit=0)
+    assert search.best_shot(0, random.Random(0)) in (1, 2)
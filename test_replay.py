@@ -0,0 +1,26 @@
+import replay
+from battleship import GameEngine
+
+
+def test_rebuilt_game_matches_engine(tmp_path):
+    path = tmp_path / "games.log"
+    writer = replay.ReplayWriter(path)
+    engine = GameEngine("Hard", seed=5, user_difficulty="Easy", board_size=8, ship_sizes=[4, 3, 2, 1])
+    engine.place_fleets()
+    writer.record(engine)
+    while not engine.winner:
+        engine.play_ai_turn()
+    writer.close()
+
+    reader = replay.ReplayReader(path)
+    records = reader[0]
+    reader.close()
+    boards = replay.rebuild(records)
+    for record in records:
+        if record.type == replay.SHOT:
+            assert boards[1 - record.side].shoot(*divmod(record.cell, 8)) == bool(record.value)
+    assert records[-1].type == replay.END and replay.SIDES[records[-1].side] == engine.winner
+    for board, played in zip(boards, (engine.user.board, engine.computer.board)):
+        assert [ship.positions for ship in board.ships] == [ship.positions for ship in played.ships]
+        assert (board.ship_mask, board.shot_mask, board.sunk_mask) == \
+               (played.ship_mask, played.shot_mask, played.sunk_mask)
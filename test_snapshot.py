@@ -0,0 +1,45 @@
+import pytest
+
+import snapshot
+from battleship import GameEngine
+
+
+def game_in_progress():
+    engine = GameEngine("Easy", seed=4, user_difficulty="Hard", board_size=8, ship_sizes=[4, 3, 2, 2])
+    engine.place_fleets()
+    engine.use_powerup('Missile', 2, 2)
+    for _ in range(25):
+        engine.play_ai_turn()
+    assert not engine.winner
+    return engine
+
+
+def fleet(board):
+    return [(ship.size, ship.positions, ship.mask, ship.is_sunk()) for ship in board.ships]
+
+
+def test_round_trip():
+    engine = game_in_progress()
+    copy = snapshot.decode(snapshot.encode(engine))
+    assert (copy.turn, copy.winner) == (engine.turn, engine.winner)
+    for player, other in [(engine.user, copy.user), (engine.computer, copy.computer)]:
+        assert fleet(other.board) == fleet(player.board)
+        assert other.board.shot_mask == player.board.shot_mask
+        assert other.board.sunk_mask == player.board.sunk_mask
+        assert other.powerups == player.powerups
+        assert (other.target_queue, other.current_hunt, other.last_hit) == \
+               (player.target_queue, player.current_hunt, player.last_hit)
+    assert copy.rng.getstate() == engine.rng.getstate()
+
+
+def test_bad_blobs_raise_value_error():
+    data = snapshot.encode(game_in_progress())
+    ship = snapshot.HEADER.size + 4 + snapshot.COUNT.size  # The user's first ship
+    for bad in [data[:cut] for cut in (0, 10, snapshot.HEADER.size + 5, len(data) // 2, len(data) - 1)] + [
+            data + b'\0',
+            data[:4] + b'\xff' + data[5:],  # version
+            data[:6] + b'\xff' + data[7:],  # computer difficulty
+            data[:ship + 2] + b'\xff\xff' + data[ship + 4:],  # first cell of a ship
+    ]:
+        with pytest.raises(ValueError):
+            snapshot.decode(bad)
@@ -0,0 +1,17 @@
+import targeting
+from battleship import GameEngine, visible_state
+
+
+def test_heatmap_cache_matches_full_count():
+    # HeatmapCache is only ever updated incrementally; exact_heatmap recounts from scratch
+    for seed, size, fleet in [(1, 10, None), (2, 8, [4, 3, 3, 2, 1]), (3, 12, [5, 4, 4, 2, 2])]:
+        engine = GameEngine("Hard", seed=seed, user_difficulty="Hard", strategy="exact",
+                            user_strategy="exact", board_size=size, ship_sizes=fleet)
+        engine.place_fleets()
+        caches = {id(engine.user.board): targeting.HeatmapCache(size),
+                  id(engine.computer.board): targeting.HeatmapCache(size)}
+        while not engine.winner:
+            _, defender, _ = engine.ai_side()
+            state = visible_state(defender.board)
+            assert caches[id(defender.board)].query(*state) == targeting.exact_heatmap(size, *state)
+            engine.play_ai_turn()
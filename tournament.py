@@ -0,0 +1,239 @@
+"""Round-robin tournaments between AI strategies, played across all cores.
+
+Every pair of entrants plays --games games. Sides alternate, and game g of
+every pairing uses seed + g // 2. Each pair therefore meets on the same
+boards from both sides, and all pairings share the same boards. Entrants
+are strategy specs from strategies.py.
+
+Reported per entrant:
+    Elo        Bradley-Terry fit over all games, on the Elo scale (mean 1500)
+    win rate   with a 95% Wilson interval
+    shots      shots the entrant needed in the games it won (mean, p10/median/p90)
+    latency    wall time of its moves (median, p95, max)
+
+and per pairing the score, with a two-sided p-value against an even match.
+
+Example:
+    python tournament.py Random Easy Hard Hard:exact Hard:mcmc:2000 --games 200
+"""
+import argparse
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import statistics
+import time
+from collections import Counter
+
+from battleship import BOARD_SIZE, GameEngine, parse_fleet
+from strategies import load_plugins, make_strategy
+
+Z_95 = 1.96
+ELO_BASE = 1500
+ELO_ITERATIONS = 1000
+
+
+def play_match(seed, first, second, board_size=BOARD_SIZE, ship_sizes=None):
+    """One game between two strategy specs; `first` moves first.
+
+    Returns (0 if first won else 1, turns, shots the winner fired,
+    [move times in ms of first, of second]).
+    """
+    engine = GameEngine(seed=seed, board_size=board_size, ship_sizes=ship_sizes)
+    engine.place_fleets()
+    engine.user.ai = make_strategy(first)
+    engine.computer.ai = make_strategy(second)
+    times = [[], []]
+    while not engine.winner:
+        side = engine.turn % 2
+        start = time.perf_counter()
+        engine.play_ai_turn()
+        times[side].append((time.perf_counter() - start) * 1000)
+    winner = 0 if engine.winner == 'user' else 1
+    loser_board = engine.computer.board if winner == 0 else engine.user.board
+    return winner, engine.turn + 1, loser_board.shot_mask.bit_count(), times
+
+
+def _play(task):
+    a, b, seed, first, second, board_size, ship_sizes = task
+    return a, b, play_match(seed, first, second, board_size, ship_sizes)
+
+
+def wilson_interval(wins, games, z=Z_95):
+    if not games:
+        return 0.0, 1.0
+    p = wins / games
+    centre = (p + z * z / (2 * games)) / (1 + z * z / games)
+    spread = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(0.0, centre - spread), min(1.0, centre + spread)
+
+
+def even_match_p_value(wins, games):
+    """Two-sided p-value of `wins` out of `games` if both sides were equally strong (normal approximation)"""
+    if not games:
+        return 1.0
+    z = max(0.0, abs(wins - games / 2) - 0.5) / math.sqrt(games / 4)
+    return math.erfc(z / math.sqrt(2))
+
+
+def elo_ratings(count, pair_wins):
+    """Bradley-Terry strengths fitted by minorization-maximization, as Elo ratings.
+
+    pair_wins[a, b] is how often a beat b. Every pair also gets one virtual
+    drawn game, so an entrant that won or lost everything still has a finite rating.
+    """
+    games = Counter()
+    wins = [0.0] * count
+    for a, b in itertools.combinations(range(count), 2):
+        n = pair_wins[a, b] + pair_wins[b, a] + 1
+        games[a, b] = games[b, a] = n
+        wins[a] += pair_wins[a, b] + 0.5
+        wins[b] += pair_wins[b, a] + 0.5
+    strength = [1.0] * count
+    for _ in range(ELO_ITERATIONS):
+        new = []
+        for i in range(count):
+            denominator = sum(games[i, j] / (strength[i] + strength[j]) for j in range(count) if j != i)
+            new.append(wins[i] / denominator if denominator else 1.0)
+        scale = math.exp(statistics.fmean(math.log(s) for s in new))
+        new = [s / scale for s in new]
+        done = max(abs(x - y) for x, y in zip(new, strength)) < 1e-10
+        strength = new
+        if done:
+            break
+    return [ELO_BASE + 400 * math.log10(s) for s in strength]
+
+
+def quantile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(entrants, games, seed=0, jobs=None, board_size=BOARD_SIZE, ship_sizes=None, plugins=()):
+    """Play the round-robin and return the results as a dict (see summarize)"""
+    for spec in entrants:
+        make_strategy(spec)  # fail early on a bad spec
+    tasks = []
+    for a, b in itertools.combinations(range(len(entrants)), 2):
+        for g in range(games):
+            first, second = (a, b) if g % 2 == 0 else (b, a)
+            tasks.append((first, second, seed + g // 2, entrants[first], entrants[second],
+                          board_size, ship_sizes))
+
+    jobs = jobs or os.cpu_count() or 1
+    start = time.perf_counter()
+    if jobs > 1:
+        with multiprocessing.Pool(jobs, initializer=load_plugins, initargs=(plugins,)) as pool:
+            results = list(pool.imap_unordered(_play, tasks, chunksize=max(1, len(tasks) // (jobs * 8))))
+    else:
+        results = [_play(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+    return summarize(entrants, results, elapsed)
+
+
+def summarize(entrants, results, elapsed):
+    count = len(entrants)
+    pair_wins = Counter()
+    wins = [0] * count
+    played = [0] * count
+    shots = [[] for _ in range(count)]
+    times = [[] for _ in range(count)]
+    for first, second, (winner, _, winner_shots, move_times) in results:
+        sides = (first, second)
+        pair_wins[sides[winner], sides[1 - winner]] += 1
+        wins[sides[winner]] += 1
+        shots[sides[winner]].append(winner_shots)
+        for side in (0, 1):
+            played[sides[side]] += 1
+            times[sides[side]].extend(move_times[side])
+
+    ratings = elo_ratings(count, pair_wins)
+    table = []
+    for i, spec in enumerate(entrants):
+        low, high = wilson_interval(wins[i], played[i])
+        won = sorted(shots[i])
+        latency = sorted(times[i])
+        table.append({
+            'entrant': spec,
+            'elo': ratings[i],
+            'games': played[i],
+            'wins': wins[i],
+            'win_rate': wins[i] / played[i] if played[i] else 0.0,
+            'win_rate_ci': [low, high],
+            'shots_to_win': {
+                'mean': statistics.fmean(won) if won else None,
+                'p10': quantile(won, 0.1) if won else None,
+                'median': statistics.median(won) if won else None,
+                'p90': quantile(won, 0.9) if won else None,
+                'histogram': dict(sorted(Counter(won).items())),
+            },
+            'move_latency_ms': {
+                'moves': len(latency),
+                'median': statistics.median(latency) if latency else None,
+                'p95': quantile(latency, 0.95) if latency else None,
+                'max': latency[-1] if latency else None,
+            },
+        })
+
+    pairings = []
+    for a, b in itertools.combinations(range(count), 2):
+        n = pair_wins[a, b] + pair_wins[b, a]
+        low, high = wilson_interval(pair_wins[a, b], n)
+        pairings.append({
+            'a': entrants[a],
+            'b': entrants[b],
+            'a_wins': pair_wins[a, b],
+            'b_wins': pair_wins[b, a],
+            'a_win_rate_ci': [low, high],
+            'p_value': even_match_p_value(pair_wins[a, b], n),
+        })
+    return {'games': len(results), 'elapsed': elapsed, 'entrants': table, 'pairings': pairings}
+
+
+def show(stats):
+    print(f"{stats['games']} games in {stats['elapsed']:.1f}s")
+    print(f"{'entrant':24} {'Elo':>6} {'games':>6}  {'win rate [95% CI]':22} "
+          f"{'shots to win: mean p10/med/p90':32} move ms: median/p95/max")
+    for row in sorted(stats['entrants'], key=lambda row: -row['elo']):
+        low, high = row['win_rate_ci']
+        rate = f"{row['win_rate']:6.1%} [{low:.1%}, {high:.1%}]"
+        s = row['shots_to_win']
+        shots = f"{s['mean']:5.1f} {s['p10']}/{s['median']:g}/{s['p90']}" if s['mean'] is not None else "-"
+        m = row['move_latency_ms']
+        latency = f"{m['median']:.2f}/{m['p95']:.2f}/{m['max']:.2f}" if m['moves'] else "-"
+        print(f"{row['entrant']:24} {row['elo']:6.0f} {row['games']:6}  {rate:22} {shots:32} {latency}")
+    print()
+    for pair in stats['pairings']:
+        low, high = pair['a_win_rate_ci']
+        print(f"{pair['a']} vs {pair['b']}: {pair['a_wins']}-{pair['b_wins']} "
+              f"({pair['a']} wins {low:.1%}-{high:.1%}), p = {pair['p_value']:.3g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Round-robin tournament between Battleship AIs")
+    parser.add_argument('entrants', nargs='+', help="strategy specs, e.g. Easy Hard Hard:exact Hard:montecarlo:200")
+    parser.add_argument('--games', type=int, default=100, help="games per pairing")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--size', type=int, default=BOARD_SIZE, help="board size")
+    parser.add_argument('--fleet', type=parse_fleet, default=None, help="ship sizes, e.g. 5,4,3,3,2 or 5x4,3x12")
+    parser.add_argument('--plugin', action='append', default=[],
+                        help="module to import that registers more strategies (repeatable)")
+    parser.add_argument('--output', default=None, help="write the full results as JSON")
+    args = parser.parse_args()
+    if len(args.entrants) < 2:
+        parser.error("a tournament needs at least two entrants")
+
+    load_plugins(args.plugin)
+    try:
+        stats = run(args.entrants, args.games, args.seed, args.jobs, args.size, args.fleet, args.plugin)
+    except ValueError as error:
+        parser.error(str(error))
+    show(stats)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(stats, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()